@@ -1,12 +1,8 @@
 import uuid
 import requests
 import streamlit as st
-import os
 
-API_URL = "http://127.0.0.1:8000"
-#API_URL = "http://localhost:8000"
-
-#API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
+import api_client  # API_URL (auch mehrere Replicas, kommagetrennt) per env, siehe api_client.py
 
 # Einmalig: Page Config nur im Router
 st.set_page_config(page_title="OB Bot", page_icon="🤖", layout="wide")
@@ -18,6 +14,24 @@ if "sid" not in st.session_state:
 # Global defaults
 st.session_state.setdefault("use_rag", True)
 st.session_state.setdefault("top_k", 4)
+st.session_state.setdefault("kb_collections", [])  # leer = alle Collections
+st.session_state.setdefault("kb_filters", None)  # Metadaten-Filter (Dateityp/Sprache), None = keiner
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def kb_collection_info() -> list:
+    # Collections = Unterordner von kb/ (+ "default" für Dateien direkt in kb/), inkl. Facetten
+    try:
+        r = api_client.get("/kb/collections", timeout=5)
+        r.raise_for_status()
+        return r.json()["collections"]
+    except requests.RequestException:
+        return []
+
+
+def _facet_values(info: list, field: str) -> list:
+    return sorted({v for c in info for v in c.get("facets", {}).get(field, {})} - {""})
+
 
 # Global sidebar (für alle Pages)
 with st.sidebar:
@@ -32,13 +46,46 @@ with st.sidebar:
         st.session_state.top_k,
         1
     )
+    info = kb_collection_info()
+    available = [c["name"] for c in info]
+    st.session_state.kb_collections = st.multiselect(
+        "KB Collections (leer = alle)",
+        available,
+        default=[c for c in st.session_state.kb_collections if c in available],
+        disabled=not st.session_state.use_rag,
+    )
+    with st.expander("Quellen-Filter"):
+        current = st.session_state.kb_filters or {}
+        file_types = _facet_values(info, "file_type")
+        langs = _facet_values(info, "lang")
+        sel_types = st.multiselect(
+            "Dateityp", file_types, default=[t for t in current.get("file_types", []) if t in file_types],
+            disabled=not st.session_state.use_rag,
+        )
+        sel_langs = st.multiselect(
+            "Sprache", langs, default=[x for x in current.get("langs", []) if x in langs],
+            disabled=not st.session_state.use_rag,
+        )
+        filters = {k: v for k, v in (("file_types", sel_types), ("langs", sel_langs)) if v}
+        st.session_state.kb_filters = filters or None
 
     st.divider()
 
     if st.button("Reload KB (neue Dateien)"):
-        r = requests.post(f"{API_URL}/reload_kb", timeout=30)
-        r.raise_for_status()
-        st.success(f"Neu indexiert: {r.json()['chunks']} Chunks")
+        # nur die gewählten Collections neu bauen (keine Auswahl => alle)
+        for name in st.session_state.kb_collections or [None]:
+            params = {"collection": name} if name else None
+            r = api_client.post("/reload_kb", params=params, timeout=30, idempotent=True)
+            if r.status_code == 500:
+                st.error(r.json().get("detail", "KB-Rebuild fehlgeschlagen"))
+                break
+            r.raise_for_status()
+        else:
+            kb_collection_info.clear()
+            # Summe über alle neu gebauten Collections, nicht nur die der letzten Antwort
+            sizes = r.json()["collection_chunks"]
+            names = st.session_state.kb_collections or list(sizes)
+            st.success(f"Neu indexiert: {sum(sizes.get(n, 0) for n in names)} Chunks")
 
     # Chat-Verlauf global löschen
     if st.button("Chat leeren"):
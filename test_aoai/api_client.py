@@ -0,0 +1,178 @@
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+import tracing
+
+tracing.configure("ui")  # api_client läuft nur im Streamlit-Prozess
+
+
+# ----------------------------
+# Logging
+# ----------------------------
+# Streamlit richtet für fremde Logger keinen Handler ein => ohne Konfiguration erscheinen nur Warnungen
+# (Verbindungsfehler/Timeouts). Latenz pro Call (INFO) einschalten mit API_CLIENT_LOG_LEVEL=INFO,
+# z.B. PowerShell: $env:API_CLIENT_LOG_LEVEL="INFO"; python -m streamlit run Chatbot.py
+API_CLIENT_LOG_LEVEL = os.getenv("API_CLIENT_LOG_LEVEL", "").upper()
+
+log = logging.getLogger("api_client")
+if API_CLIENT_LOG_LEVEL and not log.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(API_CLIENT_LOG_LEVEL)
+    log.propagate = False  # sonst doppelt, falls der Root-Logger doch einen Handler hat
+
+
+# ----------------------------
+# Config
+# ----------------------------
+# API_URL darf mehrere Replicas enthalten (kommagetrennt), z.B.
+#   API_URL=http://10.0.0.5:8000,http://10.0.0.6:8000
+API_URLS: List[str] = [
+    u.strip().rstrip("/")
+    for u in os.getenv("API_URL", "http://127.0.0.1:8000").split(",")
+    if u.strip()
+]
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "3.05"))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "60"))
+API_RETRIES = int(os.getenv("API_RETRIES", "2"))
+API_BACKOFF = float(os.getenv("API_BACKOFF", "0.3"))
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "20"))
+# Replica nach Verbindungsfehler so lange hinten anstellen (Sekunden)
+API_REPLICA_COOLDOWN = float(os.getenv("API_REPLICA_COOLDOWN", "10"))
+
+RETRY_STATUS = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+
+# ----------------------------
+# Session (prozessweit, Keep-Alive)
+# ----------------------------
+# Eine Session für alle Streamlit-Sessions/Threads: der urllib3-Pool hält die TCP-Verbindungen
+# zu den Replicas offen, statt pro Request neu zu verbinden.
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_rr = itertools.count()
+_down_until: Dict[str, float] = {}
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=len(API_URLS), pool_maxsize=API_POOL_SIZE)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                _session = s
+    return _session
+
+
+def _pick_replica(tried: List[str]) -> str:
+    # Round-Robin über die Replicas; kürzlich ausgefallene und in diesem Call schon versuchte kommen ans Ende
+    start = next(_rr) % len(API_URLS)
+    order = API_URLS[start:] + API_URLS[:start]
+    now = time.monotonic()
+    return min(order, key=lambda u: (u in tried, _down_until.get(u, 0) > now))
+
+
+def _not_sent(e: requests.ConnectionError) -> bool:
+    # Verbindung kam nicht zustande => der Request hat den Server sicher nicht erreicht
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+
+
+def _backoff(attempt: int) -> None:
+    time.sleep(API_BACKOFF * (2 ** attempt) * (0.5 + random.random() / 2))
+
+
+def request(
+    method: str,
+    path: str,
+    timeout: Optional[float] = None,
+    idempotent: Optional[bool] = None,
+    **kwargs,
+) -> requests.Response:
+    """
+    HTTP-Request an die API (über den Keep-Alive-Pool).
+
+    Idempotente Calls werden bei Verbindungsfehlern/Timeouts und 502/503/504 mit Backoff wiederholt,
+    jeweils auf der nächsten Replica. Nicht-idempotente Calls (POST /chat) werden nur dann auf einer
+    anderen Replica wiederholt, wenn die Verbindung gar nicht zustande kam.
+    Jeder Versuch ist ein Span "http.client" und schickt den Trace-Kontext als traceparent-Header mit.
+    """
+    method = method.upper()
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    read_timeout = API_READ_TIMEOUT if timeout is None else timeout
+    session = get_session()
+    attempts = API_RETRIES + 1 if idempotent else len(API_URLS)
+    tried: List[str] = []
+    headers = kwargs.pop("headers", None)
+
+    for attempt in range(attempts):
+        base = _pick_replica(tried)
+        tried.append(base)
+        t0 = time.perf_counter()
+        try:
+            with tracing.span("http.client", method=method, path=path, replica=base, attempt=attempt) as sp:
+                r = session.request(
+                    method,
+                    f"{base}{path}",
+                    timeout=(API_CONNECT_TIMEOUT, read_timeout),
+                    headers=tracing.inject(headers),
+                    **kwargs,
+                )
+                if sp:
+                    sp.set(status=r.status_code)
+        except requests.ConnectionError as e:
+            not_sent = _not_sent(e)
+            if not_sent:
+                _down_until[base] = time.monotonic() + API_REPLICA_COOLDOWN
+            retry = idempotent or not_sent
+            log.warning("%s %s%s failed after %.0fms: %s", method, base, path, (time.perf_counter() - t0) * 1000, e)
+            if not retry or attempt == attempts - 1:
+                raise
+            if idempotent:
+                _backoff(attempt)
+            continue
+        except requests.Timeout as e:
+            log.warning("%s %s%s timeout after %.0fms", method, base, path, (time.perf_counter() - t0) * 1000)
+            if not idempotent or attempt == attempts - 1:
+                raise
+            _backoff(attempt)
+            continue
+
+        log.info("%s %s%s -> %s in %.0fms", method, base, path, r.status_code, (time.perf_counter() - t0) * 1000)
+        if idempotent and r.status_code in RETRY_STATUS and attempt < attempts - 1:
+            _backoff(attempt)
+            continue
+        return r
+
+    raise RuntimeError("unreachable")
+
+
+def get(path: str, params: Optional[dict] = None, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+    return request("GET", path, params=params, timeout=timeout, **kwargs)
+
+
+def post(
+    path: str,
+    json: Optional[dict] = None,
+    timeout: Optional[float] = None,
+    idempotent: bool = False,
+    **kwargs,
+) -> requests.Response:
+    return request("POST", path, json=json, timeout=timeout, idempotent=idempotent, **kwargs)
@@ -1,17 +1,42 @@
 import os
-import glob
 import uuid
 import json
+import math
+import threading
+import time
+from datetime import date, datetime, timedelta
+from collections import Counter
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional, Sequence, Tuple
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
+import openai
 from openai import OpenAI
 
-from pypdf import PdfReader
-from rank_bm25 import BM25Okapi
+import numpy as np
+
+from db_init import MIGRATIONS, STATS_REBUILD_SQL
+from db_query import (
+    GROUP_COLUMNS, MOWER_COLUMNS, WORK_ORDER_COLUMNS, SelectQuery, fts_match_query, group_count_query, keyset_page,
+    mower_list_query, overdue_counts_query, overdue_mowers_query, work_order_list_query,
+)
+from kb_index import (
+    Chunk, ChunkFilter, KBIndex, KBSnapshot, QueryStats, build_snapshot, fuse_scores, kb_collections, kb_files,
+    kb_fingerprint, simple_tokenize,
+)
+from kb_shards import ShardError, ShardPool, build_sharded_snapshot
+from intent_match import classify_message, load_intents, system_prompt
+from kb_watch import KBWatcher
+from llm_gateway import CircuitBreaker, GatewayError, LLMGateway
+from model_router import ModelRouter, Route
+from profiling import CURRENT as PROFILE_CURRENT, ProfileRequest, Profiler, profiled
+from singleflight import SingleFlight
+import tracing
+from tracing import TRACER, TracedConnection
+from usage_log import USAGE_GROUPS, UsageContext, UsageRecorder, load_prices, parse_window, usage_summary, utc_ts
 
 import sqlite3
 
@@ -20,12 +45,27 @@ import sqlite3
 
 load_dotenv("keyaoai.env")  # oder ".env"
 
-client = OpenAI(
-    base_url="https://ai-orderbooking-01.openai.azure.com/openai/v1/",
-    api_key=os.environ["AZURE_OPENAI_API_KEY"],
-)
+# OpenAI-Client erst beim ersten LLM-Call bauen: DB-Endpoints/Health laufen auch ohne Key
+client: Optional[OpenAI] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OpenAI:
+    global client
+    with _client_lock:
+        if client is None:
+            api_key = os.getenv("AZURE_OPENAI_API_KEY")
+            if not api_key:
+                raise GatewayError("AZURE_OPENAI_API_KEY fehlt (keyaoai.env)", retry_after=60)
+            client = OpenAI(
+                # lokal gegen fake_llm.py testen: AZURE_OPENAI_BASE_URL=http://127.0.0.1:8001/v1/
+                base_url=os.getenv("AZURE_OPENAI_BASE_URL", "https://ai-orderbooking-01.openai.azure.com/openai/v1/"),
+                api_key=api_key,
+                max_retries=0,  # Retries macht das LLM-Gateway (mit Deadline + Circuit Breaker)
+            )
+        return client
 
-DEPLOYMENT = "gpt-4.1-mini"
+DEPLOYMENT = "gpt-4.1-mini"  # Default, solange kein MODEL_ROUTES_PATH gesetzt ist
 BOT_NAME = "OB Bot"
 
 # SQLite DB
@@ -36,90 +76,279 @@ ALLOWED_MOWER_STATUSES = {"AVAILABLE", "IN_SERVICE", "MAINTENANCE", "OUT_OF_ORDE
 ALLOWED_WO_PRIORITY = {"LOW", "MEDIUM", "HIGH", "CRITICAL"}
 ALLOWED_WO_STATUS = {"OPEN", "IN_PROGRESS", "DONE", "CANCELLED"}
 
+# Wartung gilt als überfällig, wenn last_service_date älter ist (Tage)
+MAINTENANCE_INTERVAL_DAYS = int(os.getenv("MAINTENANCE_INTERVAL_DAYS", "90"))
+
+# RAG: optionales zweites Signal (Char-n-gram Vektoren) neben BM25; Gewicht 0 = nur BM25
+RAG_HYBRID_WEIGHT = float(os.getenv("RAG_HYBRID_WEIGHT", "0.3"))
+RAG_NGRAM_MIN_SIM = float(os.getenv("RAG_NGRAM_MIN_SIM", "0.03"))
+# RAG sharded (kb_shards.py): Chunks auf N Worker-Prozesse verteilt, 0 = alles im API-Prozess.
+# Nur BM25 (RAG_HYBRID_WEIGHT wird dann ignoriert). Alte Shards werden nach N Sekunden freigegeben.
+RAG_SHARDS = int(os.getenv("RAG_SHARDS", "0"))
+RAG_SHARD_DROP_SECONDS = float(os.getenv("RAG_SHARD_DROP_SECONDS", "30"))
+
+# Tool-Calling: max. Größe eines Tool-Ergebnisses im Prompt (Bytes JSON, ~4 Bytes pro Token)
+TOOL_RESULT_MAX_BYTES = int(os.getenv("TOOL_RESULT_MAX_BYTES", "6000"))
+
+# LLM-Gateway (llm_gateway.py): Concurrency, Rate-Limit, Retries, Deadline, Circuit Breaker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_PER_SESSION = int(os.getenv("LLM_MAX_PER_SESSION", "2"))
+LLM_RATE_PER_SEC = float(os.getenv("LLM_RATE_PER_SEC", "0"))  # 0 = kein lokales Rate-Limit
+LLM_BURST = int(os.getenv("LLM_BURST", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "60"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# KB wird beim Start im Hintergrund geladen; RAG-Requests warten so lange höchstens (Sekunden),
+# danach Antwort ohne KB-Kontext. /readyz meldet erst "ready", wenn die KB steht (abschaltbar).
+RAG_KB_WAIT_SECONDS = float(os.getenv("RAG_KB_WAIT_SECONDS", "5"))
+READYZ_REQUIRE_KB = os.getenv("READYZ_REQUIRE_KB", "1") == "1"
+# kb/ wird alle N Sekunden auf Änderungen geprüft (0 = nur manuell über /reload_kb)
+KB_DIR = os.getenv("KB_DIR", "kb")
+KB_WATCH_SECONDS = float(os.getenv("KB_WATCH_SECONDS", "5"))
+
+# Model-Routing (model_router.py): Deployment pro Aufgabe; bei Sättigung kurz warten, dann Fallback.
+# Opt-in: ohne MODEL_ROUTES_PATH läuft alles über DEPLOYMENT. Vorlage: model_routes.example.json
+# (Deployment-Namen vorher an die tatsächlich vorhandenen Azure-Deployments anpassen)
+MODEL_ROUTES_PATH = os.getenv("MODEL_ROUTES_PATH", "")
+LLM_FALLBACK_QUEUE_SECONDS = float(os.getenv("LLM_FALLBACK_QUEUE_SECONDS", "2"))
+
+# Token-Verbrauch: gepuffert nach SQLite (llm_usage)
+USAGE_BATCH_SIZE = int(os.getenv("USAGE_BATCH_SIZE", "50"))
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "5"))
+# Preise pro 1k Tokens je Modell/Deployment für die Kosten in /usage (Vorlage: usage_prices.example.json,
+# Preise an den eigenen Azure-Vertrag anpassen). Ohne Datei liefert /usage cost = null.
+USAGE_PRICES_PATH = os.getenv("USAGE_PRICES_PATH", "")
+
+# Profiling auf Abruf (profiling.py): aus, solange PROFILING_ENABLED != 1. Mit PROFILE_TOKEN müssen
+# X-Profile-Header und /admin/profile* zusätzlich X-Admin-Token mitschicken.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Anteil profilierter Requests ab Start
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+
+# Request-Tracing (tracing.py): Spans pro Request (HTTP, Retrieval, LLM, Tools, SQLite) als JSONL in
+# TRACE_LOG; Auswertung mit trace_report.py. Einschalten mit TRACING_ENABLED=1 (API und Streamlit).
+tracing.configure("api")
+
 app = FastAPI()
 
+PROFILER = Profiler(PROFILE_DIR, enabled=PROFILING_ENABLED, default_rate=PROFILE_SAMPLE_RATE)
 
-# ----------------- RAG: KB laden + Index bauen -----------------
+ROUTER = ModelRouter.from_file(MODEL_ROUTES_PATH, DEPLOYMENT)
 
-@dataclass
-class Chunk:
-    doc_id: str
-    text: str
+# Ein Gateway pro Deployment: Limits und Circuit Breaker gelten je Deployment (eigene Quota in Azure)
+LLM_GATEWAYS: Dict[str, LLMGateway] = {}
+_gateways_lock = threading.Lock()
 
 
-CHUNKS: List[Chunk] = []
-BM25 = None
-TOKENIZED: List[List[str]] = []
+def llm_gateway(deployment: str) -> LLMGateway:
+    with _gateways_lock:
+        if deployment not in LLM_GATEWAYS:
+            LLM_GATEWAYS[deployment] = LLMGateway(
+                get_client().chat.completions.create,
+                max_concurrency=LLM_MAX_CONCURRENCY,
+                max_per_session=LLM_MAX_PER_SESSION,
+                rate_per_sec=LLM_RATE_PER_SEC,
+                burst=LLM_BURST,
+                max_retries=LLM_MAX_RETRIES,
+                deadline_s=LLM_DEADLINE_SECONDS,
+                breaker=CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS),
+            )
+        return LLM_GATEWAYS[deployment]
 
 
-def simple_tokenize(text: str) -> List[str]:
-    return [t for t in "".join(ch if ch.isalnum() else " " for ch in (text or "").lower()).split() if t]
+# ----------------- RAG: KB laden + Index bauen -----------------
+
+# Aktueller Index-Stand aller Collections. Wird nur als Ganzes ersetzt (atomarer Referenztausch),
+# nie verändert: Reader lesen KB einmal und sehen einen konsistenten Stand, ohne Lock.
+KB: KBIndex = KBIndex.empty()
+# abgestürzter Worker => neu starten und alle Collections neu bauen (dem neuen Worker fehlen seine Shards)
+SHARD_POOL: Optional[ShardPool] = (
+    ShardPool(RAG_SHARDS, on_respawn=lambda: KB_WATCHER.trigger()) if RAG_SHARDS > 0 else None
+)
 
 
-def chunk_text(text: str, chunk_size: int = 800, overlap: int = 120) -> List[str]:
-    text = (text or "").strip()
-    if not text:
-        return []
-    out = []
-    i = 0
-    while i < len(text):
-        out.append(text[i:i + chunk_size])
-        i += max(1, chunk_size - overlap)
-    return out
+@dataclass
+class KBStatus:
+    loading: bool = False
+    files_total: int = 0
+    files_done: int = 0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    collection: Optional[str] = None  # zuletzt (bzw. gerade) gebaute Collection
 
 
-def read_pdf(path: str) -> str:
-    reader = PdfReader(path)
-    parts = []
-    for page in reader.pages:
-        parts.append(page.extract_text() or "")
-    return "\n".join(parts)
+KB_STATUS = KBStatus()
+KB_READY = threading.Event()  # gesetzt, sobald ein Index steht (bleibt gesetzt während Rebuilds)
+_kb_load_lock = threading.Lock()
 
 
-def load_kb(kb_dir: str = "kb") -> None:
-    global CHUNKS, BM25, TOKENIZED
-    CHUNKS = []
-    TOKENIZED = []
+def _kb_progress(done: int, total: int) -> None:
+    KB_STATUS.files_done, KB_STATUS.files_total = done, total
 
-    paths = []
-    paths += glob.glob(os.path.join(kb_dir, "*.txt"))
-    paths += glob.glob(os.path.join(kb_dir, "*.md"))
-    paths += glob.glob(os.path.join(kb_dir, "*.pdf"))
 
-    for p in paths:
-        ext = os.path.splitext(p)[1].lower()
+def load_kb(kb_dir: str = KB_DIR, names: Optional[Iterable[str]] = None) -> KBIndex:
+    """
+    Baut die genannten Collections (None = alle) neu und veröffentlicht sie zusammen mit den
+    unveränderten übrigen; bis dahin bedient der alte Stand alle Anfragen. Collections, deren
+    Ordner verschwunden ist, werden entfernt.
+    """
+    mode = PROFILER.take_kb()  # per /reload_kb?profile=... angefordert
+    if mode is None:
+        return _load_kb(kb_dir, names)
+    with PROFILER.run("reload_kb", mode) as info:
+        kb = _load_kb(kb_dir, names)
+    print(f"KB: Profil {info['id']} in {PROFILE_DIR}")
+    return kb
+
+
+def _load_kb(kb_dir: str, names: Optional[Iterable[str]]) -> KBIndex:
+    global KB
+    with _kb_load_lock:
+        dirs = kb_collections(kb_dir)
+        targets = list(dirs) if names is None else [n for n in dict.fromkeys(names) if n in dirs]
+        version = KB.version + 1
+        built: Dict[str, KBSnapshot] = {}
+        KB_STATUS.loading = True
+        KB_STATUS.started_at, KB_STATUS.finished_at, KB_STATUS.error = time.time(), None, None
         try:
-            if ext in [".txt", ".md"]:
-                with open(p, "r", encoding="utf-8") as f:
-                    text = f.read()
-            elif ext == ".pdf":
-                text = read_pdf(p)
-            else:
-                continue
+            for name in targets:
+                KB_STATUS.collection = name
+                if SHARD_POOL is not None:
+                    built[name] = build_sharded_snapshot(
+                        SHARD_POOL, dirs[name], version, progress=_kb_progress, collection=name
+                    )
+                else:
+                    built[name] = build_snapshot(
+                        dirs[name], version, hybrid=RAG_HYBRID_WEIGHT > 0, progress=_kb_progress, collection=name
+                    )
         except Exception as e:
-            print(f"KB: konnte Datei nicht lesen {p}: {e}")
-            continue
+            KB_STATUS.error = str(e)
+            for snap in built.values():  # schon gebaute Shards dieses Laufs nicht verwaisen lassen
+                if snap.shards is not None:
+                    snap.shards.release()
+            raise
+        finally:
+            KB_STATUS.loading = False
+            KB_STATUS.finished_at = time.time()
+        collections = {n: s for n, s in KB.collections.items() if n in dirs}
+        collections.update(built)
+        replaced = [s for n, s in KB.collections.items() if collections.get(n) is not s]
+        KB = KBIndex(version, dict(sorted(collections.items())))
+        KB_READY.set()
+    for snap in replaced:
+        if snap.shards is not None:
+            snap.shards.release(delay=RAG_SHARD_DROP_SECONDS)  # laufende Queries auf dem alten Stand
+    for name, snap in built.items():
+        print(f"KB: v{version} [{name}]: {snap.files} Dateien, {snap.size} Chunks indexiert")
+    if not KB.chunks:
+        print("KB: keine Inhalte gefunden (Ordner kb leer?)")
+    return KB
 
-        for idx, ch in enumerate(chunk_text(text)):
-            doc_id = f"{os.path.basename(p)}#chunk{idx}"
-            CHUNKS.append(Chunk(doc_id=doc_id, text=ch))
-            TOKENIZED.append(simple_tokenize(ch))
 
-    if TOKENIZED:
-        BM25 = BM25Okapi(TOKENIZED)
-        print(f"KB: {len(paths)} Dateien, {len(CHUNKS)} Chunks indexiert")
-    else:
-        BM25 = None
-        print("KB: keine Inhalte gefunden (Ordner kb leer?)")
+def _kb_disk_fingerprints() -> Dict[str, Tuple]:
+    return {name: kb_fingerprint(kb_files(d)) for name, d in kb_collections(KB_DIR).items()}
+
+
+# Watcher vergleicht pro Collection und baut nur geänderte neu
+KB_WATCHER = KBWatcher(
+    fingerprint=_kb_disk_fingerprints,
+    current=lambda: {name: snap.fingerprint for name, snap in KB.collections.items()},
+    rebuild=lambda names: load_kb(KB_DIR, names),
+    interval=KB_WATCH_SECONDS,
+)
+
+
+def kb_status() -> dict:
+    s = KB_STATUS
+    end = s.finished_at if not s.loading and s.finished_at else time.time()
+    return {
+        "ready": KB_READY.is_set(),
+        "version": KB.version,
+        "loading": s.loading,
+        "collection": s.collection,
+        "files_total": s.files_total,
+        "files_done": s.files_done,
+        "chunks": KB.chunks,
+        "collections": sorted(KB.collections),
+        "shards": SHARD_POOL.status() if SHARD_POOL is not None else None,
+        "watch_seconds": KB_WATCH_SECONDS,
+        "last_check": KB_WATCHER.last_check,
+        "seconds": round(end - s.started_at, 1) if s.started_at else None,
+        "error": s.error,
+    }
 
 
-def retrieve(query: str, top_k: int = 4) -> List[Chunk]:
-    if BM25 is None or not CHUNKS:
-        return []
+def _snapshot_scores(
+    snap: KBSnapshot, qtok: List[str], top_k: int, hybrid: bool, flt: Optional[ChunkFilter],
+    stats: Optional[QueryStats],
+) -> Tuple[Sequence[Chunk], np.ndarray, Optional[np.ndarray]]:
+    """
+    Rohscores einer Collection: (Chunks, BM25, n-gram oder None), noch nicht fusioniert.
+    In-Process über alle Chunks (ausgefiltert = 0); Shards liefern nur ihre top_k Treffer (nur BM25).
+    """
+    if snap.shards is not None:
+        hits = snap.shards.search(qtok, top_k, flt, stats)
+        return hits, np.array([h.score for h in hits]), None
+    if snap.bm25 is None or not snap.chunks:
+        return [], np.zeros(0), None
+    # Filter = Bitset-Verknüpfung vorab; bewertet werden nur die ausgewählten Chunks
+    mask = snap.filters.mask(flt) if snap.filters is not None else None
+    if mask is not None and not mask.any():
+        return [], np.zeros(0), None
+    bm25 = snap.bm25.get_scores(qtok, mask, stats)
+    ngrams = snap.ngrams.score(qtok, mask) if hybrid and snap.ngrams is not None else None
+    return snap.chunks, bm25, ngrams
+
+
+def _source_label(c: Chunk) -> str:
+    page = c.meta.get("page")
+    return f"{c.doc_id} (page {page})" if page else c.doc_id
+
+
+def retrieve(
+    query: str,
+    top_k: int = 4,
+    hybrid: Optional[bool] = None,
+    collections: Optional[List[str]] = None,
+    index: Optional[KBIndex] = None,
+    flt: Optional[ChunkFilter] = None,
+) -> List[Chunk]:
+    """
+    Sucht nur in den gewählten Collections (None = alle). Unbekannte Collection => KeyError.
+    flt schränkt auf Metadaten ein (Dateityp, Quelle, Sprache, mtime).
+
+    Mehrere Collections werden wie ein Index bewertet: BM25 mit gemeinsamer IDF/avgdl über die
+    Auswahl (wie bei den Shards), die n-gram-Fusion einmal über alle Rohscores zusammen. Scores
+    pro Collection (eigene IDF, eigenes Maximum = 1) wären untereinander nicht vergleichbar.
+    """
+    kb = index or KB  # genau eine Referenz lesen => kein Mix aus altem und neuem Index
+    snaps = kb.select(collections)
     qtok = simple_tokenize(query)
-    scores = BM25.get_scores(qtok)
-    best = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
-    return [CHUNKS[i] for i in best if scores[i] > 0]
+    if hybrid is None:
+        hybrid = RAG_HYBRID_WEIGHT > 0
+    hits: List[Chunk] = []
+    with TRACER.span("retrieve", top_k=top_k, hybrid=hybrid, collections=[s.collection for s in snaps]) as sp:
+        stats = kb.corpus_stats(tuple(s.collection for s in snaps)).query(qtok) if len(snaps) > 1 else None
+        parts = [_snapshot_scores(snap, qtok, top_k, hybrid, flt, stats) for snap in snaps]
+        if parts:
+            scores = np.concatenate([p[1] for p in parts])
+            if any(p[2] is not None for p in parts):
+                ngrams = np.concatenate([p[2] if p[2] is not None else np.zeros(len(p[1])) for p in parts])
+                scores = fuse_scores(scores, ngrams, RAG_HYBRID_WEIGHT, RAG_NGRAM_MIN_SIM)
+            offsets = np.cumsum([0] + [len(p[1]) for p in parts])
+            # stabil: bei Gleichstand Collection-Reihenfolge
+            for i in np.argsort(-scores, kind="stable")[:top_k]:
+                if scores[i] <= 0:
+                    break
+                k = int(np.searchsorted(offsets, i, side="right")) - 1
+                hits.append(parts[k][0][int(i - offsets[k])])
+        if sp:
+            sp.set(hits=len(hits), filtered=flt is not None)
+    return hits
 
 
 # ----------------- SQLite helpers -----------------
@@ -127,26 +356,31 @@ def retrieve(query: str, top_k: int = 4) -> List[Chunk]:
 def db_connect():
     if not os.path.exists(DB_PATH):
         raise RuntimeError(f"DB file not found: {DB_PATH} (hast du db_init.py schon ausgeführt?)")
-    conn = sqlite3.connect(DB_PATH)
+    # TracedConnection: jedes execute wird ein "sqlite"-Span (nur innerhalb eines Traces)
+    conn = sqlite3.connect(DB_PATH, factory=TracedConnection) if TRACER.enabled else sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+USAGE = UsageRecorder(db_connect, batch_size=USAGE_BATCH_SIZE, flush_interval=USAGE_FLUSH_SECONDS)
+USAGE_PRICES = load_prices(USAGE_PRICES_PATH)
+
+
 # ---- Mowers ----
 
-def db_list_mowers(status: Optional[str] = None) -> List[dict]:
+def db_list_mowers(status: Optional[str] = None, limit: int = 100, cursor: Optional[str] = None) -> dict:
     if status and status not in ALLOWED_MOWER_STATUSES:
         raise ValueError(f"Invalid status. Allowed: {sorted(ALLOWED_MOWER_STATUSES)}")
+
+    limit = max(1, min(int(limit or 100), 500))
+
+    # Keyset-Pagination: eine Zeile mehr holen => wissen, ob es eine nächste Seite gibt
+    q, params = mower_list_query(status=status, limit=limit + 1, cursor=cursor).build()
     with db_connect() as conn:
         cur = conn.cursor()
-        if status:
-            cur.execute(
-                "SELECT id, model, site, status, last_service_date FROM mowers WHERE status = ? ORDER BY id",
-                (status,),
-            )
-        else:
-            cur.execute("SELECT id, model, site, status, last_service_date FROM mowers ORDER BY id")
-        return [dict(r) for r in cur.fetchall()]
+        cur.execute(q, params)
+        rows, next_cursor = keyset_page([dict(r) for r in cur.fetchall()], limit)
+        return {"mowers": rows, "next_cursor": next_cursor}
 
 
 def db_get_mower(mower_id: str) -> Optional[dict]:
@@ -182,8 +416,9 @@ def db_list_work_orders(
     status: Optional[str] = None,
     priority: Optional[str] = None,
     mower_id: Optional[str] = None,
-    limit: int = 50
-) -> List[dict]:
+    limit: int = 50,
+    cursor: Optional[int] = None,
+) -> dict:
     if status and status not in ALLOWED_WO_STATUS:
         raise ValueError(f"Invalid work order status. Allowed: {sorted(ALLOWED_WO_STATUS)}")
     if priority and priority not in ALLOWED_WO_PRIORITY:
@@ -191,22 +426,16 @@ def db_list_work_orders(
 
     limit = max(1, min(int(limit or 50), 200))
 
-    q = """
-        SELECT id, mower_id, title, priority, status, owner, created_at
-        FROM work_orders
-        WHERE
-            (? IS NULL OR status = ?)
-            AND (? IS NULL OR priority = ?)
-            AND (? IS NULL OR mower_id = ?)
-        ORDER BY id DESC
-        LIMIT ?
-    """
-    params = (status, status, priority, priority, mower_id, mower_id, limit)
+    # nur gesetzte Filter => SQLite kann idx_work_orders_* nutzen (siehe db_init.py)
+    q, params = work_order_list_query(
+        status=status, priority=priority, mower_id=mower_id, limit=limit + 1, cursor=cursor
+    ).build()
 
     with db_connect() as conn:
         cur = conn.cursor()
         cur.execute(q, params)
-        return [dict(r) for r in cur.fetchall()]
+        rows, next_cursor = keyset_page([dict(r) for r in cur.fetchall()], limit)
+        return {"work_orders": rows, "next_cursor": next_cursor}
 
 
 def db_create_work_order(
@@ -273,122 +502,276 @@ def db_update_work_order_status(work_order_id: int, status: str) -> dict:
         return {"ok": True, "work_order": dict(row) if row else {"id": wo_id, "status": status}}
 
 
-# ----------------- Startup -----------------
-
-@app.on_event("startup")
-def _startup():
-    load_kb("kb")
-    if not os.path.exists(DB_PATH):
-        print(f"DB: {DB_PATH} nicht gefunden. Bitte db_init.py ausführen.")
-    else:
-        print(f"DB: {DB_PATH} gefunden.")
-
-
-# ----------------- Session State (in-memory) -----------------
-
-SESSION_LANG: Dict[str, str] = {}              # "de" / "en"
-SESSION_LAST_REPLY: Dict[str, str] = {}        # last assistant reply text
-SESSION_NAME_CORRECTED: Dict[str, bool] = {}   # name correction already done?
+# ---- Work Orders: Volltextsuche (FTS5, siehe db_init.py) ----
 
+def db_search_work_orders(
+    query: str,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> dict:
+    match = fts_match_query(query)
+    if not match:
+        raise ValueError("query is required")
+    if status and status not in ALLOWED_WO_STATUS:
+        raise ValueError(f"Invalid work order status. Allowed: {sorted(ALLOWED_WO_STATUS)}")
+    if priority and priority not in ALLOWED_WO_PRIORITY:
+        raise ValueError(f"Invalid work order priority. Allowed: {sorted(ALLOWED_WO_PRIORITY)}")
 
-# ----------------- Language + Intent helpers -----------------
+    limit = max(1, min(int(limit or 20), 50))
+    offset = max(0, int(offset or 0))
+
+    q, params = (
+        SelectQuery("work_orders_fts f", [
+            "w.id", "w.mower_id", "w.title", "w.priority", "w.status", "w.owner", "w.created_at",
+            "f.model", "f.site", "-bm25(work_orders_fts) AS score",
+        ])
+        .join("JOIN work_orders w ON w.id = f.rowid")
+        .where("work_orders_fts MATCH ?", match)
+        .eq("w.status", status)
+        .eq("w.priority", priority)
+        .order_by("score DESC, w.id DESC")
+        .limit(limit + 1, offset)
+        .build()
+    )
 
-_GREETINGS = {
-    "hi", "hii", "hello", "hey",
-    "hallo", "guten tag", "guten morgen", "guten abend",
-    "servus", "moin", "yo"
+    with db_connect() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(q, params)
+        except sqlite3.OperationalError as e:
+            if "no such table" in str(e):
+                raise RuntimeError("Volltextindex fehlt (work_orders_fts) – bitte db_init.py ausführen.")
+            raise
+        rows = [dict(r) for r in cur.fetchall()]
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    for r in rows:
+        r["score"] = round(r["score"], 4)
+    return {"work_orders": rows, "next_offset": offset + limit if has_more else None}
+
+
+# ---- Flotten-Kennzahlen (fleet_stats, per Trigger gepflegt – siehe db_init.py) ----
+
+_STATS_LAYOUT = {
+    "mower_model": ("mowers", "by_model"),
+    "mower_site": ("mowers", "by_site"),
+    "mower_status": ("mowers", "by_status"),
+    "wo_status": ("work_orders", "by_status"),
+    "wo_priority": ("work_orders", "by_priority"),
 }
 
-_OTHER_ASSISTANT_NAMES = {"chatgpt", "copilot", "gpt", "gpt-4", "gpt4", "gpt-4o", "openai"}
-
-
-def normalize(s: str) -> str:
-    return " ".join((s or "").strip().lower().split())
 
+def db_get_stats() -> dict:
+    stats = {
+        "mowers": {"total": 0, "by_model": {}, "by_site": {}, "by_status": {}},
+        "work_orders": {"total": 0, "by_status": {}, "by_priority": {}},
+    }
+    with db_connect() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT dimension, value, count FROM fleet_stats WHERE count > 0")
+        except sqlite3.OperationalError as e:
+            if "no such table" in str(e):
+                raise RuntimeError("Kennzahlen-Tabelle fehlt (fleet_stats) – bitte db_init.py ausführen.")
+            raise
+        for r in cur.fetchall():
+            if r["dimension"] == "mowers_total":
+                stats["mowers"]["total"] = r["count"]
+            elif r["dimension"] == "work_orders_total":
+                stats["work_orders"]["total"] = r["count"]
+            elif r["dimension"] in _STATS_LAYOUT:
+                table, key = _STATS_LAYOUT[r["dimension"]]
+                stats[table][key][r["value"]] = r["count"]
+    return stats
+
+
+def db_refresh_stats() -> dict:
+    # Vollständige Neuberechnung (Reparatur, falls Trigger umgangen wurden)
+    with db_connect() as conn:
+        conn.executescript(f"BEGIN;\n{STATS_REBUILD_SQL}\nCOMMIT;")
+    return db_get_stats()
+
+
+# ---- Aggregationen: Gruppenzählungen + überfällige Wartung ----
+
+# (Entität, Spalte) -> fleet_stats-Dimension: eine Gruppierung ohne Filter kommt direkt aus den Zählern
+_STATS_DIMENSION = {(table, key[len("by_"):]): dim for dim, (table, key) in _STATS_LAYOUT.items()}
+MAX_GROUPS = 200
+
+
+def db_count_by(entity: str, group_by: List[str], filters: Optional[dict] = None) -> dict:
+    if entity not in GROUP_COLUMNS:
+        raise ValueError(f"Invalid entity. Allowed: {sorted(GROUP_COLUMNS)}")
+    allowed = GROUP_COLUMNS[entity]
+    group_by = [g for g in dict.fromkeys(group_by or []) if g]
+    if not group_by or len(group_by) > 3:
+        raise ValueError("group_by needs 1..3 columns")
+    bad = [c for c in group_by + list(filters or {}) if c not in allowed]
+    if bad:
+        raise ValueError(f"Invalid column(s) {bad}. Allowed: {sorted(allowed)}")
+    filters = {k: v for k, v in (filters or {}).items() if v is not None and v != ""}
+    status = filters.get("status")
+    if entity == "mowers" and status and status not in ALLOWED_MOWER_STATUSES:
+        raise ValueError(f"Invalid status. Allowed: {sorted(ALLOWED_MOWER_STATUSES)}")
+    if entity == "work_orders" and status and status not in ALLOWED_WO_STATUS:
+        raise ValueError(f"Invalid work order status. Allowed: {sorted(ALLOWED_WO_STATUS)}")
+    if entity == "work_orders" and filters.get("priority") and filters["priority"] not in ALLOWED_WO_PRIORITY:
+        raise ValueError(f"Invalid work order priority. Allowed: {sorted(ALLOWED_WO_PRIORITY)}")
 
-def is_greeting_only(text: str) -> bool:
-    return normalize(text) in _GREETINGS
+    rows = None
+    with db_connect() as conn:
+        cur = conn.cursor()
+        dim = _STATS_DIMENSION.get((entity, group_by[0]))
+        if len(group_by) == 1 and not filters and dim:
+            try:
+                cur.execute(
+                    "SELECT value AS g, count FROM fleet_stats WHERE dimension = ? AND count > 0 ORDER BY count DESC, value",
+                    (dim,),
+                )
+                rows = [{group_by[0]: r["g"], "count": r["count"]} for r in cur.fetchall()]
+            except sqlite3.OperationalError:
+                rows = None  # DB noch ohne Migration => GROUP BY
+        if rows is None:
+            q, params = group_count_query(entity, group_by, filters).build()
+            cur.execute(q, params)
+            rows = [dict(r) for r in cur.fetchall()]
+
+    return {
+        "entity": entity,
+        "group_by": group_by,
+        "filters": filters,
+        "total": sum(r["count"] for r in rows),
+        "groups": rows[:MAX_GROUPS],
+        "truncated": len(rows) > MAX_GROUPS,
+    }
 
 
-def is_language_only(text: str) -> bool:
-    return normalize(text) in {"english", "englisch", "deutsch", "german", "de", "en"}
+def db_overdue_maintenance(days: Optional[int] = None, site: Optional[str] = None, limit: int = 20) -> dict:
+    days = MAINTENANCE_INTERVAL_DAYS if days is None else max(0, int(days))
+    limit = max(0, min(int(limit if limit is not None else 20), 200))
+    cutoff = (date.today() - timedelta(days=days)).isoformat()
 
+    with db_connect() as conn:
+        cur = conn.cursor()
+        q, params = overdue_counts_query(cutoff, site=site).build()
+        cur.execute(q, params)
+        by_site = {r["site"]: r["count"] for r in cur.fetchall()}
+        mowers = []
+        if limit:
+            q, params = overdue_mowers_query(cutoff, site=site, limit=limit).build()
+            cur.execute(q, params)
+            mowers = [dict(r) for r in cur.fetchall()]
+
+    count = sum(by_site.values())
+    return {
+        "interval_days": days,
+        "serviced_before": cutoff,
+        "count": count,
+        "by_site": by_site,
+        "mowers": mowers,
+        "truncated": count > len(mowers),
+    }
 
-def explicit_lang_request(text: str) -> Optional[str]:
-    t = normalize(text)
-    en_triggers = [
-        "english", "englisch", "in english", "speak english", "english please",
-        "auf englisch", "in englisch", "können wir auf englisch", "kannst du auf englisch",
-        "please answer in english", "answer in english",
-    ]
-    de_triggers = [
-        "deutsch", "german", "in german", "speak german", "german please",
-        "auf deutsch", "in deutsch", "können wir auf deutsch", "kannst du auf deutsch",
-        "please answer in german", "answer in german",
-    ]
-    if any(x in t for x in en_triggers):
-        return "en"
-    if any(x in t for x in de_triggers):
-        return "de"
-    return None
 
+# ----------------- Startup -----------------
 
-def detect_lang(text: str) -> str:
-    t = normalize(text)
+STARTED_AT = time.time()
 
-    req = explicit_lang_request(t)
-    if req:
-        return req
 
-    if t in {"english", "englisch", "en"}:
-        return "en"
-    if t in {"deutsch", "german", "de"}:
-        return "de"
+@app.on_event("startup")
+def _startup():
+    # KB im Hintergrund (erster Watcher-Durchlauf = Warm-up): Server nimmt sofort Requests an
+    KB_WATCHER.start(initial=True)
+    if not os.path.exists(DB_PATH):
+        print(f"DB: {DB_PATH} nicht gefunden. Bitte db_init.py ausführen.")
+    else:
+        print(f"DB: {DB_PATH} gefunden.")
+        with db_connect() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        latest = MIGRATIONS[-1][0]
+        if version < latest:
+            print(f"DB: Schema-Version {version} < {latest}. Bitte db_init.py ausführen (Migrationen).")
+    USAGE.start()
 
-    if any(ch in t for ch in ["ä", "ö", "ü", "ß"]):
-        return "de"
 
-    tt = f" {t} "
-    de_markers = [" wie ", " was ", " warum ", " bitte ", " kannst ", " können ", " ich ", " und ", " nicht ", " für "]
-    en_markers = [" what ", " why ", " how ", " please ", " can ", " i ", " and ", " not ", " for ", " much ", " many "]
+@app.on_event("shutdown")
+def _shutdown():
+    KB_WATCHER.stop()
+    if SHARD_POOL is not None:
+        SHARD_POOL.stop()
+    USAGE.stop()
 
-    score_de = sum(m in tt for m in de_markers)
-    score_en = sum(m in tt for m in en_markers)
 
-    if score_de == 0 and score_en == 0:
-        return "en"
-    return "en" if score_en > score_de else "de"
+# ----------------- Session State (in-memory) -----------------
 
+SESSION_LANG: Dict[str, str] = {}              # "de" / "en"
+SESSION_LAST_REPLY: Dict[str, str] = {}        # last assistant reply text
+SESSION_NAME_CORRECTED: Dict[str, bool] = {}   # name correction already done?
 
-def wants_translation_to_en(text: str) -> bool:
-    t = normalize(text)
-    triggers = [
-        "auf englisch zurück", "auf englisch bitte", "kannst du das auf englisch",
-        "kannst du mir das auf englisch", "in english", "please answer in english",
-        "translate to english", "return it in english",
-    ]
-    return any(x in t for x in triggers)
 
+# ----------------- Language + Intent helpers -----------------
+# Trigger-Phrasen und Antworttexte pro Sprache kommen aus intents.json (intent_match.py):
+# neue Phrasen/Sprachen ohne Code-Änderung.
 
-def wants_translation_to_de(text: str) -> bool:
-    t = normalize(text)
-    triggers = [
-        "auf deutsch zurück", "auf deutsch bitte", "kannst du das auf deutsch",
-        "kannst du mir das auf deutsch", "in german", "please answer in german",
-        "translate to german", "return it in german",
-    ]
-    return any(x in t for x in triggers)
+INTENTS_PATH = os.getenv("INTENTS_PATH", "intents.json")
+INTENTS = load_intents(INTENTS_PATH)
 
 
-def mentions_other_bot_name(text: str) -> bool:
-    t = normalize(text)
-    return any(n in t for n in _OTHER_ASSISTANT_NAMES)
+def llm_chat(ctx: Optional[UsageContext], operation: str, step: int = 0, route: Optional[Route] = None, **kwargs):
+    # Jeder Chat-Completion-Call läuft hier durch => Routing + Gateway-Limits, resp.usage wird pro Call erfasst
+    route = route or ROUTER.pick(operation, ctx.feature if ctx else None)
+    session_id = ctx.session_id if ctx else None
+    deployment = route.deployment
+    used_fallback = False
+    with TRACER.span("llm", operation=operation, step=step, route=route.name, deployment=deployment) as sp:
+        t0 = time.perf_counter()
+        try:
+            try:
+                resp = llm_gateway(deployment).call(
+                    session_id=session_id,
+                    model=deployment,
+                    # mit Fallback: nicht lange auf einen gesättigten Primary warten (Retries wie gehabt)
+                    queue_timeout=LLM_FALLBACK_QUEUE_SECONDS if route.fallback else None,
+                    **kwargs,
+                )
+            except (GatewayError, openai.NotFoundError) as e:
+                # gesättigt/ausgefallen (oder Deployment existiert nicht) => Fallback-Deployment
+                if not route.fallback:
+                    raise
+                print(f"LLM: Route {route.name}: {deployment} nicht verfügbar ({type(e).__name__}), Fallback {route.fallback}")
+                deployment, used_fallback = route.fallback, True
+                if sp:
+                    sp.set(deployment=deployment, fallback=True)
+                try:
+                    resp = llm_gateway(deployment).call(session_id=session_id, model=deployment, **kwargs)
+                except (GatewayError, openai.OpenAIError) as fb:
+                    # Fallback auch kaputt => Fehler des Primary melden (GatewayError => 503 statt 500)
+                    print(f"LLM: Route {route.name}: Fallback {deployment} fehlgeschlagen ({type(fb).__name__})")
+                    raise e from fb
+        except Exception:
+            ROUTER.record(route.name, (time.perf_counter() - t0) * 1000, ok=False, fallback=used_fallback)
+            raise
+        latency_ms = (time.perf_counter() - t0) * 1000
+        ROUTER.record(route.name, latency_ms, fallback=used_fallback)
+        usage = getattr(resp, "usage", None)
+        USAGE.record(ctx, usage, deployment, operation, step, latency_ms=latency_ms)
+        if sp and usage is not None:
+            sp.set(
+                prompt_tokens=getattr(usage, "prompt_tokens", None),
+                completion_tokens=getattr(usage, "completion_tokens", None),
+            )
+        return resp
 
 
-def translate_text(text: str, target_lang: str) -> str:
-    target = "English" if target_lang == "en" else "German"
-    resp = client.chat.completions.create(
-        model=DEPLOYMENT,
+def translate_text(text: str, target_lang: str, ctx: Optional[UsageContext] = None) -> str:
+    target = INTENTS["texts"][target_lang]["name"]
+    resp = llm_chat(
+        ctx,
+        "translate",
+        route=ROUTER.pick("translate", ctx.feature if ctx else None, len(text)),
         messages=[
             {"role": "system", "content": f"Translate the text to {target}. Output only the translation."},
             {"role": "user", "content": text},
@@ -399,19 +782,37 @@ def translate_text(text: str, target_lang: str) -> str:
 
 # ----------------- Tools (DB) for Tool-Calling -----------------
 
+SEARCH_COLUMNS = WORK_ORDER_COLUMNS + ["model", "site", "score"]
+
+
+def fields_param(columns: List[str]) -> dict:
+    return {
+        "type": "array",
+        "items": {"type": "string", "enum": columns},
+        "description": "Optional. Only return these columns (id is always included). Use it to keep results small.",
+    }
+
+
 TOOLS = [
     {
         "type": "function",
         "function": {
             "name": "list_mowers",
-            "description": "List mowers from the internal SQLite database. Optionally filter by status.",
+            "description": (
+                "List mowers from the internal SQLite database. Optionally filter by status. "
+                "Results are paged; pass next_cursor as cursor to get the next page. "
+                "Large pages are cut to fit the prompt (truncated=true, counts in page_summary)."
+            ),
             "parameters": {
                 "type": "object",
                 "properties": {
                     "status": {
                         "type": "string",
                         "description": "Optional. One of: AVAILABLE, IN_SERVICE, MAINTENANCE, OUT_OF_ORDER"
-                    }
+                    },
+                    "limit": {"type": "integer", "description": "Optional. Page size (1..500). Default 100."},
+                    "cursor": {"type": "string", "description": "Optional. next_cursor from the previous page."},
+                    "fields": fields_param(MOWER_COLUMNS)
                 },
                 "required": []
             }
@@ -452,14 +853,20 @@ TOOLS = [
         "type": "function",
         "function": {
             "name": "list_work_orders",
-            "description": "List work orders from the internal SQLite database. Optional filters: status, priority, mower_id.",
+            "description": (
+                "List work orders from the internal SQLite database (newest first). Optional filters: "
+                "status, priority, mower_id. Results are paged; pass next_cursor as cursor to get the next page. "
+                "Large pages are cut to fit the prompt (truncated=true, counts in page_summary)."
+            ),
             "parameters": {
                 "type": "object",
                 "properties": {
                     "status": {"type": "string", "description": "Optional. One of: OPEN, IN_PROGRESS, DONE, CANCELLED"},
                     "priority": {"type": "string", "description": "Optional. One of: LOW, MEDIUM, HIGH, CRITICAL"},
                     "mower_id": {"type": "string", "description": "Optional. Mower id, e.g. GM-A-001"},
-                    "limit": {"type": "integer", "description": "Optional. Max results (1..200). Default 50."}
+                    "limit": {"type": "integer", "description": "Optional. Page size (1..200). Default 50."},
+                    "cursor": {"type": "integer", "description": "Optional. next_cursor from the previous page."},
+                    "fields": fields_param(WORK_ORDER_COLUMNS)
                 },
                 "required": []
             }
@@ -483,6 +890,99 @@ TOOLS = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_work_orders",
+            "description": (
+                "Full-text search over work orders (title, owner) and their mower (model, site). "
+                "Returns ranked matches; use next_offset to fetch more."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "Search words, e.g. 'blade replacement'"},
+                    "status": {"type": "string", "description": "Optional. One of: OPEN, IN_PROGRESS, DONE, CANCELLED"},
+                    "priority": {"type": "string", "description": "Optional. One of: LOW, MEDIUM, HIGH, CRITICAL"},
+                    "limit": {"type": "integer", "description": "Optional. Max results (1..50). Default 20."},
+                    "offset": {"type": "integer", "description": "Optional. Offset for the next page (next_offset)."},
+                    "fields": fields_param(SEARCH_COLUMNS)
+                },
+                "required": ["query"]
+            }
+        }
+    },
+    # ---- Aggregation tools ----
+    {
+        "type": "function",
+        "function": {
+            "name": "count_mowers",
+            "description": (
+                "Count mowers grouped by one or more columns (computed in the database). "
+                "Use this instead of list_mowers for questions like 'how many mowers per site are OUT_OF_ORDER'."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "group_by": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(GROUP_COLUMNS["mowers"])},
+                        "description": "Columns to group by, e.g. [\"site\", \"status\"]."
+                    },
+                    "status": {"type": "string", "description": "Optional filter. One of: AVAILABLE, IN_SERVICE, MAINTENANCE, OUT_OF_ORDER"},
+                    "site": {"type": "string", "description": "Optional filter. Site name"},
+                    "model": {"type": "string", "description": "Optional filter. Model, e.g. GM-200"}
+                },
+                "required": ["group_by"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "count_work_orders",
+            "description": (
+                "Count work orders grouped by one or more columns (computed in the database). "
+                "site and model refer to the work order's mower. Use this instead of list_work_orders to count."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "group_by": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(GROUP_COLUMNS["work_orders"])},
+                        "description": "Columns to group by, e.g. [\"owner\"] or [\"site\", \"priority\"]."
+                    },
+                    "status": {"type": "string", "description": "Optional filter. One of: OPEN, IN_PROGRESS, DONE, CANCELLED"},
+                    "priority": {"type": "string", "description": "Optional filter. One of: LOW, MEDIUM, HIGH, CRITICAL"},
+                    "owner": {"type": "string", "description": "Optional filter. Owner / assignee"},
+                    "mower_id": {"type": "string", "description": "Optional filter. Mower id, e.g. GM-A-001"},
+                    "site": {"type": "string", "description": "Optional filter. Site of the mower"},
+                    "model": {"type": "string", "description": "Optional filter. Model of the mower"}
+                },
+                "required": ["group_by"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "overdue_maintenance",
+            "description": (
+                "Mowers whose maintenance is overdue (never serviced, or last_service_date older than `days`). "
+                "Returns the count, counts per site and the most overdue mowers."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "days": {"type": "integer", "description": f"Optional. Service interval in days. Default {MAINTENANCE_INTERVAL_DAYS}."},
+                    "site": {"type": "string", "description": "Optional. Only this site"},
+                    "limit": {"type": "integer", "description": "Optional. Max mowers listed (0..200). Default 20."}
+                },
+                "required": []
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -501,12 +1001,100 @@ TOOLS = [
 ]
 
 
+# Listen-Tools: Tool -> (Key der Zeilenliste, Cursor-Feld)
+PAGED_TOOLS = {
+    "list_mowers": ("mowers", "next_cursor"),
+    "list_work_orders": ("work_orders", "next_cursor"),
+    "search_work_orders": ("work_orders", "next_offset"),
+}
+
+
+def tool_result_json(result: dict) -> str:
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+
+
+def compact_tool_result(tool_name: str, args: dict, result: dict, max_bytes: int = TOOL_RESULT_MAX_BYTES) -> dict:
+    """
+    Hält Listen-Ergebnisse klein, bevor sie als tool-Message in den Prompt gehen (und dort
+    bei jeder weiteren Loop-Runde erneut mitgeschickt werden):
+    - fields: Projektion auf die gewünschten Spalten (id bleibt immer drin)
+    - Budget: passt die Seite nicht in max_bytes, nur die ersten N Zeilen + Zählungen der
+      ganzen Seite (page_summary) + Cursor, der direkt hinter Zeile N weitermacht. page_summary
+      zählt mit ins Budget; N ist mindestens 1, sonst käme derselbe Cursor zurück und das
+      Modell würde endlos blättern
+    """
+    if tool_name not in PAGED_TOOLS or "error" in result:
+        return result
+    key, cursor_field = PAGED_TOOLS[tool_name]
+    rows = result.get(key) or []
+
+    fields = args.get("fields")
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+        # ein String würde sonst zeichenweise iteriert
+        return {"error": "fields must be a list of column names"}
+    if fields:
+        keep = ["id"] + [f for f in fields if f != "id"]
+        result = {**result, key: [{f: r[f] for f in keep if f in r} for r in rows]}
+
+    if len(tool_result_json(result).encode("utf-8")) <= max_bytes:
+        return result
+
+    # Zählungen über die volle Seite (vor der Projektion), damit das Modell trotzdem "wie viele" beantworten kann
+    summary = {"rows_in_page": len(rows)}
+    for col in ("status", "priority", "model", "site"):
+        if rows and col in rows[0]:
+            summary[f"by_{col}"] = dict(Counter(r[col] for r in rows))
+
+    projected = result[key]
+
+    def build(n: int) -> dict:
+        if cursor_field == "next_offset":
+            nxt = int(args.get("offset") or 0) + n
+        else:
+            nxt = projected[n - 1]["id"]
+        return {
+            key: projected[:n],
+            cursor_field: nxt,
+            "truncated": True,
+            "page_summary": summary,
+        }
+
+    if not projected:
+        return result
+    if len(tool_result_json(build(1)).encode("utf-8")) > max_bytes:
+        # schon eine Zeile + Zählungen sprengt das Budget: Zählungen auf rows_in_page kürzen,
+        # die eine Zeile geht trotzdem raus (lieber etwas über Budget als kein Fortschritt)
+        summary = {"rows_in_page": len(rows)}
+        return build(1)
+
+    # größtes n, das ins Budget passt (binäre Suche, JSON-Größe wächst monoton mit n)
+    lo, hi = 1, len(projected)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if len(tool_result_json(build(mid)).encode("utf-8")) <= max_bytes:
+            lo = mid
+        else:
+            hi = mid - 1
+    return build(lo)
+
+
 def run_tool(tool_name: str, args: dict) -> dict:
+    with TRACER.span(f"tool.{tool_name}") as sp:
+        result = _run_tool(tool_name, args)
+        if sp and "error" in result:
+            sp.fail(str(result["error"]))
+        return result
+
+
+def _run_tool(tool_name: str, args: dict) -> dict:
     try:
         # ---- Mowers ----
         if tool_name == "list_mowers":
-            status = args.get("status")
-            return {"mowers": db_list_mowers(status=status)}
+            return db_list_mowers(
+                status=args.get("status"),
+                limit=args.get("limit", 100),
+                cursor=args.get("cursor"),
+            )
         if tool_name == "get_mower":
             mower = db_get_mower(args["mower_id"])
             return {"mower": mower, "found": mower is not None}
@@ -515,14 +1103,21 @@ def run_tool(tool_name: str, args: dict) -> dict:
 
         # ---- Work Orders ----
         if tool_name == "list_work_orders":
-            return {
-                "work_orders": db_list_work_orders(
-                    status=args.get("status"),
-                    priority=args.get("priority"),
-                    mower_id=args.get("mower_id"),
-                    limit=args.get("limit", 50),
-                )
-            }
+            return db_list_work_orders(
+                status=args.get("status"),
+                priority=args.get("priority"),
+                mower_id=args.get("mower_id"),
+                limit=args.get("limit", 50),
+                cursor=args.get("cursor"),
+            )
+        if tool_name == "search_work_orders":
+            return db_search_work_orders(
+                query=args.get("query", ""),
+                status=args.get("status"),
+                priority=args.get("priority"),
+                limit=args.get("limit", 20),
+                offset=args.get("offset", 0),
+            )
         if tool_name == "create_work_order":
             return db_create_work_order(
                 mower_id=args.get("mower_id", ""),
@@ -534,6 +1129,18 @@ def run_tool(tool_name: str, args: dict) -> dict:
         if tool_name == "update_work_order_status":
             return db_update_work_order_status(args["work_order_id"], args["status"])
 
+        # ---- Aggregationen ----
+        if tool_name in ("count_mowers", "count_work_orders"):
+            entity = "mowers" if tool_name == "count_mowers" else "work_orders"
+            filters = {c: args.get(c) for c in GROUP_COLUMNS[entity] if c in args}
+            return db_count_by(entity, args.get("group_by") or [], filters)
+        if tool_name == "overdue_maintenance":
+            return db_overdue_maintenance(
+                days=args.get("days"),
+                site=args.get("site"),
+                limit=args.get("limit", 20),
+            )
+
         return {"error": f"Unknown tool: {tool_name}"}
     except Exception as e:
         return {"error": str(e)}
@@ -541,110 +1148,196 @@ def run_tool(tool_name: str, args: dict) -> dict:
 
 # ----------------- API -----------------
 
+@app.exception_handler(GatewayError)
+def _llm_unavailable(request: Request, exc: GatewayError):
+    # Schnelle Absage statt hängender Worker/500: Client soll es nach Retry-After erneut versuchen
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"LLM temporarily unavailable: {exc}"},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+@app.get("/healthz")
+def healthz():
+    # Liveness: Prozess lebt und bedient Requests (unabhängig von KB/DB)
+    return {"status": "ok", "uptime_s": round(time.time() - STARTED_AT, 1), "kb": kb_status()}
+
+
+@app.get("/readyz")
+def readyz():
+    kb = kb_status()
+    db_ok = os.path.exists(DB_PATH)
+    ready = db_ok and (kb["ready"] or not READYZ_REQUIRE_KB)
+    body = {"ready": ready, "db": db_ok, "kb": kb}
+    return body if ready else JSONResponse(status_code=503, content=body)
+
+
+@app.get("/llm/status")
+def llm_status():
+    return {
+        "gateways": {name: gw.status() for name, gw in LLM_GATEWAYS.items()},
+        "routes": ROUTER.stats(),
+    }
+
+
+class KBFilter(BaseModel):
+    # Mehrere Werte pro Feld = ODER, mehrere Felder = UND; Werte siehe /kb/collections (facets)
+    file_types: Optional[List[str]] = None  # "pdf", "md", "txt"
+    sources: Optional[List[str]] = None  # Dateiname oder "<collection>/<datei>"
+    langs: Optional[List[str]] = None  # "de", "en"
+    modified_after: Optional[str] = None  # ISO-Datum/Zeit, bezogen auf mtime der Datei
+    modified_before: Optional[str] = None
+
+
+def _parse_ts(value: Optional[str], field: str) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid {field}: {value!r} (expected ISO date, e.g. 2025-01-31)")
+
+
+def chunk_filter(f: Optional[KBFilter]) -> Optional[ChunkFilter]:
+    if f is None:
+        return None
+    flt = ChunkFilter(
+        file_types=tuple(t.lower() for t in f.file_types or ()),
+        sources=tuple(f.sources or ()),
+        langs=tuple(lang.lower() for lang in f.langs or ()),
+        modified_after=_parse_ts(f.modified_after, "modified_after"),
+        modified_before=_parse_ts(f.modified_before, "modified_before"),
+    )
+    return flt or None
+
+
 class ChatRequest(BaseModel):
     message: str
     use_rag: bool = False
     top_k: int = 4
     session_id: Optional[str] = None
+    feature: Optional[str] = None  # aufrufende Seite, z.B. "chat", "requirement_refinement" (nur für /usage)
+    collections: Optional[List[str]] = None  # KB-Collections für RAG (None = alle, siehe /kb/collections)
+    filters: Optional[KBFilter] = None  # Metadaten-Filter für RAG
+
+
+# Identische /chat-Requests (Streamlit-Rerun, Doppelklick), die gleichzeitig laufen, teilen sich einen Lauf.
+# Auch bei ändernden Tool-Calls: der Duplikat-Request bekommt das Ergebnis des ersten Laufs (shared=True),
+# statt die Änderung (z.B. create_work_order) ein zweites Mal auszuführen.
+CHAT_FLIGHTS = SingleFlight()
 
 
 @app.post("/chat")
+@profiled(PROFILER, "/chat")
 def chat(req: ChatRequest):
+    if not req.session_id:
+        return _chat(req)  # ohne Session-ID ist jeder Request eine neue Session => nichts zu teilen
+
+    key = (
+        req.session_id, req.message, req.use_rag, req.top_k, tuple(req.collections or ()) or None,
+        req.filters.model_dump_json() if req.filters else None,
+    )
+    result, shared = CHAT_FLIGHTS.do(key, lambda: _chat(req))
+    return dict(result, shared=True) if shared else result
+
+
+def _chat(req: ChatRequest) -> dict:
     msg = req.message or ""
     sid = req.session_id or str(uuid.uuid4())
+    usage_ctx = UsageContext(
+        request_id=uuid.uuid4().hex, session_id=sid, feature=req.feature or "chat", endpoint="/chat"
+    )
+
+    # Einmal klassifizieren: alle Sprach-/Intent-Flags in einem Durchlauf
+    intent = classify_message(msg, INTENTS)
 
     # 0) Sprache: explizite Wünsche überschreiben Session; sonst Session behalten
-    forced = explicit_lang_request(msg)
+    forced = intent.explicit_lang
     if forced:
         lang = forced
         SESSION_LANG[sid] = forced
     elif sid in SESSION_LANG:
         lang = SESSION_LANG[sid]
     else:
-        lang = detect_lang(msg)
+        lang = intent.detected_lang
         SESSION_LANG[sid] = lang
 
     # 1) User schreibt nur "english/deutsch" => Sprachumschaltung bestätigen
-    if is_language_only(msg):
-        SESSION_LANG[sid] = "en" if normalize(msg) in {"english", "englisch", "en"} else "de"
+    if intent.language_only:
+        SESSION_LANG[sid] = intent.language_only
         lang = SESSION_LANG[sid]
-        reply = (
-            "Sure — I’ll reply in English from now on. How can I help?"
-            if lang == "en"
-            else "Klar — ich antworte ab jetzt auf Deutsch. Wie kann ich dir helfen?"
-        )
+        reply = INTENTS["texts"][lang]["language_set"]
         SESSION_LAST_REPLY[sid] = reply
-        return {"reply": reply, "sources": [], "session_id": sid, "lang": lang}
+        return {"reply": reply, "sources": [], "session_id": sid, "lang": lang, "kb_version": None}
 
     # 2) Übersetzung: letzte Bot-Antwort übersetzen (nur wenn wirklich „translate/auf … zurück“)
-    if wants_translation_to_en(msg) or wants_translation_to_de(msg):
-        target_lang = "en" if wants_translation_to_en(msg) else "de"
+    if intent.translate_to:
+        target_lang = intent.translate_to
         SESSION_LANG[sid] = target_lang
         last = (SESSION_LAST_REPLY.get(sid) or "").strip()
 
         if not last:
-            reply = (
-                "Sure — please paste the text you want me to translate to English."
-                if target_lang == "en"
-                else "Klar — bitte füge den Text ein, den ich ins Deutsche übersetzen soll."
-            )
+            reply = INTENTS["texts"][target_lang]["translate_empty"]
             SESSION_LAST_REPLY[sid] = reply
-            return {"reply": reply, "sources": [], "session_id": sid, "lang": target_lang}
+            return {"reply": reply, "sources": [], "session_id": sid, "lang": target_lang, "kb_version": None}
 
-        translated = translate_text(last, target_lang)
+        translated = translate_text(last, target_lang, usage_ctx)
         SESSION_LAST_REPLY[sid] = translated
-        return {"reply": translated, "sources": [], "session_id": sid, "lang": target_lang}
+        return {"reply": translated, "sources": [], "session_id": sid, "lang": target_lang, "kb_version": None}
 
     # 3) Reine Begrüßung => kurze Antwort in der aktuellen Session-Sprache
-    if is_greeting_only(msg):
-        reply = "Hello! How can I help you?" if lang == "en" else "Hallo! Wie kann ich dir helfen?"
+    if intent.greeting_only:
+        reply = INTENTS["texts"][lang]["greeting"]
         SESSION_LAST_REPLY[sid] = reply
-        return {"reply": reply, "sources": [], "session_id": sid, "lang": lang}
+        return {"reply": reply, "sources": [], "session_id": sid, "lang": lang, "kb_version": None}
 
     # -------- RAG Retrieval --------
-    context_chunks = retrieve(msg, top_k=max(1, min(req.top_k, 8))) if req.use_rag else []
+    # KB noch im Aufbau => kurz warten, sonst ohne Kontext antworten (und das dem Modell sagen)
+    kb_missing = req.use_rag and not KB_READY.wait(timeout=RAG_KB_WAIT_SECONDS)
+    kb = KB
+    context_chunks = []
+    if req.use_rag and not kb_missing:
+        try:
+            flt = chunk_filter(req.filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        try:
+            context_chunks = retrieve(
+                msg, top_k=max(1, min(req.top_k, 8)), collections=req.collections or None, index=kb, flt=flt
+            )
+        except KeyError as e:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown KB collection {e.args[0]!r}. Available: {sorted(kb.collections)}"
+            )
+        except ShardError as e:
+            # Shard-Worker weg/zu langsam => ohne Kontext antworten statt 500 (Respawn + Rebuild laufen an)
+            print(f"RAG: Shard-Suche fehlgeschlagen, antworte ohne Kontext: {e}")
+            kb_missing = True
+    # Version des KB-Stands, aus dem der Kontext stammt; None = Antwort ohne Snapshot (kein RAG / KB fehlt)
+    kb_version = kb.version if req.use_rag and not kb_missing else None
     context_text = ""
     sources = []
     if context_chunks:
         sources = [c.doc_id for c in context_chunks]
-        context_text = "\n\n".join([f"[{i+1}] SOURCE: {c.doc_id}\n{c.text}" for i, c in enumerate(context_chunks)])
+        context_text = "\n\n".join(
+            [f"[{i+1}] SOURCE: {_source_label(c)}\n{c.text}" for i, c in enumerate(context_chunks)]
+        )
 
     # Name correction: nur 1x pro Session (wenn User GPT/ChatGPT/Copilot sagt)
     do_name_correction = False
-    if mentions_other_bot_name(msg) and not SESSION_NAME_CORRECTED.get(sid, False):
+    if intent.mentions_other_bot and not SESSION_NAME_CORRECTED.get(sid, False):
         do_name_correction = True
         SESSION_NAME_CORRECTED[sid] = True
 
-    # System prompt
+    # System prompt (pro Sprache aus intents.json)
     # Wichtig: Output IMMER nur in einer Sprache (keine Mischung).
-    if lang == "en":
-        system = (
-            f"You are {BOT_NAME} (OrderBooking Bot). Reply in English ONLY.\n"
-            "Never claim you are ChatGPT, GPT, Copilot, or any other assistant.\n"
-            "Do NOT repeat your name in every reply.\n"
-            "Use provided context as the primary source.\n"
-            "If the answer is not in the context (and you cannot know), say you don't know.\n"
-            "Do not invent facts. If details are not in the provided context or tool results, say you don’t have that information.\n"
-            "Do not mix languages. If context is in another language, translate it internally but keep the answer in English.\n"
-            "You may call tools to query/update the internal database if needed.\n"
-            "When you use tool results, explain them clearly in English.\n"
-        )
-        if do_name_correction:
-            system += "Start this reply with exactly: \"I’m OB Bot.\" Then continue normally. (Only this time.)\n"
-    else:
-        system = (
-            f"Du bist {BOT_NAME} (OrderBooking Bot). Antworte NUR auf Deutsch.\n"
-            "Behaupte niemals, dass du ChatGPT, GPT, Copilot oder ein anderer Assistent bist.\n"
-            "Nenne deinen Namen nicht in jeder Antwort.\n"
-            "Wenn Kontext bereitgestellt wird, nutze ihn als Hauptgrundlage.\n"
-            "Wenn die Antwort nicht im Kontext steht (und du es nicht wissen kannst), sage ehrlich, dass du es nicht weißt.\n"
-            "Erfinde keine Fakten. Wenn Details nicht im Kontext oder Tool-Ergebnis stehen, sage klar, dass du dazu keine Informationen hast.\n"
-            "Mische keine Sprachen. Wenn Kontext auf Englisch ist, nutze ihn, aber antworte trotzdem komplett auf Deutsch.\n"
-            "Du darfst Tools nutzen, um die interne Datenbank abzufragen/zu aktualisieren, wenn nötig.\n"
-            "Wenn du Tool-Ergebnisse nutzt, erkläre sie verständlich auf Deutsch.\n"
-        )
-        if do_name_correction:
-            system += "Beginne diese Antwort mit genau: \"Ich bin OB Bot.\" Dann normal weitermachen. (Nur dieses Mal.)\n"
+    texts = INTENTS["texts"][lang]
+    system = system_prompt(INTENTS, lang, BOT_NAME)
+    if do_name_correction:
+        system += texts["name_correction"] + "\n"
+    if kb_missing:
+        system += texts["kb_loading"] + "\n"
 
     messages: List[dict] = [{"role": "system", "content": system}]
     if context_text:
@@ -652,12 +1345,9 @@ def chat(req: ChatRequest):
     messages.append({"role": "user", "content": msg})
 
     # -------- Model call + Tool-calling loop --------
-    resp = client.chat.completions.create(
-        model=DEPLOYMENT,
-        messages=messages,
-        tools=TOOLS,
-        tool_choice="auto",
-    )
+    # Route einmal pro Request wählen: der ganze Tool-Loop läuft auf demselben Deployment
+    route = ROUTER.pick("chat", usage_ctx.feature, len(msg))
+    resp = llm_chat(usage_ctx, "chat", 0, route, messages=messages, tools=TOOLS, tool_choice="auto")
 
     max_steps = 5
     steps = 0
@@ -671,7 +1361,7 @@ def chat(req: ChatRequest):
         if not tool_calls:
             reply = assistant_msg.content or ""
             SESSION_LAST_REPLY[sid] = reply
-            return {"reply": reply, "sources": sources, "session_id": sid, "lang": lang}
+            return {"reply": reply, "sources": sources, "session_id": sid, "lang": lang, "kb_version": kb_version}
 
         # Append assistant tool-call message
         messages.append({
@@ -688,44 +1378,205 @@ def chat(req: ChatRequest):
             except Exception:
                 fn_args = {}
 
-            result = run_tool(fn_name, fn_args)
+            result = compact_tool_result(fn_name, fn_args, run_tool(fn_name, fn_args))
 
             messages.append({
                 "role": "tool",
                 "tool_call_id": tc.id,
-                "content": json.dumps(result, ensure_ascii=False),
+                "content": tool_result_json(result),
             })
 
         # Ask model again with tool results
-        resp = client.chat.completions.create(
-            model=DEPLOYMENT,
-            messages=messages,
-            tools=TOOLS,
-            tool_choice="auto",
-        )
+        resp = llm_chat(usage_ctx, "chat", steps, route, messages=messages, tools=TOOLS, tool_choice="auto")
 
     # If tool loop doesn't converge
-    reply = (
-        "Tool-calling loop did not finish. Please try again with a simpler request."
-        if lang == "en"
-        else "Tool-Loop hat nicht abgeschlossen. Bitte stelle die Anfrage einfacher."
-    )
+    reply = INTENTS["texts"][lang]["tool_loop_failed"]
     SESSION_LAST_REPLY[sid] = reply
-    return {"reply": reply, "sources": sources, "session_id": sid, "lang": lang}
+    return {"reply": reply, "sources": sources, "session_id": sid, "lang": lang, "kb_version": kb_version}
+
+
+@app.get("/usage")
+@profiled(PROFILER, "/usage")
+def api_usage(
+    window: str = "24h",
+    group_by: str = "feature",
+    session_id: Optional[str] = None,
+    feature: Optional[str] = None,
+    limit: int = 100,
+):
+    # z.B. /usage?window=7d&group_by=feature,step  (group_by leer => nur Summen)
+    try:
+        since = utc_ts(time.time() - parse_window(window))
+        groups = [g for g in group_by.split(",") if g]
+        bad = [g for g in groups if g not in USAGE_GROUPS]
+        if bad:
+            raise ValueError(f"Invalid group_by {bad}. Allowed: {sorted(USAGE_GROUPS)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    USAGE.flush()  # gepufferte Zeilen mitzählen
+    limit = max(1, min(int(limit or 100), 1000))
+    try:
+        with db_connect() as conn:
+            totals = usage_summary(conn, since, [], session_id=session_id, feature=feature, prices=USAGE_PRICES)[0]
+            rows = usage_summary(
+                conn, since, groups, session_id=session_id, feature=feature, limit=limit, prices=USAGE_PRICES
+            ) if groups else []
+    except sqlite3.OperationalError as e:
+        if "no such table" in str(e):
+            raise HTTPException(status_code=503, detail="Usage-Tabelle fehlt (llm_usage) – bitte db_init.py ausführen.")
+        raise
+    return {"window": window, "since": since, "group_by": groups, "totals": totals, "groups": rows}
 
 
 @app.post("/reload_kb")
-def reload_kb():
-    load_kb("kb")
-    return {"ok": True, "chunks": len(CHUNKS)}
+def reload_kb(request: Request, wait: float = 25.0, collection: Optional[str] = None, profile: Optional[str] = None):
+    # Rebuild läuft im Watcher-Thread; hier nur anstoßen und (optional) auf den neuen Snapshot warten.
+    # collection gesetzt => nur diese Collection neu bauen, die anderen bleiben unverändert.
+    # profile=cprofile|sample|both => dieser Rebuild wird im Watcher-Thread profiliert
+    if collection is not None and collection not in KB.collections and collection not in kb_collections(KB_DIR):
+        raise HTTPException(status_code=404, detail=f"Unknown KB collection {collection!r}")
+    if profile:
+        _require_profiling(request)
+        try:
+            PROFILER.arm_kb(profile)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    before = KB.version
+    triggered = time.time()
+    KB_WATCHER.trigger(None if collection is None else {collection})
+    deadline = time.monotonic() + max(0.0, wait)
+    while KB.version == before and time.monotonic() < deadline:
+        s = KB_STATUS
+        if s.error and not s.loading and s.started_at and s.started_at >= triggered:
+            # der angestoßene Rebuild ist gescheitert => nicht bis zum Timeout warten
+            raise HTTPException(status_code=500, detail=f"KB rebuild failed: {s.error}")
+        time.sleep(0.05)
+    done = KB.version != before
+    kb = KB
+    out = {
+        "ok": True, "done": done, "version": kb.version, "chunks": kb.chunks, "collections": sorted(kb.collections),
+        "collection_chunks": {name: snap.size for name, snap in kb.collections.items()},
+    }
+    if profile and done:
+        out["profile_id"] = PROFILER.last.get("reload_kb")
+    return out
+
+
+# ----------------- Profiling (opt-in) -----------------
+
+def _profile_token_ok(request: Request) -> bool:
+    return not PROFILE_TOKEN or request.headers.get("x-admin-token") == PROFILE_TOKEN
+
+
+def _require_profiling(request: Request) -> None:
+    if not PROFILER.enabled:
+        raise HTTPException(status_code=403, detail="Profiling disabled (PROFILING_ENABLED=1)")
+    if not _profile_token_ok(request):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Admin-Token")
+
+
+@app.middleware("http")
+async def _profile_requests(request: Request, call_next):
+    # Entscheidet nur, ob profiliert wird; gemessen wird im Endpoint-Thread (@profiled)
+    header = request.headers.get("x-profile") if _profile_token_ok(request) else None
+    mode = PROFILER.decide(request.url.path, header)
+    if mode is None:
+        return await call_next(request)
+    req = ProfileRequest(mode=mode, name=f"{request.method} {request.url.path}")
+    token = PROFILE_CURRENT.set(req)
+    try:
+        response = await call_next(request)
+    finally:
+        PROFILE_CURRENT.reset(token)
+    if req.artifact:
+        response.headers["X-Profile-Id"] = req.artifact
+    return response
+
+
+# Nach _profile_requests registriert => äußerste Middleware: der Request-Span umfasst alles
+@app.middleware("http")
+async def _trace_requests(request: Request, call_next):
+    if not TRACER.enabled:
+        return await call_next(request)
+    with TRACER.span(
+        f"{request.method} {request.url.path}", root=True, parent=request.headers.get("traceparent")
+    ) as sp:
+        response = await call_next(request)
+        sp.set(status_code=response.status_code)
+    response.headers["X-Trace-Id"] = sp.trace_id
+    return response
+
+
+class ProfileArm(BaseModel):
+    count: int = 1  # nächste N Requests; 0 = nur rate
+    rate: float = 0.0  # Anteil zufällig profilierter Requests (0..1)
+    mode: str = "both"  # cprofile | sample | both
+    paths: Optional[List[str]] = None  # z.B. ["/chat"]; leer = alle @profiled-Endpoints
+
+
+@app.get("/admin/profile")
+def profile_status(request: Request):
+    _require_profiling(request)
+    return PROFILER.status()
+
+
+@app.post("/admin/profile")
+def profile_arm(request: Request, arm: ProfileArm):
+    _require_profiling(request)
+    try:
+        return PROFILER.arm(count=arm.count, rate=arm.rate, mode=arm.mode, paths=arm.paths)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/admin/profiles")
+def profile_list(request: Request, limit: int = 50):
+    _require_profiling(request)
+    return {"dir": PROFILE_DIR, "profiles": PROFILER.list()[:max(1, min(limit, 500))]}
+
+
+@app.get("/admin/profiles/{filename}")
+def profile_download(request: Request, filename: str):
+    _require_profiling(request)
+    path = PROFILER.path(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile artifact not found")
+    return FileResponse(path, filename=filename)
+
+
+def _kb_facets(snap: KBSnapshot) -> dict:
+    if snap.shards is not None:
+        return snap.shards.facets
+    return snap.filters.facets() if snap.filters is not None else {}
+
+
+@app.get("/kb/collections")
+def list_kb_collections():
+    kb = KB
+    return {
+        "version": kb.version,
+        "collections": [
+            {
+                "name": name,
+                "version": snap.version,
+                "files": snap.files,
+                "chunks": snap.size,
+                "sharded": snap.shards is not None,
+                "facets": _kb_facets(snap),
+                "built_at": snap.built_at,
+            }
+            for name, snap in kb.collections.items()
+        ],
+    }
 
 
 # ----------------- Optional: DB test endpoints (Swagger) -----------------
 
 @app.get("/db/mowers")
-def api_list_mowers(status: Optional[str] = None):
+def api_list_mowers(status: Optional[str] = None, limit: int = 100, cursor: Optional[str] = None):
     try:
-        return {"mowers": db_list_mowers(status=status)}
+        return db_list_mowers(status=status, limit=limit, cursor=cursor)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -757,13 +1608,70 @@ def api_list_work_orders(
     priority: Optional[str] = None,
     mower_id: Optional[str] = None,
     limit: int = 50,
+    cursor: Optional[int] = None,
+):
+    try:
+        return db_list_work_orders(status=status, priority=priority, mower_id=mower_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/db/work_orders/search")
+def api_search_work_orders(
+    q: str,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+):
+    try:
+        return db_search_work_orders(q, status=status, priority=priority, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.get("/db/stats")
+def api_stats():
+    try:
+        return db_get_stats()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.get("/db/counts/{entity}")
+def api_count_by(
+    entity: str,
+    group_by: str,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    owner: Optional[str] = None,
+    mower_id: Optional[str] = None,
+    site: Optional[str] = None,
+    model: Optional[str] = None,
 ):
+    # group_by kommagetrennt, z.B. /db/counts/mowers?group_by=site,status&status=OUT_OF_ORDER
+    given = {"status": status, "priority": priority, "owner": owner, "mower_id": mower_id, "site": site, "model": model}
     try:
-        return {"work_orders": db_list_work_orders(status=status, priority=priority, mower_id=mower_id, limit=limit)}
+        return db_count_by(entity, group_by.split(","), {k: v for k, v in given.items() if v is not None})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.get("/db/maintenance/overdue")
+def api_overdue_maintenance(days: Optional[int] = None, site: Optional[str] = None, limit: int = 20):
+    return db_overdue_maintenance(days=days, site=site, limit=limit)
+
+
+@app.post("/db/stats/refresh")
+def api_refresh_stats():
+    try:
+        return db_refresh_stats()
+    except sqlite3.OperationalError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
 class CreateWorkOrderRequest(BaseModel):
     mower_id: str
     title: str
@@ -0,0 +1,344 @@
+"""
+Benchmark: db_*-Helfer und /db-Endpoints unter parallelen Lesern und Schreibern.
+
+Aufruf (im Ordner test_aoai; Daten vorher mit fleet_gen.py erzeugen):
+    python fleet_gen.py --db /tmp/fleet.db --mowers 100000 --work-orders 1000000
+    python bench_db.py --db /tmp/fleet.db                          # jede Operation einzeln, dann Mix
+    python bench_db.py --db /tmp/fleet.db --target api --readers 8 --writers 2 --mixed-seconds 20
+    python bench_db.py --db /tmp/fleet.db --target api --url http://127.0.0.1:8000   # laufender Server
+    python bench_db.py --db /tmp/fleet.db --only list_work_orders,search_work_orders --mixed-seconds 0
+    python bench_db.py --db /tmp/fleet.db --json after.json --baseline before.json  # Vergleich p95
+
+--target helpers ruft die db_*-Funktionen aus app.py direkt auf (ein Thread pro Leser/Schreiber),
+--target api geht über die FastAPI-Endpoints (TestClient im Prozess oder --url). Schreib-Operationen
+ändern die DB (Status-Updates, neue Work Orders) – also eine generierte DB bzw. Kopie nehmen.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+# Benchmark misst die DB, nicht Tracing/KB-Watcher (vor dem Import von app setzen)
+os.environ.setdefault("TRACING_ENABLED", "0")
+os.environ.setdefault("KB_WATCH_SECONDS", "0")
+
+import app
+from fleet_gen import TITLES
+
+MOWER_STATUSES = sorted(app.ALLOWED_MOWER_STATUSES)
+WO_STATUSES = sorted(app.ALLOWED_WO_STATUS)
+WO_PRIORITIES = sorted(app.ALLOWED_WO_PRIORITY)
+
+
+@dataclass
+class Sample:
+    """Zufallsstichprobe aus der DB, aus der die Operationen ihre Parameter ziehen."""
+    mower_ids: List[str]
+    sites: List[str]
+    max_work_order_id: int
+    terms: List[str]
+    counts: dict
+
+
+def load_sample(db_path: str, size: int = 2000) -> Sample:
+    conn = sqlite3.connect(db_path)
+    try:
+        ids = [r[0] for r in conn.execute("SELECT id FROM mowers ORDER BY random() LIMIT ?", (size,))]
+        if not ids:
+            raise SystemExit(f"Keine Mower in {db_path} – erst fleet_gen.py ausführen")
+        sites = [r[0] for r in conn.execute("SELECT DISTINCT site FROM mowers")]
+        max_wo = conn.execute("SELECT coalesce(max(id), 0) FROM work_orders").fetchone()[0]
+        counts = {
+            "mowers": conn.execute("SELECT COUNT(*) FROM mowers").fetchone()[0],
+            "work_orders": conn.execute("SELECT COUNT(*) FROM work_orders").fetchone()[0],
+            "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+        }
+    finally:
+        conn.close()
+    terms = sorted({t for title in TITLES for t in app.simple_tokenize(title) if len(t) >= 4})
+    return Sample(ids, sites, max_wo, terms, counts)
+
+
+# ----------------- Operationen -----------------
+# Jede Operation gibt es zweimal: Helfer direkt (helper) und als HTTP-Call (api, über call()).
+
+@dataclass
+class Op:
+    name: str
+    write: bool
+    helper: Callable[[Sample, random.Random], object]
+    api: Callable[[Callable, Sample, random.Random], object]
+
+
+def _maybe(rng: random.Random, p: float, value):
+    return value if rng.random() < p else None
+
+
+def _list_mowers_args(s: Sample, rng: random.Random) -> dict:
+    # Cursor an zufälliger Stelle => Keyset-Seiten mitten in der Tabelle, nicht nur Seite 1
+    return {"status": _maybe(rng, 0.5, rng.choice(MOWER_STATUSES)), "limit": 100,
+            "cursor": _maybe(rng, 0.5, rng.choice(s.mower_ids))}
+
+
+def _list_work_orders_args(s: Sample, rng: random.Random) -> dict:
+    return {
+        "status": _maybe(rng, 0.5, rng.choice(WO_STATUSES)),
+        "priority": _maybe(rng, 0.3, rng.choice(WO_PRIORITIES)),
+        "mower_id": _maybe(rng, 0.3, rng.choice(s.mower_ids)),
+        "limit": 50,
+        "cursor": _maybe(rng, 0.5, rng.randint(1, max(1, s.max_work_order_id))),
+    }
+
+
+def _search_args(s: Sample, rng: random.Random) -> dict:
+    return {"query": " ".join(rng.sample(s.terms, rng.choice((1, 1, 2)))),
+            "status": _maybe(rng, 0.3, rng.choice(WO_STATUSES)), "limit": 20}
+
+
+def _count_args(s: Sample, rng: random.Random) -> tuple:
+    return rng.choice([
+        ("mowers", ["site"], {}),  # aus fleet_stats
+        ("mowers", ["site", "status"], {}),
+        ("mowers", ["model"], {"site": rng.choice(s.sites)}),
+        ("work_orders", ["status", "priority"], {}),
+        ("work_orders", ["owner"], {"status": "OPEN"}),
+    ])
+
+
+def _overdue_args(s: Sample, rng: random.Random) -> dict:
+    return {"site": _maybe(rng, 0.5, rng.choice(s.sites)), "limit": 20}
+
+
+def _wo_id(s: Sample, rng: random.Random) -> int:
+    return rng.randint(1, max(1, s.max_work_order_id))
+
+
+def _drop_none(d: dict) -> dict:
+    return {k: v for k, v in d.items() if v is not None}
+
+
+def _api_search(call, s, rng):
+    a = _search_args(s, rng)
+    a["q"] = a.pop("query")
+    return call("GET", "/db/work_orders/search", params=_drop_none(a))
+
+
+def _api_count(call, s, rng):
+    entity, group_by, filters = _count_args(s, rng)
+    return call("GET", f"/db/counts/{entity}", params={"group_by": ",".join(group_by), **filters})
+
+
+OPS: List[Op] = [
+    Op("list_mowers", False,
+       lambda s, rng: app.db_list_mowers(**_list_mowers_args(s, rng)),
+       lambda call, s, rng: call("GET", "/db/mowers", params=_drop_none(_list_mowers_args(s, rng)))),
+    Op("get_mower", False,
+       lambda s, rng: app.db_get_mower(rng.choice(s.mower_ids)),
+       lambda call, s, rng: call("GET", f"/db/mowers/{rng.choice(s.mower_ids)}")),
+    Op("list_work_orders", False,
+       lambda s, rng: app.db_list_work_orders(**_list_work_orders_args(s, rng)),
+       lambda call, s, rng: call("GET", "/db/work_orders", params=_drop_none(_list_work_orders_args(s, rng)))),
+    Op("search_work_orders", False,
+       lambda s, rng: app.db_search_work_orders(**_search_args(s, rng)),
+       _api_search),
+    Op("get_stats", False,
+       lambda s, rng: app.db_get_stats(),
+       lambda call, s, rng: call("GET", "/db/stats")),
+    Op("count_by", False,
+       lambda s, rng: app.db_count_by(*_count_args(s, rng)),
+       _api_count),
+    Op("overdue_maintenance", False,
+       lambda s, rng: app.db_overdue_maintenance(**_overdue_args(s, rng)),
+       lambda call, s, rng: call("GET", "/db/maintenance/overdue", params=_drop_none(_overdue_args(s, rng)))),
+    Op("update_mower_status", True,
+       lambda s, rng: app.db_update_mower_status(rng.choice(s.mower_ids), rng.choice(MOWER_STATUSES)),
+       lambda call, s, rng: call("POST", f"/db/mowers/{rng.choice(s.mower_ids)}/status",
+                                 json={"status": rng.choice(MOWER_STATUSES)})),
+    Op("create_work_order", True,
+       lambda s, rng: app.db_create_work_order(rng.choice(s.mower_ids), rng.choice(TITLES), rng.choice(WO_PRIORITIES)),
+       lambda call, s, rng: call("POST", "/db/work_orders", json={
+           "mower_id": rng.choice(s.mower_ids), "title": rng.choice(TITLES), "priority": rng.choice(WO_PRIORITIES)})),
+    Op("update_work_order_status", True,
+       lambda s, rng: app.db_update_work_order_status(_wo_id(s, rng), rng.choice(WO_STATUSES)),
+       lambda call, s, rng: call("POST", f"/db/work_orders/{_wo_id(s, rng)}/status",
+                                 json={"status": rng.choice(WO_STATUSES)})),
+]
+
+
+# ----------------- Ausführung -----------------
+
+def make_call(target: str, url: Optional[str]) -> Optional[Callable]:
+    """Pro Worker-Thread ein eigener Client; HTTP-Fehler (>= 400) werden zu Exceptions."""
+    if target == "helpers":
+        return None
+    if url:
+        import requests
+        session, base = requests.Session(), url.rstrip("/")
+    else:
+        from fastapi.testclient import TestClient
+        session, base = TestClient(app.app), ""  # ohne Lifespan: kein KB-Laden, nur die DB-Endpoints
+
+    def call(method: str, path: str, **kwargs):
+        r = session.request(method, base + path, **kwargs)
+        if r.status_code >= 400:
+            raise RuntimeError(f"HTTP {r.status_code}: {r.text[:120]}")
+        return r
+
+    return call
+
+
+@dataclass
+class _Result:
+    lat: Dict[str, List[float]]
+    errors: Counter
+    err_msgs: Counter
+
+
+def _worker(ops: List[Op], sample: Sample, call, rng: random.Random, deadline: float, res: _Result) -> None:
+    lat, errors, err_msgs = res.lat, res.errors, res.err_msgs
+    while time.perf_counter() < deadline:
+        op = rng.choice(ops)
+        t0 = time.perf_counter()
+        try:
+            result = op.api(call, sample, rng) if call else op.helper(sample, rng)
+            # Helfer melden Schreibfehler als {"ok": False}, nicht als Exception
+            if isinstance(result, dict) and result.get("ok") is False:
+                raise RuntimeError(result.get("error"))
+        except Exception as e:
+            errors[op.name] += 1
+            err_msgs[f"{op.name}: {type(e).__name__}: {str(e)[:100]}"] += 1
+            continue
+        lat[op.name].append((time.perf_counter() - t0) * 1000)
+
+
+def run_phase(
+    ops: List[Op], sample: Sample, readers: int, writers: int, seconds: float,
+    target: str, url: Optional[str], seed: int,
+) -> dict:
+    reads = [o for o in ops if not o.write]
+    writes = [o for o in ops if o.write]
+    plan = [reads] * (readers if reads else 0) + [writes] * (writers if writes else 0)
+    # pro Thread eigene Messwerte (kein Lock im Messpfad), danach zusammenführen
+    results = [_Result(defaultdict(list), Counter(), Counter()) for _ in plan]
+    deadline = time.perf_counter() + seconds
+    threads = []
+    for i, (group, res) in enumerate(zip(plan, results)):
+        t = threading.Thread(
+            target=_worker,
+            args=(group, sample, make_call(target, url), random.Random(seed * 1000 + i), deadline, res),
+            daemon=True,
+        )
+        threads.append(t)
+        t.start()
+    for t in threads:
+        t.join()
+    lat: Dict[str, List[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    err_msgs: Counter = Counter()
+    for res in results:
+        for name, values in res.lat.items():
+            lat[name] += values
+        errors.update(res.errors)
+        err_msgs.update(res.err_msgs)
+    out = {}
+    for op in ops:
+        d = sorted(lat.get(op.name, []))
+        out[op.name] = {
+            "n": len(d),
+            "errors": errors[op.name],
+            "ops_s": round(len(d) / seconds, 1),
+            "p50_ms": round(percentile(d, 0.5), 2) if d else None,
+            "p95_ms": round(percentile(d, 0.95), 2) if d else None,
+            "p99_ms": round(percentile(d, 0.99), 2) if d else None,
+            "max_ms": round(d[-1], 2) if d else None,
+        }
+    return {"ops": out, "error_samples": dict(err_msgs.most_common(5))}
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    return sorted_values[max(0, math.ceil(len(sorted_values) * p) - 1)]
+
+
+def _ms(v: Optional[float]) -> str:
+    return f"{v:>8.2f}" if v is not None else f"{'-':>8}"
+
+
+def print_phase(name: str, phase: dict, baseline: Optional[dict]) -> None:
+    print(f"\n== {name}")
+    print(f"{'op':<26} {'n':>7} {'err':>5} {'ops/s':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'max_ms':>8}"
+          + ("  p95 vs baseline" if baseline else ""))
+    for op, r in phase["ops"].items():
+        if not r["n"] and not r["errors"]:
+            continue
+        line = (f"{op:<26} {r['n']:>7} {r['errors']:>5} {r['ops_s']:>8.1f} "
+                f"{_ms(r['p50_ms'])} {_ms(r['p95_ms'])} {_ms(r['p99_ms'])} {_ms(r['max_ms'])}")
+        base = ((baseline or {}).get(name) or {}).get("ops", {}).get(op)
+        if base and base.get("p95_ms") and r["p95_ms"] is not None:
+            line += f"  {(r['p95_ms'] / base['p95_ms'] - 1) * 100:+7.1f}%"
+        print(line)
+    for msg, n in phase["error_samples"].items():
+        print(f"  ! {n}x {msg}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="db_*-Helfer/Endpoints unter parallelen Lesern und Schreibern messen")
+    ap.add_argument("--db", default=app.DB_PATH)
+    ap.add_argument("--target", choices=["helpers", "api"], default="helpers")
+    ap.add_argument("--url", help="laufender API-Server statt TestClient (nur --target api)")
+    ap.add_argument("--only", help="kommagetrennte Operationen (Default: alle)")
+    ap.add_argument("--readers", type=int, default=4)
+    ap.add_argument("--writers", type=int, default=1)
+    ap.add_argument("--op-seconds", type=float, default=3, help="Dauer pro Einzel-Operation (0 = überspringen)")
+    ap.add_argument("--mixed-seconds", type=float, default=10, help="Dauer des Mix (0 = überspringen)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="Ergebnisse als JSON speichern")
+    ap.add_argument("--baseline", help="früheres --json-Ergebnis: p95-Änderung pro Operation anzeigen")
+    args = ap.parse_args()
+
+    ops = OPS
+    if args.only:
+        names = [n.strip() for n in args.only.split(",") if n.strip()]
+        unknown = sorted(set(names) - {o.name for o in OPS})
+        if unknown:
+            ap.error(f"unknown operation(s) {unknown}. Allowed: {[o.name for o in OPS]}")
+        ops = [o for o in OPS if o.name in names]
+
+    app.DB_PATH = args.db
+    sample = load_sample(args.db)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["phases"]
+
+    meta = {"db": args.db, "target": args.target, "url": args.url, "readers": args.readers,
+            "writers": args.writers, **sample.counts}
+    print(" ".join(f"{k}={v}" for k, v in meta.items()))
+
+    phases = {}
+    if args.op_seconds > 0:
+        # jede Operation allein: Leser mit --readers Threads, Schreiber mit --writers Threads
+        for op in ops:
+            phases[f"single:{op.name}"] = run_phase(
+                [op], sample, args.readers, max(1, args.writers), args.op_seconds, args.target, args.url, args.seed
+            )
+            print_phase(f"single:{op.name}", phases[f"single:{op.name}"], baseline)
+    if args.mixed_seconds > 0:
+        phases["mixed"] = run_phase(
+            ops, sample, args.readers, args.writers, args.mixed_seconds, args.target, args.url, args.seed
+        )
+        print_phase("mixed", phases["mixed"], baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "phases": phases}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: BM25-only vs. Hybrid (BM25 + Char-n-gram Vektoren).
+
+Aufruf (im Ordner test_aoai):
+    python bench_retrieval.py
+    python bench_retrieval.py --queries "Wartung" "Sicherheit Klinge" --top-k 4 --repeat 50
+    python bench_retrieval.py --shards 4   # Scatter-Gather über 4 Worker-Prozesse (nur BM25)
+"""
+import argparse
+import statistics
+import time
+
+import app
+from kb_shards import ShardPool
+
+DEFAULT_QUERIES = [
+    "Wartung",
+    "Wartungsintervall",
+    "maintenance interval",
+    "Sicherheitsvorgaben Messer",
+    "blade replacement",
+    "support ticket escalation",
+    "Akku laden",
+    "GM-200 weather",
+]
+
+
+def _stem_hit(query: str, chunks) -> bool:
+    """Grober Recall-Proxy: Query-Token und ein Wort der Treffer enthalten sich (Komposita)."""
+    qtok = app.simple_tokenize(query)
+    for c in chunks:
+        words = app.simple_tokenize(c.text)
+        if any(q in w or (len(w) >= 5 and w in q) for q in qtok for w in words):
+            return True
+    return False
+
+
+def run(queries, top_k: int, repeat: int) -> None:
+    for mode, hybrid in (("bm25", False), ("hybrid", True)):
+        latencies = []
+        hits = 0
+        for q in queries:
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                res = app.retrieve(q, top_k=top_k, hybrid=hybrid)
+                latencies.append((time.perf_counter() - t0) * 1000)
+            hits += _stem_hit(q, res)
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(
+            f"{mode:7s} p50={statistics.median(latencies):.2f}ms p95={p95:.2f}ms "
+            f"queries_with_hit={hits}/{len(queries)}"
+        )
+
+    print()
+    for q in queries:
+        bm = [c.doc_id for c in app.retrieve(q, top_k=top_k, hybrid=False)]
+        hy = [c.doc_id for c in app.retrieve(q, top_k=top_k, hybrid=True)]
+        print(f"{q!r}\n  bm25:   {bm}\n  hybrid: {hy}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--kb", default="kb")
+    ap.add_argument("--queries", nargs="*", default=DEFAULT_QUERIES)
+    ap.add_argument("--top-k", type=int, default=4)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--shards", type=int, default=0, help="Worker-Prozesse für Sharded Retrieval (0 = aus)")
+    args = ap.parse_args()
+
+    if args.shards > 0:
+        app.SHARD_POOL = ShardPool(args.shards)
+    t0 = time.perf_counter()
+    kb = app.load_kb(args.kb)
+    print(f"Index build: {(time.perf_counter() - t0) * 1000:.0f}ms, {kb.chunks} Chunks in {len(kb.collections)} Collection(s)\n")
+    try:
+        run(args.queries, args.top_k, args.repeat)
+    finally:
+        if app.SHARD_POOL is not None:
+            app.SHARD_POOL.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
 import sqlite3
+import sys
+from itertools import product
 from pathlib import Path
 
+from db_query import mower_list_query, overdue_mowers_query, work_order_list_query
+
 DB_PATH = Path("greenmow.db")
 
 SCHEMA_SQL = """
@@ -23,8 +27,278 @@ CREATE TABLE IF NOT EXISTS model_specs (
   testing_focus TEXT,
   FOREIGN KEY(model_id) REFERENCES mower_models(id)
 );
+
+CREATE TABLE IF NOT EXISTS mowers (
+  id TEXT PRIMARY KEY,
+  model TEXT NOT NULL,
+  site TEXT NOT NULL,
+  status TEXT NOT NULL,
+  last_service_date TEXT
+);
+
+CREATE TABLE IF NOT EXISTS work_orders (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  mower_id TEXT NOT NULL,
+  title TEXT NOT NULL,
+  priority TEXT NOT NULL,
+  status TEXT NOT NULL,
+  owner TEXT,
+  created_at TEXT NOT NULL,
+  FOREIGN KEY (mower_id) REFERENCES mowers(id)
+);
 """
 
+FTS_REBUILD_SQL = """
+DELETE FROM work_orders_fts;
+INSERT INTO work_orders_fts (rowid, title, owner, model, site)
+SELECT w.id, w.title, coalesce(w.owner, ''), m.model, m.site
+FROM work_orders w LEFT JOIN mowers m ON m.id = w.mower_id;
+"""
+
+# Volltextsuche (FTS5) über Work Orders: title/owner + model/site des Mowers.
+# rowid = work_orders.id; Trigger halten den Index bei jedem Schreibzugriff synchron.
+FTS_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS work_orders_fts USING fts5(
+  title, owner, model, site,
+  tokenize = 'unicode61 remove_diacritics 2',
+  prefix = '2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS work_orders_fts_ai AFTER INSERT ON work_orders BEGIN
+  INSERT INTO work_orders_fts (rowid, title, owner, model, site)
+  VALUES (
+    new.id, new.title, coalesce(new.owner, ''),
+    (SELECT model FROM mowers WHERE id = new.mower_id),
+    (SELECT site FROM mowers WHERE id = new.mower_id)
+  );
+END;
+
+CREATE TRIGGER IF NOT EXISTS work_orders_fts_ad AFTER DELETE ON work_orders BEGIN
+  DELETE FROM work_orders_fts WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS work_orders_fts_au AFTER UPDATE OF title, owner, mower_id ON work_orders BEGIN
+  DELETE FROM work_orders_fts WHERE rowid = old.id;
+  INSERT INTO work_orders_fts (rowid, title, owner, model, site)
+  VALUES (
+    new.id, new.title, coalesce(new.owner, ''),
+    (SELECT model FROM mowers WHERE id = new.mower_id),
+    (SELECT site FROM mowers WHERE id = new.mower_id)
+  );
+END;
+
+CREATE TRIGGER IF NOT EXISTS mowers_fts_ai AFTER INSERT ON mowers BEGIN
+  UPDATE work_orders_fts SET model = new.model, site = new.site
+  WHERE rowid IN (SELECT id FROM work_orders WHERE mower_id = new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS mowers_fts_au AFTER UPDATE OF model, site ON mowers BEGIN
+  UPDATE work_orders_fts SET model = new.model, site = new.site
+  WHERE rowid IN (SELECT id FROM work_orders WHERE mower_id = new.id);
+END;
+
+-- Bestand (neu) indexieren; idempotent""" + FTS_REBUILD_SQL
+
+MOWERS_FTS_REBUILD_SQL = """
+DELETE FROM mowers_fts;
+INSERT INTO mowers_fts (rowid, model, site) SELECT rowid, model, site FROM mowers;
+"""
+
+# Teilstring-Suche über Mower-Modell/Site (Database-Page "Site/Model contains"): Trigram-FTS,
+# case-insensitiv, rowid = mowers.rowid. Dazu der fehlende Delete-Trigger für work_orders_fts:
+# ohne ihn blieben model/site eines gelöschten Mowers in der Work-Order-Suche stehen.
+MOWERS_FTS_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS mowers_fts USING fts5(model, site, tokenize = 'trigram');
+
+CREATE TRIGGER IF NOT EXISTS mowers_fts_sync_ai AFTER INSERT ON mowers BEGIN
+  INSERT INTO mowers_fts (rowid, model, site) VALUES (new.rowid, new.model, new.site);
+END;
+
+CREATE TRIGGER IF NOT EXISTS mowers_fts_sync_ad AFTER DELETE ON mowers BEGIN
+  DELETE FROM mowers_fts WHERE rowid = old.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS mowers_fts_sync_au AFTER UPDATE OF model, site ON mowers BEGIN
+  UPDATE mowers_fts SET model = new.model, site = new.site WHERE rowid = old.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS mowers_fts_ad AFTER DELETE ON mowers BEGIN
+  UPDATE work_orders_fts SET model = NULL, site = NULL
+  WHERE rowid IN (SELECT id FROM work_orders WHERE mower_id = old.id);
+END;
+
+-- Bestand indexieren; idempotent""" + MOWERS_FTS_REBUILD_SQL
+
+# Sekundärindexe für die Listen-/Filter-Queries (db_query.py) und die Zählungen
+# pro Status/Priorität/Site/Modell (Index deckt COUNT(*) ... GROUP BY komplett ab).
+INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_work_orders_status ON work_orders(status);
+CREATE INDEX IF NOT EXISTS idx_work_orders_priority ON work_orders(priority);
+CREATE INDEX IF NOT EXISTS idx_work_orders_mower ON work_orders(mower_id);
+CREATE INDEX IF NOT EXISTS idx_work_orders_status_priority ON work_orders(status, priority);
+
+CREATE INDEX IF NOT EXISTS idx_mowers_status_site ON mowers(status, site);
+CREATE INDEX IF NOT EXISTS idx_mowers_site ON mowers(site);
+CREATE INDEX IF NOT EXISTS idx_mowers_model ON mowers(model);
+"""
+
+STATS_REBUILD_SQL = """
+DELETE FROM fleet_stats;
+INSERT INTO fleet_stats (dimension, value, count) SELECT 'mowers_total', '', COUNT(*) FROM mowers;
+INSERT INTO fleet_stats (dimension, value, count) SELECT 'mower_model', model, COUNT(*) FROM mowers GROUP BY model;
+INSERT INTO fleet_stats (dimension, value, count) SELECT 'mower_site', site, COUNT(*) FROM mowers GROUP BY site;
+INSERT INTO fleet_stats (dimension, value, count) SELECT 'mower_status', status, COUNT(*) FROM mowers GROUP BY status;
+INSERT INTO fleet_stats (dimension, value, count) SELECT 'work_orders_total', '', COUNT(*) FROM work_orders;
+INSERT INTO fleet_stats (dimension, value, count) SELECT 'wo_status', status, COUNT(*) FROM work_orders GROUP BY status;
+INSERT INTO fleet_stats (dimension, value, count) SELECT 'wo_priority', priority, COUNT(*) FROM work_orders GROUP BY priority;
+"""
+
+# Vorberechnete Kennzahlen (Dashboards, /db/stats): Zähler pro Dimension/Wert,
+# inkrementell per Trigger gepflegt => Lesen kostet konstant, egal wie groß die Tabellen sind.
+# Greift auch für Schreibzugriffe, die direkt aus den Streamlit-Pages kommen.
+STATS_SQL = """
+CREATE TABLE IF NOT EXISTS fleet_stats (
+  dimension TEXT NOT NULL,
+  value TEXT NOT NULL,
+  count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (dimension, value)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS mowers_stats_ai AFTER INSERT ON mowers BEGIN
+  INSERT INTO fleet_stats (dimension, value, count) VALUES ('mowers_total', '', 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+  INSERT INTO fleet_stats (dimension, value, count) VALUES ('mower_model', new.model, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+  INSERT INTO fleet_stats (dimension, value, count) VALUES ('mower_site', new.site, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+  INSERT INTO fleet_stats (dimension, value, count) VALUES ('mower_status', new.status, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS mowers_stats_ad AFTER DELETE ON mowers BEGIN
+  UPDATE fleet_stats SET count = count - 1 WHERE dimension = 'mowers_total' AND value = '';
+  UPDATE fleet_stats SET count = count - 1 WHERE dimension = 'mower_model' AND value = old.model;
+  UPDATE fleet_stats SET count = count - 1 WHERE dimension = 'mower_site' AND value = old.site;
+  UPDATE fleet_stats SET count = count - 1 WHERE dimension = 'mower_status' AND value = old.status;
+END;
+
+CREATE TRIGGER IF NOT EXISTS mowers_stats_au AFTER UPDATE OF model, site, status ON mowers BEGIN
+  UPDATE fleet_stats SET count = count - 1 WHERE dimension = 'mower_model' AND value = old.model;
+  UPDATE fleet_stats SET count = count - 1 WHERE dimension = 'mower_site' AND value = old.site;
+  UPDATE fleet_stats SET count = count - 1 WHERE dimension = 'mower_status' AND value = old.status;
+  INSERT INTO fleet_stats (dimension, value, count) VALUES ('mower_model', new.model, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+  INSERT INTO fleet_stats (dimension, value, count) VALUES ('mower_site', new.site, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+  INSERT INTO fleet_stats (dimension, value, count) VALUES ('mower_status', new.status, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS work_orders_stats_ai AFTER INSERT ON work_orders BEGIN
+  INSERT INTO fleet_stats (dimension, value, count) VALUES ('work_orders_total', '', 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+  INSERT INTO fleet_stats (dimension, value, count) VALUES ('wo_status', new.status, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+  INSERT INTO fleet_stats (dimension, value, count) VALUES ('wo_priority', new.priority, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS work_orders_stats_ad AFTER DELETE ON work_orders BEGIN
+  UPDATE fleet_stats SET count = count - 1 WHERE dimension = 'work_orders_total' AND value = '';
+  UPDATE fleet_stats SET count = count - 1 WHERE dimension = 'wo_status' AND value = old.status;
+  UPDATE fleet_stats SET count = count - 1 WHERE dimension = 'wo_priority' AND value = old.priority;
+END;
+
+CREATE TRIGGER IF NOT EXISTS work_orders_stats_au AFTER UPDATE OF status, priority ON work_orders BEGIN
+  UPDATE fleet_stats SET count = count - 1 WHERE dimension = 'wo_status' AND value = old.status;
+  UPDATE fleet_stats SET count = count - 1 WHERE dimension = 'wo_priority' AND value = old.priority;
+  INSERT INTO fleet_stats (dimension, value, count) VALUES ('wo_status', new.status, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+  INSERT INTO fleet_stats (dimension, value, count) VALUES ('wo_priority', new.priority, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+END;
+
+-- Bestand zählen; idempotent (auch zum Reparieren: siehe STATS_REBUILD_SQL)
+""" + STATS_REBUILD_SQL
+
+# Token-Verbrauch der LLM-Calls (usage_log.py schreibt gepuffert, /usage aggregiert)
+USAGE_SQL = """
+CREATE TABLE IF NOT EXISTS llm_usage (
+  id INTEGER PRIMARY KEY,
+  ts TEXT NOT NULL,
+  request_id TEXT NOT NULL,
+  session_id TEXT,
+  feature TEXT,
+  endpoint TEXT,
+  operation TEXT NOT NULL,
+  step INTEGER NOT NULL DEFAULT 0,
+  model TEXT,
+  prompt_tokens INTEGER NOT NULL DEFAULT 0,
+  completion_tokens INTEGER NOT NULL DEFAULT 0,
+  total_tokens INTEGER NOT NULL DEFAULT 0,
+  cached_tokens INTEGER NOT NULL DEFAULT 0,
+  latency_ms REAL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_ts ON llm_usage(ts);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_session_ts ON llm_usage(session_id, ts);
+"""
+
+# Versionierte Migrationen: (Version, Name, SQL). Stand steht in PRAGMA user_version;
+# neue Migrationen nur hinten anhängen, bestehende nie ändern.
+MIGRATIONS = [
+    (1, "work_orders_fts", FTS_SQL),
+    (2, "secondary_indexes", INDEX_SQL),
+    # Keyset-Pagination der Mower-Liste mit Status-Filter (status = ? AND id > ? ORDER BY id)
+    (3, "mowers_status_id", "CREATE INDEX IF NOT EXISTS idx_mowers_status_id ON mowers(status, id);"),
+    (4, "fleet_stats", STATS_SQL),
+    # Wartung überfällig (last_service_date < Stichtag), siehe db_overdue_maintenance
+    (5, "mowers_last_service", "CREATE INDEX IF NOT EXISTS idx_mowers_last_service ON mowers(last_service_date);"),
+    (6, "llm_usage", USAGE_SQL),
+    # redundant zu idx_work_orders_status_priority (gleiches Präfix status)
+    (7, "drop_work_orders_status", "DROP INDEX IF EXISTS idx_work_orders_status;"),
+    (8, "mowers_fts", MOWERS_FTS_SQL),
+]
+
+
+def migrate(conn: sqlite3.Connection) -> list:
+    """Führt alle noch nicht angewendeten Migrationen aus; liefert die Namen der neuen."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    applied = []
+    for version, name, sql in MIGRATIONS:
+        if version <= current:
+            continue
+        # executescript committet vorher; Migration + Versionsnummer in einer Transaktion
+        conn.executescript(f"BEGIN;\n{sql}\nPRAGMA user_version = {version};\nCOMMIT;")
+        applied.append(name)
+    return applied
+
+
+def explain_index_usage(conn: sqlite3.Connection) -> list:
+    """
+    EXPLAIN QUERY PLAN für alle gefilterten Listen-Queries aus db_query.py.
+    Liefert die Queries, die trotz Filter die ganze Tabelle scannen (sollte leer sein).
+    Jeder Schritt muss SEARCH sein: "SCAN ... USING (COVERING) INDEX" liest auch alles.
+    """
+    queries = [
+        mower_list_query(status="AVAILABLE", limit=50),
+        mower_list_query(status="AVAILABLE", limit=50, cursor="GM-A-001"),
+        mower_list_query(limit=50, cursor="GM-A-001"),
+        work_order_list_query(cursor=100),
+        overdue_mowers_query("2026-01-01"),
+    ]
+    for status, priority, mower_id, cursor in product([None, "OPEN"], [None, "HIGH"], [None, "GM-A-001"], [None, 100]):
+        if status or priority or mower_id:
+            queries.append(work_order_list_query(status=status, priority=priority, mower_id=mower_id, cursor=cursor))
+
+    problems = []
+    for q in queries:
+        sql, params = q.build()
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        if not any(step.startswith("SEARCH") for step in plan) or any(step.startswith("SCAN") for step in plan):
+            problems.append((sql, plan))
+    return problems
+
+
 # Optional: Demo-Daten (nur wenn mower_models noch leer ist)
 SEED_SQL = """
 INSERT INTO mower_models (brand, product_line, model_name, tagline, description)
@@ -60,6 +334,10 @@ def main():
     cur.executescript(SCHEMA_SQL)
     conn.commit()
 
+    # Migrationen (Volltextindex, Sekundärindexe, ...)
+    applied = migrate(conn)
+    print(f"Migrations applied: {applied}" if applied else "Migrations: up to date.")
+
     # Seed nur, wenn leer
     cur.execute("SELECT COUNT(*) AS c FROM mower_models")
     count = cur.fetchone()["c"]
@@ -76,6 +354,16 @@ def main():
     tables = [r["name"] for r in cur.fetchall()]
     print("Tables:", tables)
 
+    # python db_init.py --check  => prüft per EXPLAIN QUERY PLAN, dass gefilterte Listen Indexe nutzen
+    if "--check" in sys.argv:
+        problems = explain_index_usage(conn)
+        for sql, plan in problems:
+            print(f"NO INDEX: {sql}\n  plan: {plan}")
+        print("Index check: OK" if not problems else f"Index check: {len(problems)} queries scan the full table")
+        if problems:
+            conn.close()
+            sys.exit(1)
+
     conn.close()
     print("DB init complete.")
 
@@ -0,0 +1,184 @@
+from typing import List, Optional, Tuple
+
+
+class SelectQuery:
+    """
+    Mini-Query-Builder für SQLite.
+
+    Nur Filter mit Wert werden zu Prädikaten. Das alte Muster (? IS NULL OR col = ?)
+    verhindert jede Index-Nutzung, weil SQLite den Ausdruck nicht auf den Index abbilden kann.
+    """
+
+    def __init__(self, table: str, columns: List[str]):
+        self.table = table
+        self.columns = columns
+        self._joins: List[str] = []
+        self._where: List[str] = []
+        self._params: list = []
+        self._group_by: Optional[str] = None
+        self._order_by: Optional[str] = None
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+
+    def join(self, clause: str) -> "SelectQuery":
+        self._joins.append(clause)
+        return self
+
+    def where(self, expr: str, *params) -> "SelectQuery":
+        self._where.append(expr)
+        self._params.extend(params)
+        return self
+
+    def eq(self, column: str, value) -> "SelectQuery":
+        if value is not None and value != "":
+            self.where(f"{column} = ?", value)
+        return self
+
+    def group_by(self, clause: str) -> "SelectQuery":
+        self._group_by = clause
+        return self
+
+    def order_by(self, clause: str) -> "SelectQuery":
+        self._order_by = clause
+        return self
+
+    def limit(self, n: int, offset: Optional[int] = None) -> "SelectQuery":
+        self._limit = n
+        self._offset = offset
+        return self
+
+    def build(self) -> Tuple[str, list]:
+        sql = f"SELECT {', '.join(self.columns)} FROM {self.table}"
+        params = list(self._params)
+        for j in self._joins:
+            sql += f" {j}"
+        if self._where:
+            sql += " WHERE " + " AND ".join(self._where)
+        if self._group_by:
+            sql += f" GROUP BY {self._group_by}"
+        if self._order_by:
+            sql += f" ORDER BY {self._order_by}"
+        if self._limit is not None:
+            sql += " LIMIT ?"
+            params.append(self._limit)
+            if self._offset:
+                sql += " OFFSET ?"
+                params.append(self._offset)
+        return sql, params
+
+
+def mower_contains(column: str, text: str) -> Tuple[str, list]:
+    """
+    Prädikat "mowers.column enthält text" (case-insensitiv) für model/site. Ab 3 Zeichen über den
+    Trigram-Index mowers_fts (Phrase = Teilstring, auch mit % oder _ im Text); kürzer kann der
+    Trigram-Index nicht => LIKE-Scan.
+    """
+    if column not in ("model", "site"):
+        raise ValueError(f"not indexed in mowers_fts: {column}")
+    if len(text) >= 3:
+        phrase = text.replace('"', '""')
+        return "rowid IN (SELECT rowid FROM mowers_fts WHERE mowers_fts MATCH ?)", [f'{column} : "{phrase}"']
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{column} LIKE ? ESCAPE '\\'", [f"%{escaped}%"]
+
+
+def fts_match_query(text: str) -> str:
+    """
+    FTS5-MATCH-Ausdruck für work_orders_fts (API und Database-Page): jedes Wort als Präfix-Term,
+    implizit UND; Quoting verhindert FTS-Syntaxfehler. Wörter trennen wie der unicode61-Tokenizer
+    (alles außer Buchstaben/Ziffern, also auch "_").
+    """
+    terms = "".join(ch if ch.isalnum() else " " for ch in (text or "").lower()).split()
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+MOWER_COLUMNS = ["id", "model", "site", "status", "last_service_date"]
+WORK_ORDER_COLUMNS = ["id", "mower_id", "title", "priority", "status", "owner", "created_at"]
+
+
+def mower_list_query(
+    status: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> SelectQuery:
+    # Keyset-Pagination: Cursor = letzte id der Vorseite (aufsteigend sortiert)
+    q = SelectQuery("mowers", MOWER_COLUMNS).eq("status", status)
+    if cursor:
+        q.where("id > ?", cursor)
+    q.order_by("id")
+    if limit is not None:
+        q.limit(limit)
+    return q
+
+
+def work_order_list_query(
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    mower_id: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[int] = None,
+) -> SelectQuery:
+    # Keyset-Pagination: Cursor = letzte id der Vorseite (absteigend sortiert)
+    q = (
+        SelectQuery("work_orders", WORK_ORDER_COLUMNS)
+        .eq("status", status)
+        .eq("priority", priority)
+        .eq("mower_id", mower_id)
+    )
+    if cursor is not None:
+        q.where("id < ?", int(cursor))
+    return q.order_by("id DESC").limit(limit)
+
+
+def keyset_page(rows: List[dict], limit: int, key: str = "id") -> Tuple[List[dict], Optional[object]]:
+    """Rows wurden mit LIMIT limit + 1 geholt: kürzt auf limit und liefert den nächsten Cursor."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1][key]
+    return rows, None
+
+
+# ---- Aggregationen (GROUP BY in SQL statt Zeilen zählen im Modell) ----
+
+# Gruppier-/Filter-Spalten pro Entität: Name -> SQL-Ausdruck.
+# Work Orders können nach Standort/Modell ihres Mowers gruppiert werden (JOIN nur bei Bedarf).
+GROUP_COLUMNS = {
+    "mowers": {"status": "m.status", "site": "m.site", "model": "m.model"},
+    "work_orders": {
+        "status": "w.status", "priority": "w.priority", "owner": "w.owner",
+        "mower_id": "w.mower_id", "site": "m.site", "model": "m.model",
+    },
+}
+
+
+def group_count_query(entity: str, group_by: List[str], filters: Optional[dict] = None) -> SelectQuery:
+    cols = GROUP_COLUMNS[entity]
+    exprs = [cols[g] for g in group_by]
+    q = SelectQuery(
+        "mowers m" if entity == "mowers" else "work_orders w",
+        [f"{cols[g]} AS {g}" for g in group_by] + ["COUNT(*) AS count"],
+    )
+    filters = filters or {}
+    if entity == "work_orders" and any(cols[c].startswith("m.") for c in list(group_by) + list(filters)):
+        q.join("LEFT JOIN mowers m ON m.id = w.mower_id")  # auch Work Orders ohne (bekannten) Mower zählen
+    for col, value in filters.items():
+        q.eq(cols[col], value)
+    return q.group_by(", ".join(exprs)).order_by("count DESC, " + ", ".join(exprs))
+
+
+def overdue_predicate(q: SelectQuery, cutoff: str) -> SelectQuery:
+    # nie gewartet (NULL/leer) oder letzte Wartung vor dem Stichtag (ISO-Datum, vergleicht als Text).
+    # '' < jedes Datum => deckt "< ?" mit ab. likelihood(): überfällig ist die Ausnahme => zwei Bereiche
+    # auf idx_mowers_last_service (MULTI-INDEX OR) statt Scan des ganzen Index in ORDER-BY-Reihenfolge
+    return q.where("likelihood(last_service_date IS NULL OR last_service_date < ?, 0.05)", cutoff)
+
+
+def overdue_mowers_query(cutoff: str, site: Optional[str] = None, limit: int = 20) -> SelectQuery:
+    q = overdue_predicate(SelectQuery("mowers", MOWER_COLUMNS), cutoff).eq("site", site)
+    # nie gewartete zuerst (NULL/'' sortieren vor jedem Datum), dann die älteste Wartung
+    return q.order_by("last_service_date ASC, id").limit(limit)
+
+
+def overdue_counts_query(cutoff: str, site: Optional[str] = None) -> SelectQuery:
+    q = overdue_predicate(SelectQuery("mowers", ["site", "COUNT(*) AS count"]), cutoff).eq("site", site)
+    return q.group_by("site").order_by("count DESC, site")
@@ -0,0 +1,62 @@
+"""
+Lokaler Fake für die Chat-Completions-API (zum Testen von llm_gateway.py ohne Azure).
+
+Start (im Ordner test_aoai):
+    python -m uvicorn fake_llm:app --port 8001
+    AZURE_OPENAI_BASE_URL=http://127.0.0.1:8001/v1/ python -m uvicorn app:app
+
+Verhalten per env: FAKE_LLM_LATENCY_MS, FAKE_LLM_429_RATE, FAKE_LLM_500_RATE (0..1),
+FAKE_LLM_RETRY_AFTER (Sekunden im Retry-After-Header bei 429).
+"""
+import asyncio
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "200"))
+RATE_429 = float(os.getenv("FAKE_LLM_429_RATE", "0"))
+RATE_500 = float(os.getenv("FAKE_LLM_500_RATE", "0"))
+RETRY_AFTER = os.getenv("FAKE_LLM_RETRY_AFTER", "1")
+
+app = FastAPI()
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await asyncio.sleep(LATENCY_MS / 1000)
+
+    roll = random.random()
+    if roll < RATE_429:
+        return JSONResponse(
+            {"error": {"message": "Rate limit exceeded (fake)", "type": "rate_limit", "code": "429"}},
+            status_code=429,
+            headers={"Retry-After": RETRY_AFTER},
+        )
+    if roll < RATE_429 + RATE_500:
+        return JSONResponse({"error": {"message": "Internal error (fake)", "type": "server_error"}}, status_code=500)
+
+    last = next((m.get("content") or "" for m in reversed(body.get("messages", [])) if m.get("role") == "user"), "")
+    prompt_tokens = sum(len(str(m.get("content") or "")) for m in body.get("messages", [])) // 4
+    reply = f"(fake) {last[:200]}"
+    completion_tokens = len(reply) // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": reply},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
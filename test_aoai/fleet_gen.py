@@ -0,0 +1,334 @@
+"""
+Synthetische Flotten-Daten für greenmow.db: 10k..1M Mower, bis ~10M Work Orders.
+
+Aufruf (im Ordner test_aoai; --db ist Pflicht, damit nicht versehentlich greenmow.db wächst):
+    python fleet_gen.py --db /tmp/fleet.db --mowers 10000 --work-orders 200000
+    python fleet_gen.py --db /tmp/fleet.db --mowers 1000000 --work-orders 10000000 --seed 7
+    python fleet_gen.py --db /tmp/fleet.db --reset --mowers 0 --work-orders 0   # synthetische Zeilen entfernen
+
+Verteilungen (deterministisch pro --seed und --as-of):
+- Sites/Modelle/Owner/Titel Zipf-verteilt (wenige Sites haben die halbe Flotte)
+- Mower-Status überwiegend AVAILABLE; last_service_date meist < 90 Tage, mit langem Schwanz
+- Work Orders häufen sich auf "heißen" Mowern (Zipf) und defekten Mowern, neuere Tage dichter;
+  Status hängt vom Alter ab (alt => DONE/CANCELLED, frisch => OPEN/IN_PROGRESS)
+
+Synthetische Mower haben IDs "GM-S-0000001" (Demo-Daten "GM-A-..." bleiben unberührt); --reset
+löscht nur diese und ihre Work Orders.
+
+Bulk-Modus (nur für neue/leere Dateien oder mit --scratch): synchronous=OFF, journal_mode=MEMORY,
+Trigger und Sekundärindexe werden während des Ladens entfernt und danach neu angelegt; Volltextindex
+und fleet_stats werden einmal am Ende komplett neu berechnet (statt pro Zeile per Trigger). Ein
+Absturz kann die Datei dabei unbrauchbar machen. Bestehende Datenbanken werden deshalb sonst im
+normalen Modus befüllt (langsamer, Trigger laufen pro Zeile); greenmow.db nie im Bulk-Modus.
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from db_init import DB_PATH, FTS_REBUILD_SQL, MOWERS_FTS_REBUILD_SQL, SCHEMA_SQL, STATS_REBUILD_SQL, migrate
+
+SYNTH_PREFIX = "GM-S-"
+BATCH_SIZE = 50_000
+
+CITIES = [
+    "Berlin", "Hamburg", "München", "Köln", "Frankfurt", "Stuttgart", "Düsseldorf", "Leipzig",
+    "Dortmund", "Essen", "Bremen", "Dresden", "Hannover", "Nürnberg", "Bochum", "Wuppertal",
+]
+SITE_KINDS = [
+    "City Park", "Campus", "Warehouse", "Stadium", "Golf Club", "Business Park", "Cemetery", "Hospital",
+]
+MODELS = [("GM-100", 50), ("GM-200", 30), ("GM-300", 15), ("GM-300X", 5)]
+MOWER_STATUS = [("AVAILABLE", 62), ("IN_SERVICE", 24), ("MAINTENANCE", 9), ("OUT_OF_ORDER", 5)]
+# defekte/in Wartung befindliche Mower bekommen mehr Work Orders
+STATUS_WO_FACTOR = {"AVAILABLE": 1.0, "IN_SERVICE": 1.2, "MAINTENANCE": 3.0, "OUT_OF_ORDER": 5.0}
+PRIORITY = [("LOW", 30), ("MEDIUM", 45), ("HIGH", 20), ("CRITICAL", 5)]
+# Status nach Alter der Work Order (Tage): (max_alter, Verteilung)
+WO_STATUS_BY_AGE = [
+    (7, [("OPEN", 55), ("IN_PROGRESS", 35), ("DONE", 8), ("CANCELLED", 2)]),
+    (60, [("OPEN", 20), ("IN_PROGRESS", 25), ("DONE", 50), ("CANCELLED", 5)]),
+    (None, [("OPEN", 3), ("IN_PROGRESS", 2), ("DONE", 85), ("CANCELLED", 10)]),
+]
+TITLES = [
+    "Scheduled maintenance", "Blade replacement due", "Navigation failures reported",
+    "Battery does not hold charge", "Wi-Fi reconnect loop", "Boundary wire break",
+    "GNSS drift near buildings", "Rain sensor false positive", "Wheel motor overcurrent",
+    "Firmware update failed", "Obstacle detection false positive", "Charging station contact corrosion",
+    "Cutting height actuator stuck", "App schedule not applied", "Lift sensor triggered",
+    "Traction loss on slope", "Camera errors in low light", "Mäher bleibt in der Ladestation",
+    "Messer stumpf", "Akku lädt nicht", "Begrenzungsdraht unterbrochen", "Lautes Geräusch am Mähwerk",
+    "Kartenupdate nach Umbau", "Stuck in wet grass", "Unexpected shutdown during mowing",
+]
+OWNERS = [
+    "Mila", "Jonas", "Lea", "Finn", "Emma", "Paul", "Hannah", "Luca", "Sophie", "Ben", "Marie", "Elias",
+    "Anna", "Noah", "Lina", "Felix", "Clara", "Leon", "Ida", "Theo", "Nele", "Karl", "Frieda", "Anton",
+    "Greta", "Oskar", "Mats", "Ella", "Jakob", "Zoe",
+]
+UNASSIGNED_RATE = 0.08
+
+
+def zipf_cum_weights(n: int, s: float = 1.1) -> List[float]:
+    return list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def weighted(pairs: Sequence[Tuple[str, int]]):
+    values, weights = zip(*pairs)
+    return list(values), list(itertools.accumulate(weights))
+
+
+def all_sites(rng: random.Random, n: int) -> List[str]:
+    sites = [f"{kind} {city}" for city in CITIES for kind in SITE_KINDS]
+    rng.shuffle(sites)  # welche Site "groß" ist, hängt vom Seed ab
+    return sites[:max(1, min(n, len(sites)))]
+
+
+# ----------------- Zeilen erzeugen -----------------
+
+def mower_rows(rng: random.Random, start: int, count: int, sites: List[str], as_of: date) -> Iterator[tuple]:
+    site_cw = zipf_cum_weights(len(sites))
+    models, model_cw = weighted(MODELS)
+    statuses, status_cw = weighted(MOWER_STATUS)
+    for i in range(start, start + count):
+        status = rng.choices(statuses, cum_weights=status_cw)[0]
+        if rng.random() < 0.02:
+            last_service = None  # nie gewartet
+        else:
+            # meist innerhalb des Wartungsintervalls, langer Schwanz (vergessene Mower)
+            days = min(int(rng.expovariate(1 / 45)), 1500)
+            if status == "MAINTENANCE":
+                days = min(days, 10)
+            last_service = (as_of - timedelta(days=days)).isoformat()
+        yield (
+            f"{SYNTH_PREFIX}{i:07d}",
+            rng.choices(models, cum_weights=model_cw)[0],
+            rng.choices(sites, cum_weights=site_cw)[0],
+            status,
+            last_service,
+        )
+
+
+def work_order_rows(
+    rng: random.Random, count: int, mowers: List[Tuple[str, str]], days: int, as_of: datetime
+) -> Iterator[tuple]:
+    # Gewicht pro Mower: Zipf über eine zufällige Reihenfolge (heiße Mower) x Status-Faktor
+    order = list(range(len(mowers)))
+    rng.shuffle(order)
+    weights = [0.0] * len(mowers)
+    for rank, idx in enumerate(order, 1):
+        weights[idx] = STATUS_WO_FACTOR.get(mowers[idx][1], 1.0) / (rank ** 0.5)
+    mower_cw = list(itertools.accumulate(weights))
+    mower_ids = [m[0] for m in mowers]
+    title_cw = zipf_cum_weights(len(TITLES), 0.9)
+    owner_cw = zipf_cum_weights(len(OWNERS), 0.7)
+    priorities, priority_cw = weighted(PRIORITY)
+    by_age = [(max_age, *weighted(dist)) for max_age, dist in WO_STATUS_BY_AGE]
+    span = days * 86400
+    for _ in range(count):
+        # u**1.6 => neuere Zeitpunkte dichter (wachsende Flotte)
+        age = span * rng.random() ** 1.6
+        created = as_of - timedelta(seconds=age)
+        age_days = age / 86400
+        for max_age, statuses, status_cw in by_age:
+            if max_age is None or age_days < max_age:
+                status = rng.choices(statuses, cum_weights=status_cw)[0]
+                break
+        owner = None
+        if not (status == "OPEN" and rng.random() < UNASSIGNED_RATE * 4) and rng.random() >= UNASSIGNED_RATE:
+            owner = rng.choices(OWNERS, cum_weights=owner_cw)[0]
+        yield (
+            rng.choices(mower_ids, cum_weights=mower_cw)[0],
+            rng.choices(TITLES, cum_weights=title_cw)[0],
+            rng.choices(priorities, cum_weights=priority_cw)[0],
+            status,
+            owner,
+            created.strftime("%Y-%m-%d %H:%M:%S"),
+        )
+
+
+# ----------------- Laden -----------------
+
+def _batches(rows: Iterator[tuple], size: int = BATCH_SIZE) -> Iterator[List[tuple]]:
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _insert(conn: sqlite3.Connection, label: str, sql: str, rows: Iterator[tuple], total: int) -> None:
+    t0 = time.perf_counter()
+    done = 0
+    for batch in _batches(rows):
+        conn.executemany(sql, batch)
+        conn.commit()
+        done += len(batch)
+        if done % 1_000_000 < BATCH_SIZE or done == total:
+            rate = done / max(time.perf_counter() - t0, 1e-9)
+            print(f"  {label}: {done:,}/{total:,} ({rate:,.0f} rows/s)")
+
+
+def drop_derived(conn: sqlite3.Connection) -> List[str]:
+    """Trigger + Sekundärindexe auf mowers/work_orders entfernen; liefert ihr SQL zum Neuanlegen."""
+    rows = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master "
+        "WHERE type IN ('index', 'trigger') AND tbl_name IN ('mowers', 'work_orders') AND sql IS NOT NULL"
+    ).fetchall()
+    for kind, name, _ in rows:
+        conn.execute(f'DROP {kind.upper()} IF EXISTS "{name}"')
+    conn.commit()
+    return [sql for kind, _, sql in sorted(rows, key=lambda r: (r[0] != "index", r[1]))]
+
+
+def restore_derived(conn: sqlite3.Connection, ddl: List[str]) -> None:
+    t0 = time.perf_counter()
+    for sql in ddl:
+        if sql.lstrip().upper().startswith("CREATE INDEX"):
+            conn.execute(sql)
+    conn.commit()
+    print(f"  indexes: {time.perf_counter() - t0:.1f}s")
+    t0 = time.perf_counter()
+    conn.executescript(f"BEGIN;\n{FTS_REBUILD_SQL}\n{MOWERS_FTS_REBUILD_SQL}\n{STATS_REBUILD_SQL}\nCOMMIT;")
+    print(f"  fts + fleet_stats: {time.perf_counter() - t0:.1f}s")
+    for sql in ddl:
+        if not sql.lstrip().upper().startswith("CREATE INDEX"):
+            conn.execute(sql)
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def is_fresh(db_path: str) -> bool:
+    """Datei fehlt oder enthält noch keine Mower/Work Orders => ein Absturz kostet nichts."""
+    if not os.path.exists(db_path) or os.path.getsize(db_path) == 0:
+        return True
+    conn = sqlite3.connect(db_path)
+    try:
+        for table in ("mowers", "work_orders"):
+            try:
+                if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                    return False
+            except sqlite3.OperationalError:
+                pass  # Tabelle fehlt noch
+        return True
+    finally:
+        conn.close()
+
+
+def generate(
+    db_path: str,
+    n_mowers: int,
+    n_work_orders: int,
+    seed: int = 42,
+    sites: int = 60,
+    days: int = 730,
+    as_of: Optional[datetime] = None,
+    reset: bool = False,
+    bulk: Optional[bool] = None,
+) -> dict:
+    """bulk: None = nur, wenn die Datei neu/leer ist (is_fresh); True nur für Wegwerf-Dateien."""
+    if bulk is None:
+        bulk = is_fresh(db_path)
+    if bulk and Path(db_path).resolve() == DB_PATH.resolve() and not is_fresh(db_path):
+        raise ValueError(f"refusing bulk mode (synchronous=OFF, dropped triggers) on {DB_PATH}")
+    as_of = as_of or datetime.now().replace(microsecond=0)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SCHEMA_SQL)
+        migrate(conn)
+        conn.execute("PRAGMA cache_size = -262144")  # 256 MB
+        if bulk:
+            # nur für diese Verbindung; bei Absturz: Datei neu generieren
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute("PRAGMA journal_mode = MEMORY")
+
+        ddl = drop_derived(conn) if bulk else []
+        try:
+            if reset:
+                t0 = time.perf_counter()
+                conn.execute(
+                    "DELETE FROM work_orders WHERE mower_id >= ? AND mower_id < ?", (SYNTH_PREFIX, SYNTH_PREFIX[:-1] + ".")
+                )
+                conn.execute("DELETE FROM mowers WHERE id >= ? AND id < ?", (SYNTH_PREFIX, SYNTH_PREFIX[:-1] + "."))
+                conn.commit()
+                print(f"  reset: {time.perf_counter() - t0:.1f}s")
+
+            last = conn.execute(
+                "SELECT max(id) FROM mowers WHERE id >= ? AND id < ?", (SYNTH_PREFIX, SYNTH_PREFIX[:-1] + ".")
+            ).fetchone()[0]
+            start = int(last[len(SYNTH_PREFIX):]) + 1 if last else 1
+            _insert(
+                conn,
+                "mowers",
+                "INSERT INTO mowers (id, model, site, status, last_service_date) VALUES (?, ?, ?, ?, ?)",
+                mower_rows(rng, start, n_mowers, all_sites(rng, sites), as_of.date()),
+                n_mowers,
+            )
+            if n_work_orders:
+                mowers = conn.execute(
+                    "SELECT id, status FROM mowers WHERE id >= ? AND id < ? ORDER BY id",
+                    (SYNTH_PREFIX, SYNTH_PREFIX[:-1] + "."),
+                ).fetchall()
+                if not mowers:
+                    raise ValueError("work orders need mowers (--mowers > 0)")
+                _insert(
+                    conn,
+                    "work_orders",
+                    "INSERT INTO work_orders (mower_id, title, priority, status, owner, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    work_order_rows(rng, n_work_orders, mowers, days, as_of),
+                    n_work_orders,
+                )
+        finally:
+            if bulk:
+                restore_derived(conn, ddl)
+            else:
+                conn.execute("ANALYZE")
+                conn.commit()
+
+        return {
+            "mowers": conn.execute("SELECT COUNT(*) FROM mowers").fetchone()[0],
+            "work_orders": conn.execute("SELECT COUNT(*) FROM work_orders").fetchone()[0],
+        }
+    finally:
+        conn.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Synthetische Mower/Work Orders in greenmow.db schreiben")
+    ap.add_argument("--db", required=True, help="Ziel-Datenbank, z.B. /tmp/fleet.db")
+    ap.add_argument("--mowers", type=int, default=10_000)
+    ap.add_argument("--work-orders", type=int, default=100_000)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--sites", type=int, default=60, help=f"Anzahl Sites (max {len(CITIES) * len(SITE_KINDS)})")
+    ap.add_argument("--days", type=int, default=730, help="Zeitraum der Work Orders (Tage bis --as-of)")
+    ap.add_argument("--as-of", type=date.fromisoformat, help="Stichtag YYYY-MM-DD (Default: heute)")
+    ap.add_argument("--reset", action="store_true", help="vorher synthetische Zeilen (GM-S-*) löschen")
+    ap.add_argument(
+        "--scratch", action="store_true",
+        help="Datei ist Wegwerf-Kopie: Bulk-Modus auch, wenn sie schon Daten enthält (nie für greenmow.db)",
+    )
+    args = ap.parse_args()
+    if args.mowers < 0 or args.work_orders < 0 or args.days < 1:
+        ap.error("--mowers/--work-orders must be >= 0 and --days >= 1")
+
+    as_of = datetime.combine(args.as_of, datetime.min.time()) if args.as_of else None
+    bulk = True if args.scratch else is_fresh(args.db)
+    print(f"Using DB: {args.db} ({'bulk' if bulk else 'safe'} mode)")
+    t0 = time.perf_counter()
+    try:
+        counts = generate(
+            args.db, args.mowers, args.work_orders,
+            seed=args.seed, sites=args.sites, days=args.days, as_of=as_of, reset=args.reset, bulk=bulk,
+        )
+    except ValueError as e:
+        ap.error(str(e))
+    print(f"Done in {time.perf_counter() - t0:.1f}s: {counts['mowers']:,} mowers, {counts['work_orders']:,} work orders")
+
+
+if __name__ == "__main__":
+    main()
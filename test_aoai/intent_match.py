@@ -0,0 +1,171 @@
+import json
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+
+# ----------------------------
+# Sprach-/Intent-Erkennung für /chat (Konfiguration: intents.json)
+# ----------------------------
+# Trigger-Phrasen und die Antworttexte pro Sprache kommen aus der Konfiguration: eine neue Sprache
+# braucht keine Code-Änderung. Alle Phrasen werden in einen Aho-Corasick-Automaten kompiliert, der
+# eine Nachricht in einem einzigen Durchlauf klassifiziert (statt vieler any(x in t ...) Schleifen).
+
+# Texte, die jede Sprache in intents.json mitbringen muss ("texts"); system = Zeilen des
+# System-Prompts, {bot_name} wird ersetzt
+REQUIRED_TEXTS = (
+    "name", "language_set", "translate_empty", "greeting", "tool_loop_failed",
+    "system", "name_correction", "kb_loading",
+)
+
+
+class TriggerMatcher:
+    """Aho-Corasick Automat über Zeichen: liefert alle Labels der enthaltenen Phrasen."""
+
+    def __init__(self, patterns: Dict[str, Set[tuple]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Set[tuple]] = [set()]
+
+        for phrase, labels in patterns.items():
+            node = 0
+            for ch in phrase:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(set())
+                node = nxt
+            self._out[node] |= labels
+
+        # Fail-Links per BFS; Outputs der Fail-Kette werden direkt mitgeführt
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Set[tuple]:
+        found: Set[tuple] = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+@dataclass
+class MessageIntent:
+    normalized: str
+    explicit_lang: Optional[str]       # Sprache, wenn explizit gewünscht
+    detected_lang: str                 # Heuristik (explizit > nur Sprache > Zeichen > Marker)
+    translate_to: Optional[str]        # Ziel, wenn letzte Antwort übersetzt werden soll
+    language_only: Optional[str]       # Nachricht ist nur "english"/"deutsch"/...
+    greeting_only: bool
+    mentions_other_bot: bool
+
+
+def normalize(s: str) -> str:
+    return " ".join((s or "").strip().lower().split())
+
+
+def load_intents(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+
+    patterns: Dict[str, Set[tuple]] = {}
+
+    def add(phrase: str, label: tuple):
+        phrase = phrase.lower()
+        if phrase:
+            patterns.setdefault(phrase, set()).add(label)
+
+    langs = list(cfg.get("languages", {}).keys())
+    if not langs:
+        raise ValueError(f"{path}: no languages configured")
+    language_only: Dict[str, str] = {}
+    texts: Dict[str, dict] = {}
+    for lang in langs:
+        spec = cfg["languages"][lang]
+        # ohne eigene Texte würde eine erkannte Sprache in einer anderen beantwortet
+        missing = [k for k in REQUIRED_TEXTS if not spec.get("texts", {}).get(k)]
+        if missing:
+            raise ValueError(f"{path}: language {lang!r} is missing texts {missing}")
+        texts[lang] = spec["texts"]
+        for p in spec.get("explicit", []):
+            add(p, ("explicit", lang))
+        for p in spec.get("translate", []):
+            add(p, ("translate", lang))
+        for p in spec.get("chars", []):
+            add(p, ("char", lang))
+        for p in spec.get("markers", []):
+            add(p, ("marker", lang, p))
+        for p in spec.get("language_only", []):
+            language_only.setdefault(normalize(p), lang)
+    for p in cfg.get("other_assistant_names", []):
+        add(p, ("other_bot",))
+
+    default_lang = cfg.get("default_lang", langs[0])
+    if default_lang not in texts:
+        raise ValueError(f"{path}: default_lang {default_lang!r} is not a configured language")
+    return {
+        "langs": langs,
+        "default_lang": default_lang,
+        "greetings": {normalize(g) for g in cfg.get("greetings", [])},
+        "language_only": language_only,
+        "texts": texts,
+        "matcher": TriggerMatcher(patterns),
+    }
+
+
+def classify_message(text: str, intents: dict) -> MessageIntent:
+    t = normalize(text)
+    # gepolstert, damit Marker wie " und " auch am Anfang/Ende greifen
+    labels = intents["matcher"].find(f" {t} ")
+    langs = intents["langs"]
+
+    def first_lang(kind: str) -> Optional[str]:
+        # Reihenfolge aus intents.json entscheidet bei mehreren Treffern
+        return next((lang for lang in langs if (kind, lang) in labels), None)
+
+    explicit = first_lang("explicit")
+    language_only = intents["language_only"].get(t)
+
+    detected = explicit or language_only or first_lang("char")
+    if not detected:
+        scores = {lang: 0 for lang in langs}
+        for label in labels:
+            if label[0] == "marker":
+                scores[label[1]] += 1
+        if not any(scores.values()):
+            detected = intents["default_lang"]
+        else:
+            # Gleichstand: später konfigurierte Sprache gewinnt (wie bisher: de vor en)
+            for lang in langs:
+                if detected is None or scores[lang] >= scores[detected]:
+                    detected = lang
+
+    return MessageIntent(
+        normalized=t,
+        explicit_lang=explicit,
+        detected_lang=detected,
+        translate_to=first_lang("translate"),
+        language_only=language_only,
+        greeting_only=t in intents["greetings"],
+        mentions_other_bot=("other_bot",) in labels,
+    )
+
+
+def system_prompt(intents: dict, lang: str, bot_name: str) -> str:
+    return "".join(f"{line}\n" for line in intents["texts"][lang]["system"]).format(bot_name=bot_name)
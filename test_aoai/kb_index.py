@@ -0,0 +1,847 @@
+import glob
+import math
+import os
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+import numpy as np
+from pypdf import PdfReader
+
+if TYPE_CHECKING:
+    from kb_shards import ShardedIndex
+
+
+def simple_tokenize(text: str) -> List[str]:
+    return [t for t in "".join(ch if ch.isalnum() else " " for ch in (text or "").lower()).split() if t]
+
+
+# ----------------- Streaming-Ingestion (Generatoren) -----------------
+# Datei -> Textblöcke -> gestrippter Strom -> Chunks: kein Schritt hält ein ganzes Dokument.
+
+READ_BLOCK_CHARS = 1 << 20
+
+
+def iter_text_file(path: str, block_chars: int = READ_BLOCK_CHARS) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            block = f.read(block_chars)
+            if not block:
+                return
+            yield block
+
+
+def iter_pdf_text(path: str, page_starts: Optional[List[int]] = None) -> Iterator[str]:
+    """Seite für Seite; Seiten durch "\n" getrennt (wie früher "\n".join).
+    page_starts bekommt den Offset (im ungestrippten Strom), an dem jede Seite beginnt."""
+    reader = PdfReader(path)
+    pos = 0
+    for i, page in enumerate(reader.pages):
+        if i:
+            yield "\n"
+            pos += 1
+        text = page.extract_text() or ""
+        if page_starts is not None:
+            page_starts.append(pos)
+        yield text
+        pos += len(text)
+
+
+def iter_file_text(path: str, page_starts: Optional[List[int]] = None) -> Iterator[str]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in [".txt", ".md"]:
+        return iter_text_file(path)
+    if ext == ".pdf":
+        return iter_pdf_text(path, page_starts)
+    raise ValueError(f"Unsupported file type: {ext}")
+
+
+def count_leading_ws(pieces: Iterable[str], out: List[int]) -> Iterator[str]:
+    """Reicht den Strom durch; out[0] = Länge des führenden Whitespace (den strip_stream entfernt)."""
+    out[:] = [0]
+    counting = True
+    for piece in pieces:
+        if counting:
+            body = piece.lstrip()
+            out[0] += len(piece) - len(body)
+            counting = not body
+        yield piece
+
+
+def strip_stream(pieces: Iterable[str]) -> Iterator[str]:
+    """Wie str.strip() über den ganzen Strom: führender Whitespace fällt weg, abschließender wird
+    zurückgehalten, bis wieder Text folgt."""
+    started = False
+    pending_ws = ""
+    for piece in pieces:
+        if not started:
+            piece = piece.lstrip()
+            if not piece:
+                continue
+            started = True
+        body = piece.rstrip()
+        if not body:
+            pending_ws += piece
+            continue
+        yield pending_ws + body
+        pending_ws = piece[len(body):]
+
+
+def iter_chunks(pieces: Iterable[str], chunk_size: int = 800, overlap: int = 120) -> Iterator[Tuple[int, int, str]]:
+    """
+    (start, end, text) der Chunks über einen Textstrom. Die Überlappung wird über
+    Blockgrenzen hinweg im Fenster `buf` mitgeführt; Ergebnis identisch zu festen
+    Slices text[i:i + chunk_size] mit Schrittweite chunk_size - overlap.
+    """
+    step = max(1, chunk_size - overlap)
+    buf = ""
+    buf_start = 0
+    next_start = 0
+    for piece in pieces:
+        buf += piece
+        total = buf_start + len(buf)
+        while next_start + chunk_size <= total:
+            s = next_start - buf_start
+            yield next_start, next_start + chunk_size, buf[s:s + chunk_size]
+            next_start += step
+        if next_start > buf_start:
+            buf = buf[next_start - buf_start:]
+            buf_start = next_start
+
+    total = buf_start + len(buf)
+    while next_start < total:
+        s = next_start - buf_start
+        yield next_start, min(next_start + chunk_size, total), buf[s:s + chunk_size]
+        next_start += step
+
+
+# ----------------- Chunk-Metadaten: Quelle, Dateityp, Seite, Sprache, mtime -----------------
+
+# Sprache pro Chunk über Funktionswörter (kein Modell); "" = nicht erkennbar
+LANGS = ("", "de", "en")
+LANG_STOPWORDS = {
+    "de": frozenset(
+        "der die das und ist nicht mit für auf den dem des ein eine einer wird werden sind im zu von bei "
+        "oder auch nach wenn sich aus wie über durch muss".split()
+    ),
+    "en": frozenset(
+        "the and is are not with for on of a an to in be will must or also after if from by this that "
+        "as at it should".split()
+    ),
+}
+LANG_MIN_HITS = 3
+
+
+def detect_lang(tokens: List[str]) -> str:
+    hits = {lang: 0 for lang in LANG_STOPWORDS}
+    for tok in tokens:
+        for lang, words in LANG_STOPWORDS.items():
+            if tok in words:
+                hits[lang] += 1
+    lang, n = max(hits.items(), key=lambda kv: kv[1])
+    if n < LANG_MIN_HITS or list(hits.values()).count(n) > 1:
+        return ""
+    return lang
+
+
+@dataclass(frozen=True)
+class DocMeta:
+    path: str
+    file_type: str  # Endung ohne Punkt: "pdf", "md", "txt"
+    mtime: float
+
+    @classmethod
+    def from_path(cls, path: str) -> "DocMeta":
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = 0.0
+        return cls(path, os.path.splitext(path)[1].lower().lstrip("."), mtime)
+
+
+# ----------------- Chunk-Store: Dokumenttext einmal, Chunks als Offsets -----------------
+
+class Chunk:
+    """Leichte Referenz auf einen Chunk; Text wird erst beim Zugriff (Prompt-Bau) ausgeschnitten."""
+
+    __slots__ = ("store", "idx")
+
+    def __init__(self, store: "ChunkStore", idx: int):
+        self.store = store
+        self.idx = idx
+
+    @property
+    def doc_id(self) -> str:
+        return self.store.doc_id(self.idx)
+
+    @property
+    def text(self) -> str:
+        return self.store.text(self.idx)
+
+    @property
+    def meta(self) -> dict:
+        return self.store.meta(self.idx)
+
+    def __repr__(self) -> str:
+        return f"Chunk({self.doc_id!r})"
+
+
+class ChunkStore:
+    """
+    Alle Dokumenttexte liegen hintereinander in einem segmentierten Puffer (jeder Text
+    genau einmal, Überlappungen werden nicht dupliziert; Segmente = gelesene Blöcke,
+    daher kein finales Zusammenkopieren). Ein Chunk ist nur (doc, start, end, Seite, Sprache)
+    in kompakten Arrays; Datei-Metadaten liegen einmal pro Dokument.
+    """
+
+    def __init__(self):
+        self.doc_names: List[str] = []
+        self.doc_meta: List[Optional[DocMeta]] = []
+        self._doc_first_chunk = array("q")
+        self._segments: List[str] = []
+        self._seg_start = array("q")
+        self._size = 0
+        self._doc_base = 0
+        self._doc = array("i")
+        self._start = array("q")
+        self._end = array("q")
+        self._page = array("i")  # 1-basiert, 0 = keine Seiten (txt/md)
+        self._lang = array("b")  # Index in LANGS
+
+    def __len__(self) -> int:
+        return len(self._doc)
+
+    def __getitem__(self, idx: int) -> Chunk:
+        if not 0 <= idx < len(self._doc):
+            raise IndexError(idx)
+        return Chunk(self, int(idx))
+
+    def begin_document(self, name: str, meta: Optional[DocMeta] = None) -> int:
+        self.doc_names.append(name)
+        self.doc_meta.append(meta)
+        self._doc_first_chunk.append(len(self._doc))
+        self._doc_base = self._size
+        return len(self.doc_names) - 1
+
+    def feed(self, pieces: Iterable[str]) -> Iterator[str]:
+        """Speichert den Textstrom des aktuellen Dokuments und reicht ihn unverändert weiter."""
+        for piece in pieces:
+            if piece:
+                self._segments.append(piece)
+                self._seg_start.append(self._size)
+                self._size += len(piece)
+            yield piece
+
+    def add_chunk(self, start: int, end: int, page: int = 0, lang: str = "") -> int:
+        """Chunk des aktuellen Dokuments; start/end relativ zum Dokumenttext."""
+        self._doc.append(len(self.doc_names) - 1)
+        self._start.append(self._doc_base + start)
+        self._end.append(self._doc_base + end)
+        self._page.append(page)
+        self._lang.append(LANGS.index(lang))
+        return len(self._doc) - 1
+
+    def discard_document(self) -> None:
+        """Rollback des aktuellen (z.B. nur teilweise lesbaren) Dokuments."""
+        first = self._doc_first_chunk.pop()
+        self.doc_names.pop()
+        self.doc_meta.pop()
+        del self._doc[first:], self._start[first:], self._end[first:], self._page[first:], self._lang[first:]
+        keep = bisect_left(self._seg_start, self._doc_base)
+        del self._segments[keep:], self._seg_start[keep:]
+        self._size = self._doc_base
+
+    def add_document(self, name: str, text: str) -> List[Tuple[int, int]]:
+        """Ganzer Text auf einmal (z.B. für Tests); gleiche Chunk-Grenzen wie der Stream."""
+        self.begin_document(name)
+        spans = []
+        for start, end, _ in iter_chunks(self.feed([text])):
+            self.add_chunk(start, end)
+            spans.append((start, end))
+        return spans
+
+    def doc_id(self, idx: int) -> str:
+        doc = self._doc[idx]
+        return f"{self.doc_names[doc]}#chunk{idx - self._doc_first_chunk[doc]}"
+
+    def columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(Dokument, Seite, Sprach-Index) pro Chunk als NumPy-Arrays (für Filter-Bitsets)."""
+        return (
+            np.frombuffer(self._doc, dtype=np.int32) if len(self._doc) else np.zeros(0, dtype=np.int32),
+            np.frombuffer(self._page, dtype=np.int32) if len(self._page) else np.zeros(0, dtype=np.int32),
+            np.frombuffer(self._lang, dtype=np.int8) if len(self._lang) else np.zeros(0, dtype=np.int8),
+        )
+
+    def doc_first_chunks(self) -> array:
+        return self._doc_first_chunk
+
+    def meta(self, idx: int) -> dict:
+        doc = self._doc[idx]
+        dm = self.doc_meta[doc]
+        return {
+            "source": self.doc_names[doc],
+            "file_type": dm.file_type if dm else "",
+            "page": self._page[idx] or None,
+            "lang": LANGS[self._lang[idx]] or None,
+            "mtime": dm.mtime if dm else None,
+        }
+
+    def text(self, idx: int) -> str:
+        start, end = self._start[idx], self._end[idx]
+        seg = bisect_right(self._seg_start, start) - 1
+        parts = []
+        while start < end:
+            seg_text = self._segments[seg]
+            offset = start - self._seg_start[seg]
+            part = seg_text[offset:offset + (end - start)]
+            parts.append(part)
+            start += len(part)
+            seg += 1
+        return parts[0] if len(parts) == 1 else "".join(parts)
+
+
+def ingest_file(path: str, store: ChunkStore, index: "BM25Index", name: str = "") -> int:
+    """Liest, chunked und tokenisiert eine Datei inkrementell; bei Lesefehlern wird das
+    Dokument komplett zurückgerollt und der Fehler weitergereicht. Metadaten (Datei, Seite,
+    Sprache, mtime) werden dabei mit erfasst."""
+    store.begin_document(name or os.path.basename(path), DocMeta.from_path(path))
+    n_before = index.n_docs
+    page_starts: List[int] = []
+    lead = [0]  # führender Whitespace: Seiten-Offsets sind ungestrippt, Chunk-Offsets gestrippt
+    try:
+        pieces = strip_stream(count_leading_ws(iter_file_text(path, page_starts), lead))
+        for start, end, text in iter_chunks(store.feed(pieces)):
+            tokens = simple_tokenize(text)
+            page = bisect_right(page_starts, start + lead[0]) if page_starts else 0
+            store.add_chunk(start, end, page=page, lang=detect_lang(tokens))
+            index.add_document(tokens)
+    except Exception:
+        store.discard_document()
+        index.truncate(n_before)
+        raise
+    return index.n_docs - n_before
+
+
+# ----------------- Vokabular + BM25 auf int32 Token-IDs -----------------
+
+class Vocabulary:
+    """Interniertes Vokabular: jedes Token existiert genau einmal, Dokumente speichern nur IDs."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.terms: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def encode(self, tokens: List[str]) -> np.ndarray:
+        """Tokens -> IDs, unbekannte Tokens werden neu angelegt (nur beim Indexieren)."""
+        ids = self.ids
+        out = np.empty(len(tokens), dtype=np.int32)
+        for i, tok in enumerate(tokens):
+            tid = ids.get(tok)
+            if tid is None:
+                tid = len(self.terms)
+                ids[tok] = tid
+                self.terms.append(tok)
+            out[i] = tid
+        return out
+
+
+def bm25_idf_floor(n_docs: int, df: np.ndarray, epsilon: float = 0.25) -> float:
+    """
+    IDF wie BM25Okapi: negative Werte werden durch epsilon * mittlere IDF ersetzt
+    (bei sehr kleinen Collections ist auch der Mittelwert <= 0 => epsilon, sonst findet nichts mehr).
+    """
+    present = df > 0
+    if not present.any():
+        return epsilon
+    floor = epsilon * float((np.log(n_docs - df[present] + 0.5) - np.log(df[present] + 0.5)).mean())
+    return floor if floor > 0 else epsilon
+
+
+@dataclass(frozen=True)
+class QueryStats:
+    """Globale IDF der Query-Tokens + avgdl; ersetzt beim Scoring die Statistik des einzelnen Index."""
+    idf: Mapping[str, float]
+    avgdl: float
+
+
+@dataclass(frozen=True)
+class CorpusStats:
+    """
+    BM25-Korpusstatistik (N, Summe der Dokumentlängen, df pro Term). Über mehrere Collections
+    zusammengeführt ergibt sie dieselben Werte wie ein gemeinsamer Index => Scores vergleichbar
+    (wie bei den Shards, siehe kb_shards.py).
+    """
+    n_docs: int
+    total_len: int
+    df: Mapping[str, int]
+    idf_floor: float
+
+    @classmethod
+    def of(cls, n_docs: int, total_len: int, df: Mapping[str, int]) -> "CorpusStats":
+        values = np.fromiter(df.values(), dtype=np.int64, count=len(df))
+        return cls(n_docs, total_len, df, bm25_idf_floor(n_docs, values))
+
+    @classmethod
+    def merge(cls, parts: Iterable["CorpusStats"]) -> "CorpusStats":
+        n_docs = total_len = 0
+        df: Dict[str, int] = {}
+        for p in parts:
+            n_docs += p.n_docs
+            total_len += p.total_len
+            for term, n in p.df.items():
+                df[term] = df.get(term, 0) + n
+        return cls.of(n_docs, total_len, df)
+
+    def query(self, tokens: List[str]) -> QueryStats:
+        idf = {}
+        for t in set(tokens):
+            n = self.df.get(t, 0)
+            v = math.log(self.n_docs - n + 0.5) - math.log(n + 0.5)
+            idf[t] = self.idf_floor if v < 0 else v
+        return QueryStats(idf, self.total_len / self.n_docs if self.n_docs else 0.0)
+
+
+class BM25Index:
+    """
+    BM25 (Okapi, gleiche Formel/Parameter wie rank_bm25.BM25Okapi) auf int32 Token-IDs.
+
+    Gespeichert wird nur die Postings-Liste pro Term (post_ptr, post_docs, post_tfs) plus doc_len;
+    die (Doc, Term, tf)-Einträge der Dokumente werden beim finalize nur einmal zwischendurch gebraucht.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.vocab = Vocabulary()
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._pending_len: List[int] = []
+        self.n_docs = 0
+
+    def add_document(self, tokens: List[str]) -> int:
+        ids = self.vocab.encode(tokens)
+        terms, tfs = np.unique(ids, return_counts=True)
+        self._pending.append((terms.astype(np.int32), tfs.astype(np.int32)))
+        self._pending_len.append(len(tokens))
+        self.n_docs += 1
+        return self.n_docs - 1
+
+    def truncate(self, n_docs: int) -> None:
+        """Verwirft noch nicht finalisierte Dokumente ab Position n_docs (Rollback)."""
+        del self._pending[n_docs:], self._pending_len[n_docs:]
+        self.n_docs = n_docs
+
+    def finalize(self) -> "BM25Index":
+        n = self.n_docs
+        lens = np.fromiter((len(t) for t, _ in self._pending), dtype=np.int64, count=n)
+        doc_terms = np.concatenate([t for t, _ in self._pending]) if n else np.zeros(0, dtype=np.int32)
+        doc_tfs = np.concatenate([f for _, f in self._pending]) if n else np.zeros(0, dtype=np.int32)
+        self.doc_len = np.asarray(self._pending_len, dtype=np.int32)
+        self._pending, self._pending_len = [], []
+
+        # Postings: nach Term sortiert (stabil => Doc-IDs je Term aufsteigend)
+        order = np.argsort(doc_terms, kind="stable")
+        doc_of_entry = np.repeat(np.arange(n, dtype=np.int32), lens)
+        self.post_docs = doc_of_entry[order]
+        self.post_tfs = doc_tfs[order]
+        self.df = np.bincount(doc_terms, minlength=len(self.vocab))
+        self.post_ptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(self.df, out=self.post_ptr[1:])
+
+        self.set_stats(n, self.df, float(self.doc_len.mean()) if n else 0.0)
+        return self
+
+    def set_stats(self, n_docs: int, df: np.ndarray, avgdl: float, idf_floor: Optional[float] = None) -> None:
+        """
+        IDF + Längennormierung aus Korpus-Statistiken. Standard: die eigenen; beim Sharding setzt
+        der Koordinator globale Werte (df je eigenem Vokabel-Eintrag, Floor über alle Shards).
+        """
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+        if idf_floor is None:
+            idf_floor = bm25_idf_floor(n_docs, df, self.epsilon)
+        idf[idf < 0] = idf_floor
+        self.idf = idf
+        self._len_norm = self._norm(avgdl)
+
+    def _norm(self, avgdl: float) -> np.ndarray:
+        if not avgdl:
+            return np.full(len(self.doc_len), self.k1)
+        return self.k1 * (1 - self.b + self.b * self.doc_len / avgdl)
+
+    def corpus_stats(self) -> CorpusStats:
+        return CorpusStats.of(self.n_docs, int(self.doc_len.sum()), dict(zip(self.vocab.terms, self.df.tolist())))
+
+    def get_scores(
+        self, tokens: List[str], mask: Optional[np.ndarray] = None, stats: Optional[QueryStats] = None
+    ) -> np.ndarray:
+        """
+        mask (bool pro Chunk): nur diese Chunks werden bewertet, alle anderen bleiben 0.
+        stats: globale IDF/avgdl (Suche über mehrere Collections) statt der eigenen.
+        """
+        scores = np.zeros(self.n_docs)
+        k1 = self.k1
+        len_norm = self._len_norm if stats is None else self._norm(stats.avgdl)
+        ids = self.vocab.ids
+        for tok in tokens:
+            tid = ids.get(tok)
+            if tid is None:
+                continue  # unbekannt => trägt 0 bei
+            idf = self.idf[tid] if stats is None else stats.idf[tok]
+            s, e = self.post_ptr[tid], self.post_ptr[tid + 1]
+            docs = self.post_docs[s:e]
+            tf = self.post_tfs[s:e]
+            if mask is not None:
+                keep = mask[docs]
+                docs, tf = docs[keep], tf[keep]
+            scores[docs] += idf * (tf * (k1 + 1) / (tf + len_norm[docs]))
+        return scores
+
+
+# ----------------- Char-n-gram TF-IDF Vektoren (lokal, ohne Embedding-Service) -----------------
+# Findet Komposita/Flexionen, die BM25 auf ganzen Tokens verpasst
+# (z.B. "Wartungsintervall" vs. "Wartung"): beide teilen sich viele 3-5-Gramme.
+
+class NgramVectorIndex:
+    """Gehashte Char-n-gram TF-IDF Matrix (CSR als NumPy-Arrays), Zeilen L2-normalisiert."""
+
+    def __init__(self, index: BM25Index, dim: int = 2 ** 18, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self._word_cache: Dict[str, List[int]] = {}
+
+        # n-gram Buckets einmal pro Vokabel-Eintrag statt pro Vorkommen
+        per_term = [self._word_buckets(t) for t in index.vocab.terms]
+        tb_len = np.fromiter((len(b) for b in per_term), dtype=np.int64, count=len(per_term))
+        tb_ptr = np.zeros(len(per_term) + 1, dtype=np.int64)
+        np.cumsum(tb_len, out=tb_ptr[1:])
+        tb_buckets = np.fromiter((b for bs in per_term for b in bs), dtype=np.int64, count=int(tb_ptr[-1]))
+
+        # (Doc, Term, tf) aus den BM25-Postings -> (Doc, Bucket, tf) expandieren und gleiche
+        # (Doc, Bucket) summieren (np.unique sortiert, die Reihenfolge der Einträge ist egal)
+        self.n_docs = index.n_docs
+        entry_doc = index.post_docs.astype(np.int64)
+        entry_term = np.repeat(np.arange(len(index.vocab), dtype=np.int64), index.df)
+        reps = tb_len[entry_term]
+        offsets = np.repeat(tb_ptr[entry_term] - (np.cumsum(reps) - reps), reps)
+        buckets = tb_buckets[offsets + np.arange(int(reps.sum()), dtype=np.int64)]
+        keys = np.repeat(entry_doc, reps) * dim + buckets
+        keys, inverse = np.unique(keys, return_inverse=True)
+        tf = np.bincount(inverse, weights=np.repeat(index.post_tfs, reps)).astype(np.float32)
+
+        rows = keys // dim
+        self.indices = (keys % dim).astype(np.int32)
+        self.indptr = np.zeros(self.n_docs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.n_docs), out=self.indptr[1:])
+
+        df = np.bincount(self.indices, minlength=dim).astype(np.float32)
+        self.idf = (np.log((1.0 + self.n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+
+        data = (1.0 + np.log(tf)) * self.idf[self.indices] if tf.size else tf
+        self._nonempty = self.indptr[:-1] < self.indptr[1:]
+        self._starts = self.indptr[:-1][self._nonempty]
+        norms = np.ones(self.n_docs, dtype=np.float32)
+        if data.size:
+            norms[self._nonempty] = np.sqrt(np.add.reduceat(data * data, self._starts))
+        self.data = (data / np.repeat(norms, np.diff(self.indptr))).astype(np.float32)
+
+    def _word_buckets(self, word: str) -> List[int]:
+        cached = self._word_cache.get(word)
+        if cached is None:
+            w = f" {word} "
+            lo, hi = self.ngram_range
+            cached = [
+                zlib.crc32(w[i:i + n].encode("utf-8")) % self.dim
+                for n in range(lo, hi + 1)
+                for i in range(max(1, len(w) - n + 1))
+            ]
+            self._word_cache[word] = cached
+        return cached
+
+    def _bucket_counts(self, tokens: List[str]) -> Counter:
+        counts: Counter = Counter()
+        for tok in tokens:
+            counts.update(self._word_buckets(tok))
+        return counts
+
+    def score(self, query_tokens: List[str], mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Kosinus-Ähnlichkeit Query vs. alle Chunks (ein Sparse-Matrix-Vektor-Produkt);
+        mit mask nur die ausgewählten Zeilen."""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        counts = self._bucket_counts(query_tokens)
+        if not counts or not self.data.size:
+            return scores
+
+        q = np.zeros(self.dim, dtype=np.float32)
+        for b, c in counts.items():
+            q[b] = (1.0 + math.log(c)) * self.idf[b]
+        norm = float(np.linalg.norm(q))
+        if norm == 0.0:
+            return scores
+        q /= norm
+
+        if mask is None:
+            scores[self._nonempty] = np.add.reduceat(self.data * q[self.indices], self._starts)
+            return scores
+        rows = np.flatnonzero(mask & self._nonempty)
+        if not rows.size:
+            return scores
+        starts = self.indptr[rows]
+        lens = self.indptr[rows + 1] - starts
+        offsets = np.cumsum(lens) - lens
+        pos = np.repeat(starts - offsets, lens) + np.arange(int(lens.sum()))
+        scores[rows] = np.add.reduceat(self.data[pos] * q[self.indices[pos]], offsets)
+        return scores
+
+
+def fuse_scores(bm25_scores, ngram_scores: np.ndarray, weight: float, min_sim: float = 0.0) -> np.ndarray:
+    """Lineare Fusion beider Signale, jeweils auf [0, 1] skaliert (n-gram erst ab min_sim)."""
+    bm25 = np.asarray(bm25_scores, dtype=np.float32)
+    top = float(bm25.max()) if bm25.size else 0.0
+    if top > 0:
+        bm25 = bm25 / top
+    ngram = np.where(ngram_scores >= min_sim, ngram_scores, 0.0)
+    top = float(ngram.max()) if ngram.size else 0.0
+    if top > 0:
+        ngram = ngram / top
+    return (1.0 - weight) * bm25 + weight * ngram
+
+
+# ----------------- Metadaten-Filter: vorberechnete Bitsets -----------------
+# Beim Snapshot-Bau wird pro Wert (Dateityp, Sprache) ein gepacktes Bitset über alle Chunks
+# angelegt; Quellen sind zusammenhängende Chunk-Bereiche. Eine Query verknüpft nur Bitsets
+# (ODER innerhalb eines Feldes, UND zwischen Feldern) und bewertet danach nur die Treffer.
+
+@dataclass(frozen=True)
+class ChunkFilter:
+    file_types: Tuple[str, ...] = ()
+    sources: Tuple[str, ...] = ()  # Dokumentname ("teamx/hb.md") oder Dateiname ("hb.md")
+    langs: Tuple[str, ...] = ()
+    modified_after: Optional[float] = None  # mtime (Unix-Zeit) der Datei beim Einlesen
+    modified_before: Optional[float] = None
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.file_types or self.sources or self.langs
+            or self.modified_after is not None or self.modified_before is not None
+        )
+
+
+class FilterIndex:
+    def __init__(self, store: ChunkStore):
+        self.n = n = len(store)
+        doc, _, lang = store.columns()
+        metas = store.doc_meta
+        self.doc_first = np.append(np.asarray(store.doc_first_chunks(), dtype=np.int64), n)
+        self.mtime = np.asarray([m.mtime if m else 0.0 for m in metas], dtype=np.float64)[doc]
+
+        doc_types = np.asarray([m.file_type if m else "" for m in metas], dtype=object)
+        self._bits: Dict[str, Dict[str, np.ndarray]] = {"file_type": {}, "lang": {}}
+        for ft in set(doc_types.tolist()):
+            self._bits["file_type"][ft] = np.packbits((doc_types == ft)[doc])
+        for i, code in enumerate(LANGS):
+            if code:
+                self._bits["lang"][code] = np.packbits(lang == i)
+
+        self.docs_by_source: Dict[str, List[int]] = {}
+        for d, name in enumerate(store.doc_names):
+            self.docs_by_source.setdefault(name, []).append(d)
+            base = name.rsplit("/", 1)[-1]
+            if base != name:
+                self.docs_by_source.setdefault(base, []).append(d)
+        self._facets = {
+            "file_type": {v: int(np.unpackbits(b, count=n).sum()) for v, b in self._bits["file_type"].items()},
+            "lang": {v: int(np.unpackbits(b, count=n).sum()) for v, b in self._bits["lang"].items()},
+            "source": {
+                name: int(self.doc_first[d + 1] - self.doc_first[d]) for d, name in enumerate(store.doc_names)
+            },
+        }
+
+    def _any_of(self, field: str, values: Iterable[str]) -> np.ndarray:
+        acc = np.zeros((self.n + 7) // 8, dtype=np.uint8)
+        for v in values:
+            bits = self._bits[field].get(v.lower())
+            if bits is not None:
+                acc |= bits
+        return acc
+
+    def _sources(self, names: Iterable[str]) -> np.ndarray:
+        m = np.zeros(self.n, dtype=bool)
+        for name in names:
+            for d in self.docs_by_source.get(name, ()):
+                m[self.doc_first[d]:self.doc_first[d + 1]] = True
+        return np.packbits(m)
+
+    def mask(self, flt: Optional[ChunkFilter]) -> Optional[np.ndarray]:
+        """bool pro Chunk oder None (kein Filter => alles)."""
+        if not flt:
+            return None
+        packed = np.full((self.n + 7) // 8, 0xFF, dtype=np.uint8)
+        if flt.file_types:
+            packed &= self._any_of("file_type", (t.lstrip(".") for t in flt.file_types))
+        if flt.langs:
+            packed &= self._any_of("lang", flt.langs)
+        if flt.sources:
+            packed &= self._sources(flt.sources)
+        m = np.unpackbits(packed, count=self.n).astype(bool)
+        if flt.modified_after is not None:
+            m &= self.mtime >= flt.modified_after
+        if flt.modified_before is not None:
+            m &= self.mtime < flt.modified_before
+        return m
+
+    def facets(self) -> Dict[str, Dict[str, int]]:
+        """Anzahl Chunks pro Dateityp/Sprache/Quelle (für UI-Auswahl)."""
+        return self._facets
+
+
+# ----------------- KB-Snapshot: unveränderlicher Index-Stand -----------------
+
+KB_PATTERNS = ("*.txt", "*.md", "*.pdf")
+
+# Collections: Dateien direkt in kb/ => "default", jeder Unterordner kb/<name>/ => eigene Collection
+# mit eigenem Index (z.B. pro Produktlinie/Team). Ordner mit "." oder "_" am Anfang werden ignoriert.
+DEFAULT_COLLECTION = "default"
+
+
+def kb_files(kb_dir: str) -> List[str]:
+    paths: List[str] = []
+    for pattern in KB_PATTERNS:
+        paths += glob.glob(os.path.join(kb_dir, pattern))
+    return paths
+
+
+def kb_collections(kb_dir: str) -> Dict[str, str]:
+    """Name -> Verzeichnis aller Collections unter kb_dir."""
+    out: Dict[str, str] = {}
+    if kb_files(kb_dir):
+        out[DEFAULT_COLLECTION] = kb_dir
+    try:
+        entries = sorted(os.scandir(kb_dir), key=lambda e: e.name)
+    except FileNotFoundError:
+        return out
+    for e in entries:
+        if e.is_dir() and not e.name.startswith((".", "_")):
+            out.setdefault(e.name, e.path)
+    return out
+
+
+def kb_doc_name(path: str, collection: str = DEFAULT_COLLECTION) -> str:
+    # Quellen außerhalb von "default" mit Collection-Präfix, damit gleichnamige Dateien unterscheidbar bleiben
+    name = os.path.basename(path)
+    return name if collection == DEFAULT_COLLECTION else f"{collection}/{name}"
+
+
+def kb_fingerprint(paths: Iterable[str]) -> Tuple:
+    """(Pfad, mtime_ns, Größe) aller Dateien: ändert sich bei jedem Anlegen/Ändern/Löschen."""
+    fp = []
+    for p in sorted(paths):
+        try:
+            st = os.stat(p)
+        except FileNotFoundError:
+            continue  # zwischen glob und stat gelöscht
+        fp.append((p, st.st_mtime_ns, st.st_size))
+    return tuple(fp)
+
+
+@dataclass(frozen=True)
+class KBSnapshot:
+    """
+    Kompletter Index-Stand (Chunks + BM25 + n-gram). Wird nach dem Bau nie mehr verändert;
+    Reader holen sich die Referenz einmal und arbeiten damit, auch wenn parallel ein neuer
+    Snapshot veröffentlicht wird. version zählt hoch (Key für Caches).
+    """
+    version: int
+    chunks: ChunkStore
+    bm25: Optional[BM25Index]
+    ngrams: Optional[NgramVectorIndex]
+    fingerprint: Tuple
+    files: int
+    built_at: float
+    collection: str = DEFAULT_COLLECTION
+    shards: Optional["ShardedIndex"] = None  # gesetzt => Chunks/BM25 liegen in Worker-Prozessen (kb_shards.py)
+    filters: Optional[FilterIndex] = None
+
+    @classmethod
+    def empty(cls, collection: str = DEFAULT_COLLECTION) -> "KBSnapshot":
+        return cls(0, ChunkStore(), None, None, (), 0, 0.0, collection)
+
+    @property
+    def size(self) -> int:
+        """Anzahl Chunks, auch wenn sie in Shards liegen."""
+        return self.shards.n_chunks if self.shards is not None else len(self.chunks)
+
+    def corpus_stats(self) -> CorpusStats:
+        if self.shards is not None:
+            return self.shards.stats
+        return self.bm25.corpus_stats() if self.bm25 is not None else CorpusStats.of(0, 0, {})
+
+
+@dataclass(frozen=True)
+class KBIndex:
+    """
+    Alle Collections eines Stands. Wird wie KBSnapshot nur als Ganzes ersetzt; ein Rebuild einer
+    Collection übernimmt die Snapshots der anderen unverändert. version zählt bei jeder
+    Veröffentlichung hoch.
+    """
+    version: int
+    collections: Mapping[str, KBSnapshot]
+    # gemeinsame BM25-Statistik je Collection-Auswahl, einmal pro Stand berechnet
+    _stats: Dict[Tuple[str, ...], CorpusStats] = field(default_factory=dict, compare=False, repr=False)
+
+    @classmethod
+    def empty(cls) -> "KBIndex":
+        return cls(0, {})
+
+    @property
+    def chunks(self) -> int:
+        return sum(s.size for s in self.collections.values())
+
+    def select(self, names: Optional[Iterable[str]] = None) -> List[KBSnapshot]:
+        """Snapshots der genannten Collections (None = alle); unbekannte Namen => KeyError."""
+        if names is None:
+            return list(self.collections.values())
+        return [self.collections[n] for n in dict.fromkeys(names)]
+
+    def corpus_stats(self, names: Tuple[str, ...]) -> CorpusStats:
+        """BM25-Statistik über die genannten Collections zusammen (Cache; Stand ist unveränderlich)."""
+        stats = self._stats.get(names)
+        if stats is None:
+            stats = self._stats[names] = CorpusStats.merge(self.collections[n].corpus_stats() for n in names)
+        return stats
+
+
+def build_snapshot(
+    kb_dir: str,
+    version: int,
+    hybrid: bool = True,
+    progress: Optional[Callable[[int, int], None]] = None,
+    collection: str = DEFAULT_COLLECTION,
+) -> KBSnapshot:
+    paths = kb_files(kb_dir)
+    fingerprint = kb_fingerprint(paths)
+    store = ChunkStore()
+    index = BM25Index()
+
+    # Streaming: Datei wird blockweise gelesen, gechunkt und tokenisiert
+    for i, p in enumerate(paths):
+        if progress:
+            progress(i, len(paths))
+        try:
+            ingest_file(p, store, index, name=kb_doc_name(p, collection))
+        except Exception as e:
+            print(f"KB: konnte Datei nicht lesen {p}: {e}")
+    if progress:
+        progress(len(paths), len(paths))
+
+    bm25 = index.finalize() if store else None
+    ngrams = NgramVectorIndex(bm25) if bm25 is not None and hybrid else None
+    return KBSnapshot(
+        version, store, bm25, ngrams, fingerprint, len(paths), time.time(), collection, filters=FilterIndex(store)
+    )
@@ -0,0 +1,378 @@
+import itertools
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from kb_index import (
+    DEFAULT_COLLECTION, BM25Index, ChunkFilter, ChunkStore, CorpusStats, FilterIndex, KBSnapshot, QueryStats,
+    bm25_idf_floor, ingest_file, kb_doc_name, kb_files, kb_fingerprint,
+)
+
+
+# ----------------------------
+# Sharded Retrieval: Chunks auf N lokale Worker-Prozesse verteilt (Scatter-Gather)
+# ----------------------------
+# - jeder Worker indexiert einen Teil der Dateien (eigener ChunkStore + BM25Index => eigener
+#   Speicher und eigener Kern); der API-Prozess hält nur die Zuordnung
+# - IDF/avgdl sind global: Worker melden df + Dokumentlängen, der Koordinator summiert und schickt
+#   die Werte zurück => Scores identisch zu einem ungeteilten Index und über Shards vergleichbar
+# - Query: an alle Shards parallel, jeder liefert seine top_k (Score, Quelle, Text), Merge hier
+# - nur BM25: die n-gram-Fusion normalisiert pro Index und ist daher nicht shard-übergreifend vergleichbar
+
+SHARD_TIMEOUT = 30.0  # Sekunden pro Query-Runde
+BUILD_TIMEOUT = 600.0  # Sekunden pro Shard-Build (große PDFs)
+
+
+class ShardError(RuntimeError):
+    pass
+
+
+class ShardHit:
+    """Treffer aus einem Shard; gleiche Felder wie Chunk (doc_id, text, meta), alles kommt mit der Antwort."""
+
+    __slots__ = ("doc_id", "text", "meta", "score")
+
+    def __init__(self, doc_id: str, text: str, meta: dict, score: float):
+        self.doc_id = doc_id
+        self.text = text
+        self.meta = meta
+        self.score = score
+
+    def __repr__(self) -> str:
+        return f"ShardHit({self.doc_id!r}, {self.score:.3f})"
+
+
+# ----------------- Worker-Prozess -----------------
+
+def _op_build(shards: dict, key: str, paths: List[str], names: List[str]) -> dict:
+    store, index = ChunkStore(), BM25Index()
+    for path, name in zip(paths, names):
+        try:
+            ingest_file(path, store, index, name=name)
+        except Exception as e:
+            print(f"KB: konnte Datei nicht lesen {path}: {e}")
+    bm25 = index.finalize()  # lokale Statistik; wird per "stats" durch die globale ersetzt
+    filters = FilterIndex(store)
+    shards[key] = (store, bm25, filters)
+    return {
+        "terms": bm25.vocab.terms,
+        "df": bm25.df,
+        "n_docs": bm25.n_docs,
+        "total_len": int(bm25.doc_len.sum()),
+        "facets": filters.facets(),
+    }
+
+
+def _op_stats(shards: dict, key: str, n_docs: int, df: np.ndarray, avgdl: float, idf_floor: float) -> None:
+    shards[key][1].set_stats(n_docs, df, avgdl, idf_floor)
+
+
+def _op_search(
+    shards: dict, key: str, tokens: List[str], top_k: int, flt: Optional[ChunkFilter] = None,
+    stats: Optional[QueryStats] = None,
+) -> List[Tuple[float, str, str, dict]]:
+    store, bm25, filters = shards[key]
+    if not len(store):
+        return []
+    mask = filters.mask(flt)
+    if mask is not None and not mask.any():
+        return []
+    scores = bm25.get_scores(tokens, mask, stats)
+    best = np.argsort(-scores, kind="stable")[:top_k]
+    return [
+        (float(scores[i]), store.doc_id(int(i)), store.text(int(i)), store.meta(int(i)))
+        for i in best if scores[i] > 0
+    ]
+
+
+def _op_drop(shards: dict, key: str) -> None:
+    shards.pop(key, None)
+
+
+_OPS: Dict[str, Callable] = {"build": _op_build, "stats": _op_stats, "search": _op_search, "drop": _op_drop}
+
+
+def _worker_main(conn) -> None:
+    # Builds laufen in eigenen Threads, damit Queries auf andere Shards-Stände nicht warten müssen
+    shards: dict = {}
+    send_lock = threading.Lock()
+
+    def handle(rid: int, op: str, args: tuple) -> None:
+        try:
+            result, ok = _OPS[op](shards, *args), True
+        except Exception as e:
+            result, ok = f"{type(e).__name__}: {e}", False
+        with send_lock:
+            conn.send((rid, ok, result))
+
+    while True:
+        try:
+            rid, op, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        if op == "stop":
+            return
+        if op == "build":
+            threading.Thread(target=handle, args=(rid, op, args), daemon=True).start()
+        else:
+            handle(rid, op, args)
+
+
+# ----------------- Koordinator (API-Prozess) -----------------
+
+class _Worker:
+    def __init__(self, ctx, idx: int):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child,), name=f"kb-shard-{idx}", daemon=True)
+        self.process.start()
+        child.close()
+        self._send_lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._reader = threading.Thread(target=self._read, name=f"kb-shard-{idx}-reader", daemon=True)
+        self._reader.start()
+
+    def submit(self, op: str, *args) -> Future:
+        fut: Future = Future()
+        with self._send_lock:
+            if not self.process.is_alive():
+                raise ShardError(f"shard worker {self.process.name} is not running")
+            rid = next(self._ids)
+            self._pending[rid] = fut
+            self.conn.send((rid, op, args))
+        return fut
+
+    def _read(self) -> None:
+        while True:
+            try:
+                rid, ok, value = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            fut = self._pending.pop(rid, None)
+            if fut is None:
+                continue
+            if ok:
+                fut.set_result(value)
+            else:
+                fut.set_exception(ShardError(value))
+        # Worker beendet/abgestürzt: offene Calls nicht hängen lassen
+        for rid in list(self._pending):
+            fut = self._pending.pop(rid, None)
+            if fut is not None:
+                fut.set_exception(ShardError(f"shard worker {self.process.name} exited"))
+
+    def stop(self) -> None:
+        try:
+            with self._send_lock:
+                self.conn.send((-1, "stop", ()))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+def _gather(futures: List[Future], timeout: float) -> list:
+    _, not_done = wait(futures, timeout=timeout)
+    if not_done:
+        raise ShardError(f"{len(not_done)} shard(s) did not answer within {timeout}s")
+    return [f.result() for f in futures]
+
+
+@dataclass(frozen=True)
+class ShardedIndex:
+    """Handle auf einen über alle Worker verteilten Index-Stand (eine Collection, eine Version)."""
+    pool: "ShardPool"
+    key: str
+    n_chunks: int
+    facets: Mapping[str, Mapping[str, int]]
+    stats: CorpusStats  # globale Statistik über alle Shards (für die Suche über mehrere Collections)
+
+    def search(
+        self, tokens: List[str], top_k: int, flt: Optional[ChunkFilter] = None, stats: Optional[QueryStats] = None
+    ) -> List[ShardHit]:
+        return self.pool.search(self.key, tokens, top_k, flt, stats)
+
+    def release(self, delay: float = 0.0) -> None:
+        self.pool.drop(self.key, delay)
+
+
+class ShardPool:
+    """
+    N Worker-Prozesse (spawn, kein fork aus einem Prozess mit Threads), gestartet beim ersten Build.
+    Ein Worker hält Shards mehrerer Collections/Versionen, jeweils unter einem Key.
+    """
+
+    def __init__(
+        self, n_workers: int, timeout: float = SHARD_TIMEOUT, on_respawn: Optional[Callable[[], None]] = None
+    ):
+        if n_workers < 1:
+            raise ValueError("n_workers must be >= 1")
+        self.n_workers = n_workers
+        self.timeout = timeout
+        self.on_respawn = on_respawn  # z.B. Rebuild anstoßen: der neue Worker hat keine Shards
+        self.respawns = 0
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> List[_Worker]:
+        respawned = []
+        with self._lock:
+            ctx = mp.get_context("spawn")
+            if not self._workers:
+                self._workers = [_Worker(ctx, i) for i in range(self.n_workers)]
+            for i, w in enumerate(self._workers):
+                if not w.process.is_alive():
+                    # abgestürzt (OOM, kill): ersetzen, sonst scheitert jede Query an diesem Shard
+                    w.stop()
+                    self._workers[i] = _Worker(ctx, i)
+                    respawned.append(w.process.name)
+            self.respawns += len(respawned)
+            workers = list(self._workers)
+        if respawned:
+            print(f"KB: Shard-Worker neu gestartet: {', '.join(respawned)}")
+            if self.on_respawn is not None:
+                self.on_respawn()
+        return workers
+
+    def stop(self) -> None:
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for w in workers:
+            w.stop()
+
+    # ---- Build ----
+
+    def partition(self, paths: List[str]) -> List[List[str]]:
+        """Dateien nach Größe auf die Shards verteilen (größte zuerst auf den leersten Shard)."""
+        parts: List[List[str]] = [[] for _ in range(self.n_workers)]
+        load = [0] * self.n_workers
+        for p in sorted(paths, key=lambda p: os.path.getsize(p) if os.path.exists(p) else 0, reverse=True):
+            i = load.index(min(load))
+            parts[i].append(p)
+            load[i] += os.path.getsize(p) if os.path.exists(p) else 0
+        # Reihenfolge innerhalb eines Shards wie kb_files() => stabile Chunk-Reihenfolge
+        order = {p: n for n, p in enumerate(paths)}
+        return [sorted(part, key=order.__getitem__) for part in parts]
+
+    def build(
+        self,
+        key: str,
+        paths: List[str],
+        collection: str = DEFAULT_COLLECTION,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> ShardedIndex:
+        workers = self._ensure_started()
+        parts = self.partition(paths)
+        futures = [
+            w.submit("build", key, part, [kb_doc_name(p, collection) for p in part])
+            for w, part in zip(workers, parts)
+        ]
+        if progress:
+            done_files = [0]
+
+            def on_done(n: int) -> Callable[[Future], None]:
+                def cb(_f: Future) -> None:
+                    done_files[0] += n
+                    progress(done_files[0], len(paths))
+                return cb
+
+            progress(0, len(paths))
+            for f, part in zip(futures, parts):
+                f.add_done_callback(on_done(len(part)))
+        try:
+            stats = _gather(futures, BUILD_TIMEOUT)
+        except Exception:
+            self.drop(key)
+            raise
+
+        # Globale Statistik: df pro Term über alle Shards, N und avgdl über alle Chunks
+        n_docs = sum(s["n_docs"] for s in stats)
+        total_len = sum(s["total_len"] for s in stats)
+        global_df: Dict[str, int] = {}
+        for s in stats:
+            for term, df in zip(s["terms"], s["df"].tolist()):
+                if df:
+                    global_df[term] = global_df.get(term, 0) + df
+        avgdl = total_len / n_docs if n_docs else 0.0
+        idf_floor = bm25_idf_floor(n_docs, np.fromiter(global_df.values(), dtype=np.int64, count=len(global_df)))
+        futures = [
+            w.submit(
+                "stats", key, n_docs,
+                np.fromiter((global_df.get(t, 0) for t in s["terms"]), dtype=np.int64, count=len(s["terms"])),
+                avgdl, idf_floor,
+            )
+            for w, s in zip(workers, stats)
+        ]
+        try:
+            _gather(futures, self.timeout)
+        except Exception:
+            self.drop(key)
+            raise
+        facets: Dict[str, Dict[str, int]] = {}
+        for s in stats:
+            for field, counts in s["facets"].items():
+                merged = facets.setdefault(field, {})
+                for value, n in counts.items():
+                    merged[value] = merged.get(value, 0) + n
+        return ShardedIndex(self, key, n_docs, facets, CorpusStats(n_docs, total_len, global_df, idf_floor))
+
+    # ---- Query ----
+
+    def search(
+        self, key: str, tokens: List[str], top_k: int, flt: Optional[ChunkFilter] = None,
+        stats: Optional[QueryStats] = None,
+    ) -> List[ShardHit]:
+        workers = self._ensure_started()
+        results = _gather([w.submit("search", key, tokens, top_k, flt, stats) for w in workers], self.timeout)
+        hits = [ShardHit(doc_id, text, meta, score) for part in results for score, doc_id, text, meta in part]
+        hits.sort(key=lambda h: h.score, reverse=True)  # stabil: bei Gleichstand Shard-Reihenfolge
+        return hits[:top_k]
+
+    def drop(self, key: str, delay: float = 0.0) -> None:
+        """Gibt einen Index-Stand frei; delay lässt laufenden Queries auf dem alten Stand Zeit."""
+        if delay > 0:
+            t = threading.Timer(delay, self.drop, args=(key,))
+            t.daemon = True
+            t.start()
+            return
+        with self._lock:
+            workers = list(self._workers)
+        for w in workers:
+            try:
+                w.submit("drop", key)
+            except ShardError:
+                pass
+
+    def status(self) -> dict:
+        with self._lock:
+            workers = list(self._workers)
+        return {
+            "workers": self.n_workers,
+            "alive": sum(w.process.is_alive() for w in workers),
+            "started": bool(workers),
+            "respawns": self.respawns,
+        }
+
+
+def build_sharded_snapshot(
+    pool: ShardPool,
+    kb_dir: str,
+    version: int,
+    progress: Optional[Callable[[int, int], None]] = None,
+    collection: str = DEFAULT_COLLECTION,
+) -> KBSnapshot:
+    """Wie build_snapshot, aber Chunks + BM25 liegen in den Workern; der Snapshot hält nur das Handle."""
+    paths = kb_files(kb_dir)
+    fingerprint = kb_fingerprint(paths)
+    shards = pool.build(f"{collection}@{version}", paths, collection=collection, progress=progress)
+    return KBSnapshot(
+        version, ChunkStore(), None, None, fingerprint, len(paths), time.time(), collection, shards=shards
+    )
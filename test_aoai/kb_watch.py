@@ -0,0 +1,96 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+
+class KBWatcher:
+    """
+    Beobachtet kb/ per Polling (os.stat, keine Zusatz-Abhängigkeit) und baut bei Änderungen
+    im eigenen Thread neu – nie im Request-Pfad.
+
+    - fingerprint(): aktueller Datei-Stand pro Collection, current(): Stand der veröffentlichten Snapshots
+    - rebuild(names): baut + veröffentlicht die genannten Collections neu (None = alle)
+    - nur geänderte/neue/gelöschte Collections werden neu gebaut, und erst wenn ihr Stand
+      zwei Polls lang gleich bleibt (halb kopierte Dateien werden nicht indexiert)
+    - trigger(names): sofortiger Rebuild (z.B. "Reload KB"), auch ohne Änderung
+    """
+
+    def __init__(
+        self,
+        fingerprint: Callable[[], Dict[str, Tuple]],
+        current: Callable[[], Dict[str, Tuple]],
+        rebuild: Callable[[Optional[Set[str]]], None],
+        interval: float = 5.0,
+    ):
+        self.fingerprint = fingerprint
+        self.current = current
+        self.rebuild = rebuild
+        self.interval = interval
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._force = False
+        self._force_names: Optional[Set[str]] = None  # None = alle
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.rebuilds = 0
+        self.last_check: Optional[float] = None
+
+    def start(self, initial: bool = True) -> None:
+        if self._thread is not None:
+            return
+        self._force, self._force_names = initial, None  # erster Durchlauf = Warm-up
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def trigger(self, names: Optional[Set[str]] = None) -> None:
+        with self._lock:
+            if self._force and (self._force_names is None or names is None):
+                self._force_names = None
+            elif self._force:
+                self._force_names |= set(names)
+            else:
+                self._force_names = None if names is None else set(names)
+            self._force = True
+        self._wake.set()
+
+    def _changed(self, fp: Dict[str, Tuple]) -> Set[str]:
+        cur = self.current()
+        return {n for n in fp.keys() | cur.keys() if fp.get(n) != cur.get(n)}
+
+    def _run(self) -> None:
+        pending: Dict[str, Tuple] = {}
+        while not self._stop.is_set():
+            with self._lock:
+                force, names = self._force, self._force_names
+                self._force, self._force_names = False, None
+            if force:
+                pending = {}
+                self._rebuild(names)
+            elif self.interval > 0:
+                fp = self.fingerprint()
+                self.last_check = time.time()
+                changed = self._changed(fp)
+                # stabil = gleicher Stand wie beim letzten Poll
+                stable = {n for n in changed if n in pending and pending[n] == fp.get(n)}
+                if stable:
+                    self._rebuild(stable)
+                pending = {n: fp.get(n) for n in changed - stable}
+            # Polling-Intervall; trigger() weckt sofort
+            self._wake.wait(self.interval if self.interval > 0 else None)
+            self._wake.clear()
+
+    def _rebuild(self, names: Optional[Set[str]]) -> None:
+        try:
+            self.rebuild(names)
+            self.rebuilds += 1
+        except Exception as e:
+            # Watcher läuft weiter; der bisherige Snapshot bleibt aktiv
+            print(f"KB: Rebuild fehlgeschlagen: {e}")
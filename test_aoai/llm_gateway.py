@@ -0,0 +1,285 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import openai
+
+
+# ----------------------------
+# LLM-Gateway: alle Chat-Completion-Calls laufen hier durch
+# ----------------------------
+# - Semaphore global + pro Session (ein Nutzer kann nicht alle Slots belegen)
+# - Token-Bucket (Requests/Sekunde mit Burst) vor jedem Versuch
+# - Retries mit Jitter bei 429/5xx/Verbindungsfehlern, Retry-After wird respektiert
+# - Deadline pro Call (Warten + alle Versuche), Rest-Zeit geht als timeout an den Client
+# - Circuit Breaker: nach N fehlgeschlagenen Calls sofort ablehnen, bis reset_timeout vorbei ist
+#
+# Der eigentliche Call ist injiziert (create=client.chat.completions.create), d.h. lokal gegen
+# fake_llm.py oder mit einer Test-Funktion prüfbar.
+
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class GatewayError(RuntimeError):
+    """Call wurde vom Gateway abgelehnt oder ist endgültig gescheitert (=> 503 an den Client)."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(GatewayError):
+    pass
+
+
+class GatewayBusyError(GatewayError):
+    pass
+
+
+class DeadlineExceededError(GatewayError):
+    pass
+
+
+class UpstreamError(GatewayError):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float) -> bool:
+        if self.rate <= 0:
+            return True  # unbegrenzt
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe: Optional[int] = None  # Thread, der im half_open-Zustand gerade testet
+        self._lock = threading.Lock()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self._opened_at < self.reset_timeout else "half_open"
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        # half_open: genau ein Probe-Call darf durch; sein Fehler öffnet wieder, sein Erfolg schließt.
+        # Alle anderen bekommen weiter "open", bis die Probe entschieden ist
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "open" or self._probe is not None:
+                return False
+            self._probe = threading.get_ident()
+            return True
+
+    def release_probe(self) -> None:
+        # Probe endete ohne Urteil (z.B. Queue-Timeout, lokaler Fehler) => nächster Call darf testen
+        with self._lock:
+            if self._probe == threading.get_ident():
+                self._probe = None
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe = None
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        create: Callable,
+        max_concurrency: int = 8,
+        max_per_session: int = 2,
+        rate_per_sec: float = 0.0,
+        burst: int = 10,
+        max_retries: int = 3,
+        base_backoff: float = 0.5,
+        max_backoff: float = 20.0,
+        deadline_s: float = 60.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.create = create
+        self.max_per_session = max_per_session
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.deadline_s = deadline_s
+        self.bucket = TokenBucket(rate_per_sec, burst)
+        self.breaker = breaker or CircuitBreaker()
+        self._global = threading.BoundedSemaphore(max_concurrency)
+        self._max_concurrency = max_concurrency
+        self._sessions: Dict[str, List] = {}  # sid -> [Semaphore, Nutzer]
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    # ---- Slots ----
+
+    @contextmanager
+    def _session_slot(self, session_id: str, deadline: float):
+        with self._lock:
+            entry = self._sessions.setdefault(session_id, [threading.BoundedSemaphore(self.max_per_session), 0])
+            entry[1] += 1
+        try:
+            if not entry[0].acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise GatewayBusyError("Too many concurrent LLM calls for this session")
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._sessions[session_id]
+
+    @contextmanager
+    def _slot(self, session_id: Optional[str], deadline: float):
+        if session_id and self.max_per_session > 0:
+            with self._session_slot(session_id, deadline):
+                with self._global_slot(deadline):
+                    yield
+        else:
+            with self._global_slot(deadline):
+                yield
+
+    @contextmanager
+    def _global_slot(self, deadline: float):
+        if not self._global.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise GatewayBusyError("LLM gateway saturated")
+        with self._lock:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._global.release()
+
+    # ---- Retries ----
+
+    @staticmethod
+    def _retryable(e: Exception) -> bool:
+        if isinstance(e, openai.APIConnectionError):  # inkl. APITimeoutError
+            return True
+        return getattr(e, "status_code", None) in RETRY_STATUS
+
+    def _delay(self, e: Exception, attempt: int) -> float:
+        headers = getattr(getattr(e, "response", None), "headers", None) or {}
+        for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+            value = headers.get(name)
+            if value:
+                try:
+                    return float(value) * scale + random.uniform(0, self.base_backoff)
+                except ValueError:
+                    pass  # HTTP-Datum o.ä. => normaler Backoff
+        # Full Jitter: verteilt Retries vieler Clients, statt sie zu synchronisieren
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    # ---- Call ----
+
+    def call(
+        self,
+        session_id: Optional[str] = None,
+        deadline_s: Optional[float] = None,
+        queue_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        **kwargs,
+    ):
+        """
+        queue_timeout: max. Wartezeit auf Slot/Token-Bucket (z.B. kurz, wenn ein Fallback bereitsteht).
+        max_retries: überschreibt self.max_retries für diesen Call.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM upstream unavailable (circuit open)", retry_after=self.breaker.retry_after())
+        deadline = time.monotonic() + (deadline_s or self.deadline_s)
+        queue_deadline = deadline if queue_timeout is None else min(deadline, time.monotonic() + queue_timeout)
+        max_retries = self.max_retries if max_retries is None else max_retries
+
+        try:
+            return self._call(session_id, deadline, queue_deadline, max_retries, **kwargs)
+        finally:
+            self.breaker.release_probe()
+
+    def _call(self, session_id: Optional[str], deadline: float, queue_deadline: float, max_retries: int, **kwargs):
+        with self._slot(session_id, queue_deadline):
+            attempt = 0
+            while True:
+                if not self.bucket.acquire(queue_deadline if attempt == 0 else deadline):
+                    raise GatewayBusyError("LLM rate limit (local token bucket)")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceededError("LLM call deadline exceeded")
+                try:
+                    resp = self.create(timeout=remaining, **kwargs)
+                except Exception as e:
+                    if not self._retryable(e):
+                        if isinstance(e, openai.APIStatusError):
+                            # Upstream hat geantwortet (z.B. 400/404) => kein Ausfall für den Breaker.
+                            # Andere Fehler (TypeError o.ä.) sagen nichts über den Upstream und
+                            # lassen den Breaker unberührt
+                            self.breaker.record_success()
+                        raise
+                    delay = self._delay(e, attempt)
+                    attempt += 1
+                    if attempt > max_retries or time.monotonic() + delay >= deadline:
+                        self.breaker.record_failure()
+                        raise UpstreamError(f"LLM call failed after {attempt} attempt(s): {e}", retry_after=delay) from e
+                    time.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                return resp
+
+    def status(self) -> dict:
+        with self._lock:
+            in_flight, sessions = self._in_flight, len(self._sessions)
+        return {
+            "breaker": self.breaker.state,
+            "breaker_retry_after": round(self.breaker.retry_after(), 1),
+            "in_flight": in_flight,
+            "max_concurrency": self._max_concurrency,
+            "active_sessions": sessions,
+        }
@@ -0,0 +1,89 @@
+import json
+import math
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+
+# ----------------------------
+# Model-Routing: Deployment pro Aufgabe/Eingabegröße (Konfiguration: MODEL_ROUTES_PATH,
+# Vorlage model_routes.example.json)
+# ----------------------------
+# Regeln werden der Reihe nach geprüft, die erste passende gewinnt. Felder einer Regel
+# (alle optional): task ("chat" | "translate"), feature (Liste von Seiten), min_chars, max_chars
+# (Länge der User-Nachricht bzw. des zu übersetzenden Textes), route (Pflicht).
+
+LATENCY_WINDOW = 500  # letzte N Calls pro Route für p50/p95
+
+
+@dataclass
+class Route:
+    name: str
+    deployment: str
+    fallback: Optional[str] = None
+
+
+class ModelRouter:
+    def __init__(self, routes: Dict[str, Route], rules: List[dict], default_route: str):
+        if default_route not in routes:
+            raise ValueError(f"default route {default_route!r} not in routes")
+        for rule in rules:
+            if rule.get("route") not in routes:
+                raise ValueError(f"unknown route in rule {rule}")
+        self.routes = routes
+        self.rules = rules
+        self.default_route = default_route
+        self._lock = threading.Lock()
+        self._latency: Dict[str, Deque[float]] = {name: deque(maxlen=LATENCY_WINDOW) for name in routes}
+        self._counts: Dict[str, Dict[str, int]] = {name: {"calls": 0, "errors": 0, "fallbacks": 0} for name in routes}
+
+    @classmethod
+    def from_file(cls, path: str, default_deployment: str) -> "ModelRouter":
+        # kein Pfad gesetzt oder Datei fehlt => eine Route für alles (Verhalten wie vorher)
+        if not os.path.exists(path):
+            return cls({"default": Route("default", default_deployment)}, [], "default")
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        routes = {
+            name: Route(name, r["deployment"], r.get("fallback"))
+            for name, r in cfg.get("routes", {}).items()
+        }
+        return cls(routes, cfg.get("rules", []), cfg.get("default_route", "default"))
+
+    def pick(self, task: str, feature: Optional[str] = None, chars: int = 0) -> Route:
+        for rule in self.rules:
+            if "task" in rule and rule["task"] != task:
+                continue
+            if "feature" in rule and feature not in rule["feature"]:
+                continue
+            if "min_chars" in rule and chars < rule["min_chars"]:
+                continue
+            if "max_chars" in rule and chars > rule["max_chars"]:
+                continue
+            return self.routes[rule["route"]]
+        return self.routes[self.default_route]
+
+    def record(self, route: str, latency_ms: float, ok: bool = True, fallback: bool = False) -> None:
+        with self._lock:
+            c = self._counts[route]
+            c["calls"] += 1
+            c["errors"] += not ok
+            c["fallbacks"] += fallback
+            if ok:
+                self._latency[route].append(latency_ms)
+
+    def stats(self) -> Dict[str, dict]:
+        out = {}
+        with self._lock:
+            for name, route in self.routes.items():
+                lat = sorted(self._latency[name])
+                out[name] = {
+                    "deployment": route.deployment,
+                    "fallback": route.fallback,
+                    **self._counts[name],
+                    "p50_ms": round(lat[(len(lat) - 1) // 2], 1) if lat else None,
+                    "p95_ms": round(lat[math.ceil(len(lat) * 0.95) - 1], 1) if lat else None,
+                }
+        return out
@@ -0,0 +1,100 @@
+import os
+import sqlite3
+
+import pandas as pd
+import streamlit as st
+
+import tracing
+from tracing import TRACER, TracedConnection
+
+DB_PATH = "greenmow.db"
+
+
+# ----------------------------
+# DB helpers für die Streamlit-Pages (mit Read-Cache)
+# ----------------------------
+# Lesende Queries werden pro (Query, Parameter, Change-Token) gecacht. Das Token ändert sich
+# bei jedem Schreibzugriff auf die DB-Datei (API, Pages, sqlite-CLI ...): mtime/Größe von
+# greenmow.db und -wal, plus ein Zähler für Writes aus den Pages (falls das Dateisystem
+# mtime nur grob auflöst). Ein Rerun ohne Änderung liest nur os.stat(), nicht SQLite.
+# Tracing: read_df/exec_sql starten je einen Trace ("ui.db.read"/"ui.db.write"), darunter die
+# "sqlite"-Spans; Cache-Treffer erscheinen als Span ohne Kinder.
+
+tracing.configure("ui")
+
+
+def db_connect():
+    conn = sqlite3.connect(DB_PATH, factory=TracedConnection) if TRACER.enabled else sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+@st.cache_resource
+def _write_counter() -> dict:
+    # prozessweit geteilt (alle Sessions/Pages)
+    return {"n": 0}
+
+
+def db_change_token() -> tuple:
+    token = [_write_counter()["n"]]
+    for path in (DB_PATH, DB_PATH + "-wal"):
+        try:
+            s = os.stat(path)
+            token += [s.st_mtime_ns, s.st_size]
+        except FileNotFoundError:
+            token += [0, 0]
+    return tuple(token)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _cached_read(query: str, params: tuple, token: tuple) -> pd.DataFrame:
+    with db_connect() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+def read_df(query: str, params=()) -> pd.DataFrame:
+    with TRACER.span("ui.db.read", root=True, sql=query.strip()[:tracing.TRACE_SQL_CHARS]):
+        return _cached_read(query, tuple(params), db_change_token())
+
+
+def exec_sql(query: str, params=()):
+    with TRACER.span("ui.db.write", root=True), db_connect() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        conn.commit()
+        _write_counter()["n"] += 1
+        return cur.lastrowid
+
+
+# ----------------------------
+# Keyset-Pager für die Tabellen-Ansichten (Database, Test Data Request)
+# ----------------------------
+
+def pager_state(key: str, filters: tuple) -> dict:
+    # Cursor-Stack pro Tabelle; stack[-1] = Cursor der aktuellen Seite (None = erste Seite).
+    # Andere Filter => zurück auf Seite 1
+    state = st.session_state.setdefault(key, {"filters": None, "stack": [None]})
+    if state["filters"] != filters:
+        state["filters"] = filters
+        state["stack"] = [None]
+    return state
+
+
+def fetch_page(q: str, params: list, page_size: int, cursor_col: str = "id"):
+    # Keyset: eine Zeile mehr holen => nächste Seite vorhanden?
+    df = read_df(q + " LIMIT ?", params + [page_size + 1])
+    if len(df) <= page_size:
+        return df, None
+    df = df.iloc[:page_size]
+    return df, df[cursor_col].tolist()[-1]
+
+
+def pager_controls(key: str, state: dict, next_cursor):
+    b1, b2, b3 = st.columns([1, 1, 4])
+    if b1.button("◀ Previous", key=f"{key}_prev", disabled=len(state["stack"]) <= 1):
+        state["stack"].pop()
+        st.rerun()
+    if b2.button("Next ▶", key=f"{key}_next", disabled=next_cursor is None):
+        state["stack"].append(next_cursor)
+        st.rerun()
+    b3.caption(f"Page {len(state['stack'])}")
@@ -1,26 +1,27 @@
-import sqlite3
 import streamlit as st
 
-st.set_page_config(page_title="Home", page_icon="🏠", layout="wide")
-
-DB_PATH = "greenmow.db"
+from page_db import read_df
 
-def db_connect():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+st.set_page_config(page_title="Home", page_icon="🏠", layout="wide")
 
 def get_models():
-    with db_connect() as conn:
-        cur = conn.cursor()
-        # distinct Modelle + Anzahl
-        cur.execute("""
+    # distinct Modelle + Anzahl: vorberechnet in fleet_stats (konstante Kosten), gecacht bis zum nächsten Write
+    try:
+        df = read_df("""
+            SELECT value AS model, count AS cnt
+            FROM fleet_stats
+            WHERE dimension = 'mower_model' AND count > 0
+            ORDER BY cnt DESC, model ASC
+        """)
+    except Exception:
+        # DB noch ohne Migration (db_init.py) => alte Zählung
+        df = read_df("""
             SELECT model, COUNT(*) AS cnt
             FROM mowers
             GROUP BY model
             ORDER BY cnt DESC, model ASC
         """)
-        return cur.fetchall()
+    return df.to_dict("records")
 
 st.title("AI Test Data Management Demo")
 st.caption("Requirements → Testcases → Test Data + RAG + DB Tool Calling")
@@ -1,10 +1,10 @@
 import json
 import re
 import uuid
-import requests
 import streamlit as st
 
-API_URL = "http://127.0.0.1:8000"
+import api_client
+import tracing
 
 
 # ----------------------------
@@ -147,6 +147,8 @@ with main:
             # RAG settings from global sidebar
             use_rag = st.session_state.get("use_rag", True)
             top_k = st.session_state.get("top_k", 4)
+            collections = st.session_state.get("kb_collections") or None  # None = alle
+            kb_filters = st.session_state.get("kb_filters")  # Dateityp/Sprache
             sid = st.session_state.get("sid")  # set in main file
 
             # JSON schema prompt (DE/EN)
@@ -203,14 +205,20 @@ Regeln:
 
             prompt = f"{system}\n\nRequirement:\n{req_text}"
 
-            with st.spinner(t("Verfeinere Requirement...", "Refining requirement...")):
-                r = requests.post(
-                    f"{API_URL}/chat",
+            # ein Trace pro Klick: UI -> API -> Retrieval/LLM/SQLite (trace_report.py)
+            with st.spinner(t("Verfeinere Requirement...", "Refining requirement...")), tracing.span(
+                "ui.requirement_refinement", root=True
+            ):
+                r = api_client.post(
+                    "/chat",
                     json={
                         "message": prompt,
                         "use_rag": use_rag,
                         "top_k": top_k,
+                        "collections": collections,
+                        "filters": kb_filters,
                         "session_id": sid,
+                        "feature": "requirement_refinement",
                     },
                     timeout=60,
                 )
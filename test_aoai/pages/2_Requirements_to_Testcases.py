@@ -1,9 +1,9 @@
 import json
 import re
-import requests
 import streamlit as st
 
-API_URL = "http://127.0.0.1:8000"
+import api_client
+import tracing
 
 
 # ----------------------------
@@ -148,6 +148,8 @@ btn = st.button(t("Generate Test Cases", "Generate Test Cases"), type="primary",
 if btn:
     use_rag = st.session_state.get("use_rag", True)
     top_k = st.session_state.get("top_k", 4)
+    collections = st.session_state.get("kb_collections") or None  # None = alle
+    kb_filters = st.session_state.get("kb_filters")  # Dateityp/Sprache
     sid = st.session_state.get("sid")
 
     if not sid:
@@ -202,14 +204,18 @@ Gib NUR gültiges JSON zurück (ein einziges JSON-Objekt) mit diesem Schema:
     # One prompt to backend (your /chat already handles system prompts)
     prompt = f"{system}\n\nINPUT:\n{req_text}"
 
-    with st.spinner(t("Erzeuge Testcases...", "Generating test cases...")):
-        r = requests.post(
-            f"{API_URL}/chat",
+    # ein Trace pro Klick: UI -> API -> Retrieval/LLM/SQLite (trace_report.py)
+    with st.spinner(t("Erzeuge Testcases...", "Generating test cases...")), tracing.span("ui.testcases", root=True):
+        r = api_client.post(
+            "/chat",
             json={
                 "message": prompt,
                 "use_rag": use_rag,
                 "top_k": top_k,
+                "collections": collections,
+                "filters": kb_filters,
                 "session_id": sid,
+                "feature": "testcases",
             },
             timeout=90,
         )
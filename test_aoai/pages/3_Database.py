@@ -1,21 +1,7 @@
-import sqlite3
-import pandas as pd
 import streamlit as st
 
-DB_PATH = "greenmow.db"
-
-
-# ----------------------------
-# DB helpers
-# ----------------------------
-def db_connect():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def read_df(query: str, params=()):
-    with db_connect() as conn:
-        return pd.read_sql_query(query, conn, params=params)
+from db_query import fts_match_query, mower_contains
+from page_db import fetch_page, pager_controls, pager_state, read_df
 
 
 # ----------------------------
@@ -24,19 +10,27 @@ def read_df(query: str, params=()):
 st.title("🗄️ Database")
 st.caption("Full view of the SQLite database tables: mowers + work_orders.")
 
-# Quick stats (optional)
+page_size = st.selectbox("Rows per page", [25, 50, 100, 200], index=1)
+
+# Quick stats (optional) – aus fleet_stats (per Trigger gepflegt), kein COUNT(*) pro Rerun
+def read_total(dimension: str, table: str) -> int:
+    try:
+        df = read_df("SELECT count AS c FROM fleet_stats WHERE dimension = ? AND value = ''", (dimension,))
+        return int(df["c"].iloc[0]) if not df.empty else 0
+    except Exception:
+        # DB noch ohne Migration (db_init.py)
+        return int(read_df(f"SELECT COUNT(*) AS c FROM {table}")["c"].iloc[0])
+
 col1, col2 = st.columns(2)
 with col1:
     try:
-        cnt_mowers = read_df("SELECT COUNT(*) AS c FROM mowers")["c"].iloc[0]
-        st.metric("Mowers", int(cnt_mowers))
+        st.metric("Mowers", read_total("mowers_total", "mowers"))
     except Exception:
         st.metric("Mowers", "—")
 
 with col2:
     try:
-        cnt_wos = read_df("SELECT COUNT(*) AS c FROM work_orders")["c"].iloc[0]
-        st.metric("Work Orders", int(cnt_wos))
+        st.metric("Work Orders", read_total("work_orders_total", "work_orders"))
     except Exception:
         st.metric("Work Orders", "—")
 
@@ -61,6 +55,9 @@ with tab1:
     with c3:
         f_model = st.text_input("Model contains", value="")
 
+    pager = pager_state("db_mowers_pager", (f_status, f_site.strip(), f_model.strip(), page_size))
+    cursor = pager["stack"][-1]
+
     q = """
         SELECT id, model, site, status, last_service_date
         FROM mowers
@@ -70,20 +67,24 @@ with tab1:
     if f_status != "(all)":
         q += " AND status = ?"
         params.append(f_status)
-    if f_site.strip():
-        q += " AND site LIKE '%' || ? || '%'"
-        params.append(f_site.strip())
-    if f_model.strip():
-        q += " AND model LIKE '%' || ? || '%'"
-        params.append(f_model.strip())
+    # Teilstring, case-insensitiv wie vorher LIKE '%x%', aber über den Trigram-Index mowers_fts
+    for column, value in (("site", f_site.strip()), ("model", f_model.strip())):
+        if value:
+            expr, args = mower_contains(column, value)
+            q += f" AND {expr}"
+            params += args
+    if cursor is not None:
+        q += " AND id > ?"
+        params.append(cursor)
     q += " ORDER BY id"
 
-    df = read_df(q, params)
+    df, next_cursor = fetch_page(q, params, page_size)
 
     if df.empty:
         st.info("No mowers found (check filters).")
     else:
         st.dataframe(df, use_container_width=True, hide_index=True)
+        pager_controls("db_mowers", pager, next_cursor)
 
         st.markdown("### Mower details")
         selected_id = st.selectbox("Select mower", df["id"].tolist(), index=0)
@@ -119,30 +120,65 @@ with tab2:
     with c3:
         wo_mower = st.text_input("Mower ID equals (optional)", value="", placeholder="e.g. GM-A-001")
 
-    q = """
-        SELECT id, mower_id, title, priority, status, owner, created_at
-        FROM work_orders
-        WHERE 1=1
-    """
-    params = []
+    wo_search = st.text_input(
+        "Full-text search (title, owner, mower model, site)", value="", placeholder="e.g. blade replacement"
+    )
+    match = fts_match_query(wo_search)
+
+    pager = pager_state(
+        "db_wo_pager", (wo_status, wo_priority, wo_mower.strip(), match, page_size)
+    )
+    cursor = pager["stack"][-1]
+
+    if match:
+        q = """
+            SELECT w.id, w.mower_id, w.title, w.priority, w.status, w.owner, w.created_at
+            FROM work_orders_fts f
+            JOIN work_orders w ON w.id = f.rowid
+            WHERE work_orders_fts MATCH ?
+        """
+        params = [match]
+    else:
+        q = """
+            SELECT w.id, w.mower_id, w.title, w.priority, w.status, w.owner, w.created_at
+            FROM work_orders w
+            WHERE 1=1
+        """
+        params = []
     if wo_status != "(all)":
-        q += " AND status = ?"
+        q += " AND w.status = ?"
         params.append(wo_status)
     if wo_priority != "(all)":
-        q += " AND priority = ?"
+        q += " AND w.priority = ?"
         params.append(wo_priority)
     if wo_mower.strip():
-        q += " AND mower_id = ?"
+        q += " AND w.mower_id = ?"
         params.append(wo_mower.strip())
 
-    q += " ORDER BY id DESC"
-
-    df = read_df(q, params)
+    try:
+        if match:
+            # Ranking nach Relevanz => hier Offset statt Keyset (Cursor = Offset)
+            offset = cursor or 0
+            df = read_df(
+                q + " ORDER BY bm25(work_orders_fts), w.id DESC LIMIT ? OFFSET ?",
+                params + [page_size + 1, offset],
+            )
+            next_cursor = offset + page_size if len(df) > page_size else None
+            df = df.iloc[:page_size]
+        else:
+            if cursor is not None:
+                q += " AND w.id < ?"
+                params.append(cursor)
+            df, next_cursor = fetch_page(q + " ORDER BY w.id DESC", params, page_size)
+    except Exception as e:
+        st.warning(f"Query failed (full-text index missing? run db_init.py): {e}")
+        st.stop()
 
     if df.empty:
         st.info("No work orders found (check filters).")
     else:
         st.dataframe(df, use_container_width=True, hide_index=True)
+        pager_controls("db_wo", pager, next_cursor)
 
         st.markdown("### Work order details")
         selected_wo = st.selectbox("Select work order", df["id"].tolist(), index=0)
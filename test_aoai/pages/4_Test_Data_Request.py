@@ -1,29 +1,13 @@
 import os
-import pandas as pd
-import sqlite3
 import streamlit as st
 
-DB_PATH = "greenmow.db"
+from page_db import DB_PATH, exec_sql, fetch_page, pager_controls, pager_state
 
 if not os.path.exists(DB_PATH):
     st.error(f"DB file not found: {DB_PATH}")
     st.stop()
 
-def db_connect():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def read_df(query: str, params=()):
-    with db_connect() as conn:
-        return pd.read_sql_query(query, conn, params=params)
-
-def exec_sql(query: str, params=()):
-    with db_connect() as conn:
-        cur = conn.cursor()
-        cur.execute(query, params)
-        conn.commit()
-        return cur.lastrowid
+# fetch_page/read_df sind gecacht; exec_sql invalidiert den Cache (siehe page_db.py)
 
 st.title("Test Data Request")
 st.caption("Create and track test data requests (work orders).")
@@ -61,11 +45,16 @@ with tab1:
 with tab2:
     st.subheader("Work Orders")
 
-    c1, c2 = st.columns(2)
+    c1, c2, c3 = st.columns([2, 2, 1])
     with c1:
         f_status = st.selectbox("Filter Status", ["(all)", "OPEN", "IN_PROGRESS", "DONE", "CANCELLED"], index=0)
     with c2:
         f_mower = st.text_input("Filter Mower ID", value="", placeholder="e.g. GM-A-001")
+    with c3:
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 200], index=1)
+
+    pager = pager_state("tdr_wo_pager", (f_status, f_mower.strip(), page_size))
+    cursor = pager["stack"][-1]
 
     q = """
         SELECT id, mower_id, title, priority, status, owner, created_at
@@ -79,15 +68,18 @@ with tab2:
     if f_mower.strip():
         q += " AND mower_id = ?"
         params.append(f_mower.strip())
-    q += " ORDER BY id DESC"
-
-    df = read_df(q, params)
+    if cursor is not None:
+        q += " AND id < ?"
+        params.append(cursor)
+    df, next_cursor = fetch_page(q + " ORDER BY id DESC", params, page_size)
 
     if df.empty:
         st.info("No work orders found.")
     else:
         st.dataframe(df, use_container_width=True, hide_index=True)
 
+        pager_controls("tdr_wo", pager, next_cursor)
+
         st.markdown("### Update Status")
         selected_id = st.selectbox("Select Work Order ID", df["id"].tolist(), index=0)
         new_status = st.selectbox("New Status", ["OPEN", "IN_PROGRESS", "DONE", "CANCELLED"], index=1)
@@ -1,8 +1,8 @@
 import uuid
-import requests
 import streamlit as st
 
-API_URL = "http://127.0.0.1:8000"
+import api_client
+import tracing
 
 # KEIN st.set_page_config() hier (nur im Hauptfile chatbot.py)
 
@@ -43,19 +43,26 @@ if user_text:
     # Read global sidebar config (set in chatbot.py)
     use_rag = st.session_state.get("use_rag", True)
     top_k = st.session_state.get("top_k", 4)
-
-    r = requests.post(
-        f"{API_URL}/chat",
-        json={
-            "message": user_text,
-            "use_rag": use_rag,
-            "top_k": top_k,
-            "session_id": st.session_state.sid,
-        },
-        timeout=60,
-    )
-    r.raise_for_status()
-    data = r.json()
+    collections = st.session_state.get("kb_collections") or None  # None = alle
+    kb_filters = st.session_state.get("kb_filters")  # Dateityp/Sprache
+
+    # ein Trace pro Nachricht: UI -> API -> Retrieval/LLM/SQLite (trace_report.py)
+    with tracing.span("ui.chat", root=True):
+        r = api_client.post(
+            "/chat",
+            json={
+                "message": user_text,
+                "use_rag": use_rag,
+                "top_k": top_k,
+                "collections": collections,
+                "filters": kb_filters,
+                "session_id": st.session_state.sid,
+                "feature": "chat",
+            },
+            timeout=60,
+        )
+        r.raise_for_status()
+        data = r.json()
 
     # keep backend session id
     if data.get("session_id"):
@@ -0,0 +1,262 @@
+import contextvars
+import cProfile
+import functools
+import io
+import itertools
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+
+# ----------------------------
+# Profiling auf Abruf (opt-in, ohne Neu-Deployment)
+# ----------------------------
+# Auslöser: Header "X-Profile" an einem Request, scharf geschaltete Requests über /admin/profile
+# (nächste N bzw. Anteil rate pro Pfad) oder ein /reload_kb-Lauf. Artefakte pro Lauf in PROFILE_DIR:
+#   <id>.pstats  cProfile (python -m pstats, snakeviz)
+#   <id>.folded  gesampelte Stacks "a;b;c <anzahl>" (flamegraph.pl, speedscope, inferno)
+#   <id>.txt     Top-Funktionen nach kumulierter Zeit
+# Profiliert wird im Thread, der die Arbeit macht (sync-Endpoint bzw. KB-Watcher), nicht im Event-Loop.
+
+PROFILE_MODES = ("cprofile", "sample", "both")
+SAMPLE_INTERVAL = 0.005  # Sekunden zwischen zwei Stack-Samples
+_SAFE_ID = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+@dataclass
+class ProfileRequest:
+    """Pro Request (ContextVar): ob/wie profiliert wird; artifact wird nach dem Lauf gesetzt."""
+    mode: str
+    name: str
+    artifact: Optional[str] = None
+
+
+CURRENT: contextvars.ContextVar[Optional[ProfileRequest]] = contextvars.ContextVar("profile_request", default=None)
+
+
+class StackSampler:
+    """Sampelt periodisch den Stack eines Threads (sys._current_frames) und zählt gleiche Stacks."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=2)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+@dataclass
+class _Arm:
+    remaining: int  # -1 = unbegrenzt (nur rate)
+    rate: float
+    mode: str
+    paths: List[str] = field(default_factory=list)  # leer = alle @profiled-Endpoints
+
+
+class Profiler:
+    def __init__(self, out_dir: str, enabled: bool = False, default_rate: float = 0.0, keep: int = 200):
+        self.out_dir = out_dir
+        self.enabled = enabled
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._arm: Optional[_Arm] = _Arm(-1, default_rate, "both") if enabled and default_rate > 0 else None
+        self._kb_mode: Optional[str] = None
+        self._seq = itertools.count(1)
+        self._cprofile_busy = threading.Lock()  # cProfile nur in einem Thread gleichzeitig
+        self.last: Dict[str, str] = {}  # Name -> ID des letzten Laufs
+        self.paths: Set[str] = set()  # per @profiled registrierte Endpoints; nur die werden gezählt/gesampelt
+
+    # ---- Auslöser ----
+
+    def arm(self, count: int = 1, rate: float = 0.0, mode: str = "both", paths: Optional[List[str]] = None) -> dict:
+        """Nächste count Requests (oder Anteil rate, wenn count=0) profilieren; count=0 und rate=0 => aus."""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Invalid mode. Allowed: {list(PROFILE_MODES)}")
+        if count < 0 or not 0.0 <= rate <= 1.0:
+            raise ValueError("count must be >= 0 and rate within [0, 1]")
+        unknown = sorted(set(paths or []) - self.paths)
+        if unknown:
+            raise ValueError(f"Not profilable: {unknown}. Allowed: {sorted(self.paths)}")
+        with self._lock:
+            if count == 0 and rate == 0:
+                self._arm = None
+            else:
+                self._arm = _Arm(count if count else -1, rate, mode, list(paths or []))
+        return self.status()
+
+    def arm_kb(self, mode: str = "both") -> None:
+        """Nächsten KB-Rebuild profilieren."""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Invalid mode. Allowed: {list(PROFILE_MODES)}")
+        with self._lock:
+            self._kb_mode = mode
+
+    def take_kb(self) -> Optional[str]:
+        with self._lock:
+            mode, self._kb_mode = self._kb_mode, None
+        return mode
+
+    def decide(self, path: str, header: Optional[str]) -> Optional[str]:
+        """Modus für diesen Request oder None. Header-Wert: "1"/"true" (=both) oder ein Modus."""
+        if not self.enabled or path not in self.paths:
+            # /healthz, /db/* usw. würden sonst den count verbrauchen, ohne dass gemessen wird
+            return None
+        if header:
+            h = header.strip().lower()
+            return h if h in PROFILE_MODES else ("both" if h in ("1", "true", "yes") else None)
+        with self._lock:
+            arm = self._arm
+            if arm is None or (arm.paths and path not in arm.paths):
+                return None
+            if arm.remaining > 0:
+                arm.remaining -= 1
+                if arm.remaining == 0:
+                    self._arm = None
+                return arm.mode
+            return arm.mode if random.random() < arm.rate else None
+
+    def status(self) -> dict:
+        with self._lock:
+            arm, kb = self._arm, self._kb_mode
+        return {
+            "enabled": self.enabled,
+            "dir": self.out_dir,
+            "armed": None if arm is None else {
+                "remaining": arm.remaining, "rate": arm.rate, "mode": arm.mode, "paths": arm.paths,
+            },
+            "reload_kb": kb,
+        }
+
+    # ---- Laufen + Artefakte ----
+
+    @contextmanager
+    def run(self, name: str, mode: str) -> Iterator[dict]:
+        """Profiliert den umschlossenen Block im aktuellen Thread; yield-Dict bekommt "id" nach dem Lauf."""
+        info: dict = {}
+        prof = None
+        if mode in ("cprofile", "both") and self._cprofile_busy.acquire(blocking=False):
+            prof = cProfile.Profile()
+        elif mode == "cprofile":
+            mode = "sample"  # anderer Lauf hat cProfile => wenigstens Stacks sampeln
+        sampler = StackSampler(threading.get_ident()) if mode in ("sample", "both") else None
+        t0 = time.perf_counter()
+        if sampler:
+            sampler.start()
+        if prof:
+            prof.enable()
+        try:
+            yield info
+        finally:
+            if prof:
+                prof.disable()
+                self._cprofile_busy.release()
+            if sampler:
+                sampler.stop()
+            info["id"] = self._write(name, time.perf_counter() - t0, prof, sampler)
+            self.last[name] = info["id"]
+
+    def _write(
+        self, name: str, seconds: float, prof: Optional[cProfile.Profile], sampler: Optional[StackSampler]
+    ) -> str:
+        os.makedirs(self.out_dir, exist_ok=True)
+        pid = f"{time.strftime('%Y%m%d-%H%M%S')}_{next(self._seq):04d}_{_SAFE_ID.sub('_', name).strip('_')}"
+        base = os.path.join(self.out_dir, pid)
+        summary = io.StringIO()
+        summary.write(f"{name}: {seconds * 1000:.1f} ms\n\n")
+        if prof:
+            prof.dump_stats(base + ".pstats")
+            pstats.Stats(prof, stream=summary).sort_stats("cumulative").print_stats(40)
+        if sampler:
+            with open(base + ".folded", "w", encoding="utf-8") as f:
+                f.write(sampler.folded())
+            summary.write(f"\n{sum(sampler.stacks.values())} Samples à {sampler.interval * 1000:.0f} ms\n")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+        self._prune()
+        return pid
+
+    def _prune(self) -> None:
+        # Nur die letzten keep Läufe behalten (ein Lauf = bis zu 3 Dateien gleicher ID)
+        runs = self.list()
+        for r in runs[self.keep:]:
+            for fn in r["files"]:
+                try:
+                    os.remove(os.path.join(self.out_dir, fn))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[dict]:
+        """Läufe, neueste zuerst."""
+        if not os.path.isdir(self.out_dir):
+            return []
+        runs: Dict[str, dict] = {}
+        for fn in os.listdir(self.out_dir):
+            pid, ext = os.path.splitext(fn)
+            if ext not in (".pstats", ".folded", ".txt"):
+                continue
+            st = os.stat(os.path.join(self.out_dir, fn))
+            r = runs.setdefault(pid, {"id": pid, "files": [], "bytes": 0, "created": st.st_mtime})
+            r["files"].append(fn)
+            r["bytes"] += st.st_size
+            r["created"] = min(r["created"], st.st_mtime)
+        return sorted(runs.values(), key=lambda r: r["id"], reverse=True)
+
+    def path(self, filename: str) -> Optional[str]:
+        """Pfad zu einem Artefakt; None für alles außerhalb von out_dir oder unbekannte Dateien."""
+        if filename != os.path.basename(filename) or _SAFE_ID.search(filename):
+            return None
+        p = os.path.join(self.out_dir, filename)
+        return p if os.path.isfile(p) else None
+
+
+def profiled(profiler: Profiler, *paths: str) -> Callable:
+    """
+    Decorator für sync-Endpoints: profiliert, wenn die Middleware den Request markiert hat.
+    paths = URL-Pfade des Endpoints; nur für diese entscheidet Profiler.decide überhaupt.
+    """
+    profiler.paths.update(paths)
+
+    def deco(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            req = CURRENT.get()
+            if req is None:
+                return fn(*args, **kwargs)
+            info: dict = {}
+            try:
+                with profiler.run(req.name, req.mode) as info:
+                    return fn(*args, **kwargs)
+            finally:
+                req.artifact = info.get("id")
+        return wrapper
+    return deco
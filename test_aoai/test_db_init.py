@@ -0,0 +1,92 @@
+import sqlite3
+
+import pytest
+
+from db_init import MIGRATIONS, SCHEMA_SQL, explain_index_usage, migrate
+from db_query import fts_match_query, mower_contains, mower_list_query
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "greenmow.db")
+    conn.executescript(SCHEMA_SQL)
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+def test_migrate_sets_version_and_is_idempotent(conn):
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == MIGRATIONS[-1][0]
+    assert migrate(conn) == []
+
+
+def test_filtered_queries_search_an_index(conn):
+    assert explain_index_usage(conn) == []
+
+
+def test_redundant_status_index_dropped(conn):
+    names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "idx_work_orders_status" not in names
+    assert "idx_work_orders_status_priority" in names
+
+
+def test_scan_using_index_counts_as_problem(conn):
+    # ohne die Status-Indexe wird der Status-Filter zum SCAN über den Primärschlüssel-Index
+    conn.execute("DROP INDEX idx_mowers_status_id")
+    conn.execute("DROP INDEX idx_mowers_status_site")
+    problems = explain_index_usage(conn)
+    sql, _ = mower_list_query(status="AVAILABLE", limit=50).build()
+    assert sql in [p[0] for p in problems]
+
+
+@pytest.fixture
+def fleet(conn):
+    conn.executemany(
+        "INSERT INTO mowers (id, model, site, status) VALUES (?, ?, ?, 'AVAILABLE')",
+        [("GM-A-001", "TerraMow T-3", "City Park"), ("GM-A-002", "TerraMow T-5", "Parkhaus Süd"),
+         ("GM-A-003", "GM_200", "Depot 50%")],
+    )
+    conn.execute(
+        "INSERT INTO work_orders (mower_id, title, priority, status, created_at) "
+        "VALUES ('GM-A-001', 'Blade check', 'HIGH', 'OPEN', '2026-01-01')"
+    )
+    conn.commit()
+    return conn
+
+
+def _mowers_containing(conn, column, text):
+    expr, params = mower_contains(column, text)
+    return [r[0] for r in conn.execute(f"SELECT id FROM mowers WHERE {expr} ORDER BY id", params)]
+
+
+@pytest.mark.parametrize("column, text, expected", [
+    ("site", "park", ["GM-A-001", "GM-A-002"]),  # Teilstring, nicht nur Präfix
+    ("site", "CITY", ["GM-A-001"]),              # case-insensitiv
+    ("site", "50%", ["GM-A-003"]),               # % ist Text, kein Wildcard
+    ("model", "t-5", ["GM-A-002"]),
+    ("model", "_2", ["GM-A-003"]),               # < 3 Zeichen: LIKE-Fallback, _ escaped
+    ("model", "M", ["GM-A-001", "GM-A-002", "GM-A-003"]),
+])
+def test_mower_contains(fleet, column, text, expected):
+    assert _mowers_containing(fleet, column, text) == expected
+
+
+def test_mowers_fts_follows_updates_and_deletes(fleet):
+    fleet.execute("UPDATE mowers SET site = 'Harbour' WHERE id = 'GM-A-002'")
+    assert _mowers_containing(fleet, "site", "park") == ["GM-A-001"]
+    fleet.execute("DELETE FROM work_orders")  # FK: erst die Work Orders, dann den Mower
+    fleet.execute("DELETE FROM mowers WHERE id = 'GM-A-003'")
+    assert _mowers_containing(fleet, "model", "gm_") == []
+
+
+def test_deleted_mower_leaves_work_order_search(fleet):
+    def search(text):
+        sql = "SELECT rowid FROM work_orders_fts WHERE work_orders_fts MATCH ?"
+        return fleet.execute(sql, (fts_match_query(text),)).fetchall()
+
+    assert search("city park")
+    # App-Verbindungen setzen kein foreign_keys-Pragma => der Mower lässt sich trotz Work Orders löschen
+    fleet.execute("PRAGMA foreign_keys = OFF")
+    fleet.execute("DELETE FROM mowers WHERE id = 'GM-A-001'")
+    assert search("city park") == []
+    assert search("blade")
@@ -0,0 +1,191 @@
+import json
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from intent_match import classify_message, load_intents
+
+INTENTS_JSON = Path(__file__).with_name("intents.json")
+
+
+# Referenz: die früheren Einzel-Scans aus app.py, gegen die classify_message geprüft wird
+_GREETINGS = {
+    "hi", "hii", "hello", "hey",
+    "hallo", "guten tag", "guten morgen", "guten abend",
+    "servus", "moin", "yo"
+}
+
+_OTHER_ASSISTANT_NAMES = {"chatgpt", "copilot", "gpt", "gpt-4", "gpt4", "gpt-4o", "openai"}
+
+
+def _normalize(s: str) -> str:
+    return " ".join((s or "").strip().lower().split())
+
+
+def _is_greeting_only(text: str) -> bool:
+    return _normalize(text) in _GREETINGS
+
+
+def _is_language_only(text: str) -> Optional[str]:
+    t = _normalize(text)
+    if t in {"english", "englisch", "en"}:
+        return "en"
+    if t in {"deutsch", "german", "de"}:
+        return "de"
+    return None
+
+
+def _explicit_lang_request(text: str) -> Optional[str]:
+    t = _normalize(text)
+    en_triggers = [
+        "english", "englisch", "in english", "speak english", "english please",
+        "auf englisch", "in englisch", "können wir auf englisch", "kannst du auf englisch",
+        "please answer in english", "answer in english",
+    ]
+    de_triggers = [
+        "deutsch", "german", "in german", "speak german", "german please",
+        "auf deutsch", "in deutsch", "können wir auf deutsch", "kannst du auf deutsch",
+        "please answer in german", "answer in german",
+    ]
+    if any(x in t for x in en_triggers):
+        return "en"
+    if any(x in t for x in de_triggers):
+        return "de"
+    return None
+
+
+def _detect_lang(text: str) -> str:
+    t = _normalize(text)
+
+    req = _explicit_lang_request(t)
+    if req:
+        return req
+
+    if t in {"english", "englisch", "en"}:
+        return "en"
+    if t in {"deutsch", "german", "de"}:
+        return "de"
+
+    if any(ch in t for ch in ["ä", "ö", "ü", "ß"]):
+        return "de"
+
+    tt = f" {t} "
+    de_markers = [" wie ", " was ", " warum ", " bitte ", " kannst ", " können ", " ich ", " und ", " nicht ", " für "]
+    en_markers = [" what ", " why ", " how ", " please ", " can ", " i ", " and ", " not ", " for ", " much ", " many "]
+
+    score_de = sum(m in tt for m in de_markers)
+    score_en = sum(m in tt for m in en_markers)
+
+    if score_de == 0 and score_en == 0:
+        return "en"
+    return "en" if score_en > score_de else "de"
+
+
+def _translate_to(text: str) -> Optional[str]:
+    t = _normalize(text)
+    en = [
+        "auf englisch zurück", "auf englisch bitte", "kannst du das auf englisch",
+        "kannst du mir das auf englisch", "in english", "please answer in english",
+        "translate to english", "return it in english",
+    ]
+    de = [
+        "auf deutsch zurück", "auf deutsch bitte", "kannst du das auf deutsch",
+        "kannst du mir das auf deutsch", "in german", "please answer in german",
+        "translate to german", "return it in german",
+    ]
+    if any(x in t for x in en):
+        return "en"
+    if any(x in t for x in de):
+        return "de"
+    return None
+
+
+def _mentions_other_bot_name(text: str) -> bool:
+    t = _normalize(text)
+    return any(n in t for n in _OTHER_ASSISTANT_NAMES)
+
+
+SAMPLES = [
+    # explizite Sprache
+    "English please",
+    "Können wir auf Englisch reden?",
+    "kannst du auf deutsch antworten",
+    "Please answer in German",
+    "speak english",
+    # Übersetzung
+    "Kannst du das auf Englisch zurück geben?",
+    "KANNST DU DAS AUF ENGLISCH",
+    "translate to german",
+    "Return it in English, thanks",
+    "auf Deutsch bitte",
+    # nur Sprache
+    "deutsch",
+    "  EN ",
+    "German",
+    # anderer Bot-Name
+    "Are you ChatGPT?",
+    "bist du copilot oder GPT-4o",
+    "openai",
+    # reine Begrüßung
+    "Hallo",
+    "  Guten   Morgen ",
+    "HI",
+    "hello there",
+    # Umlaute / Groß-Klein / Marker
+    "über",
+    "ÄNDERE den Auftrag",
+    "Straße",
+    "Wie viele Mäher sind offen und warum?",
+    "How many mowers are open and why?",
+    "what is the status",
+    "ich kann nicht",
+    "I can not and for",
+    "ticket 4711",
+    "",
+]
+
+
+@pytest.fixture(scope="module")
+def intents():
+    return load_intents(str(INTENTS_JSON))
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_classify_matches_legacy_checks(intents, text):
+    intent = classify_message(text, intents)
+    assert intent.explicit_lang == _explicit_lang_request(text)
+    assert intent.detected_lang == _detect_lang(text)
+    assert intent.translate_to == _translate_to(text)
+    assert intent.language_only == _is_language_only(text)
+    assert intent.greeting_only == _is_greeting_only(text)
+    assert intent.mentions_other_bot == _mentions_other_bot_name(text)
+
+
+def _write_config(tmp_path, cfg):
+    path = tmp_path / "intents.json"
+    path.write_text(json.dumps(cfg), encoding="utf-8")
+    return str(path)
+
+
+def test_triggers_from_config_are_picked_up(tmp_path):
+    cfg = json.loads(INTENTS_JSON.read_text(encoding="utf-8"))
+    cfg["languages"]["en"]["translate"].append("bitte ins englische")
+    fr = dict(cfg["languages"]["en"], explicit=["en français"], translate=[], chars=["ç"],
+              markers=[], language_only=["français"])
+    cfg["languages"]["fr"] = fr
+    cfg["other_assistant_names"].append("gemini")
+    intents = load_intents(_write_config(tmp_path, cfg))
+
+    assert classify_message("Das bitte ins Englische", intents).translate_to == "en"
+    assert classify_message("Répondez en français", intents).explicit_lang == "fr"
+    assert classify_message("ça va", intents).detected_lang == "fr"
+    assert classify_message("Français", intents).language_only == "fr"
+    assert classify_message("Bist du Gemini?", intents).mentions_other_bot
+
+
+def test_language_without_texts_is_rejected(tmp_path):
+    cfg = json.loads(INTENTS_JSON.read_text(encoding="utf-8"))
+    del cfg["languages"]["de"]["texts"]["greeting"]
+    with pytest.raises(ValueError, match="greeting"):
+        load_intents(_write_config(tmp_path, cfg))
@@ -0,0 +1,78 @@
+import math
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from kb_index import build_snapshot, simple_tokenize
+
+KB_DIR = Path(__file__).with_name("kb")
+
+QUERIES = [
+    "Wartung Intervall",
+    "safety guidelines mower",
+    "support ticket eskalation",
+    "company overview",
+    "Messer Klinge wechseln",
+    "the and of",
+    "unbekanntes wort xyz",
+]
+
+
+class ReferenceBM25Okapi:
+    """Referenz: BM25Okapi wie rank_bm25 0.2.2 (vor der Umstellung auf int32/Postings im Einsatz)."""
+
+    def __init__(self, corpus, k1=1.5, b=0.75, epsilon=0.25):
+        self.k1, self.b = k1, b
+        self.doc_freqs = [Counter(doc) for doc in corpus]
+        self.doc_len = [len(doc) for doc in corpus]
+        self.avgdl = sum(self.doc_len) / len(corpus)
+        nd = Counter(term for freqs in self.doc_freqs for term in freqs)
+        self.idf = {}
+        negative = []
+        for term, freq in nd.items():
+            self.idf[term] = math.log(len(corpus) - freq + 0.5) - math.log(freq + 0.5)
+            if self.idf[term] < 0:
+                negative.append(term)
+        eps = epsilon * sum(self.idf.values()) / len(self.idf)
+        for term in negative:
+            self.idf[term] = eps
+
+    def get_scores(self, query):
+        scores = np.zeros(len(self.doc_freqs))
+        for q in query:
+            tf = np.array([freqs.get(q, 0) for freqs in self.doc_freqs])
+            norm = self.k1 * (1 - self.b + self.b * np.array(self.doc_len) / self.avgdl)
+            scores += self.idf.get(q, 0) * (tf * (self.k1 + 1) / (tf + norm))
+        return scores
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    snap = build_snapshot(str(KB_DIR), 1)
+    assert len(snap.chunks) > 0
+    return snap
+
+
+@pytest.fixture(scope="module")
+def reference(snapshot):
+    return ReferenceBM25Okapi([simple_tokenize(snapshot.chunks[i].text) for i in range(len(snapshot.chunks))])
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_bm25_ranks_like_reference(snapshot, reference, query):
+    tokens = simple_tokenize(query)
+    got = snapshot.bm25.get_scores(tokens)
+    want = reference.get_scores(tokens)
+    np.testing.assert_allclose(got, want, rtol=1e-9, atol=1e-12)
+    k = 5
+    assert list(np.argsort(-got, kind="stable")[:k]) == list(np.argsort(-want, kind="stable")[:k])
+
+
+def test_bm25_mask_keeps_other_chunks_at_zero(snapshot, reference):
+    tokens = simple_tokenize("Wartung safety support")
+    mask = np.zeros(snapshot.bm25.n_docs, dtype=bool)
+    mask[::2] = True
+    got = snapshot.bm25.get_scores(tokens, mask=mask)
+    np.testing.assert_allclose(got, np.where(mask, reference.get_scores(tokens), 0.0), rtol=1e-9, atol=1e-12)
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def _start_follower(flight, key, fn):
+    out = {}
+
+    def follow():
+        try:
+            out["value"] = flight.do(key, fn)
+        except BaseException as e:
+            out["error"] = e
+
+    t = threading.Thread(target=follow)
+    t.start()
+    time.sleep(0.05)  # Follower muss warten, solange der Leader läuft
+    return t, out
+
+
+def test_follower_gets_leader_result_without_running_fn():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def leader_fn():
+        calls.append("leader")
+        release.wait(5)
+        return {"reply": "ok"}
+
+    leader = {}
+    t_leader = threading.Thread(target=lambda: leader.update(value=flight.do("k", leader_fn)))
+    t_leader.start()
+    while flight.in_flight() == 0:
+        time.sleep(0.001)
+
+    t_follower, follower = _start_follower(flight, "k", lambda: calls.append("follower"))
+    release.set()
+    t_leader.join(5)
+    t_follower.join(5)
+
+    assert calls == ["leader"]  # z.B. ein ändernder Tool-Call läuft nur einmal
+    assert leader["value"] == ({"reply": "ok"}, False)
+    assert follower["value"] == ({"reply": "ok"}, True)
+    assert flight.in_flight() == 0
+
+
+def test_follower_gets_leader_error():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def leader_fn():
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    t_leader = threading.Thread(target=lambda: pytest.raises(RuntimeError, flight.do, "k", leader_fn))
+    t_leader.start()
+    while flight.in_flight() == 0:
+        time.sleep(0.001)
+
+    t_follower, follower = _start_follower(flight, "k", lambda: None)
+    release.set()
+    t_leader.join(5)
+    t_follower.join(5)
+
+    assert isinstance(follower.get("error"), RuntimeError)
+    assert flight.in_flight() == 0
+
+
+def test_key_is_forgotten_after_completion():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == (1, False)
+    assert flight.do("k", lambda: 2) == (2, False)
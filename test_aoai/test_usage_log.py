@@ -0,0 +1,79 @@
+import json
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from db_init import SCHEMA_SQL, migrate
+from usage_log import UsageContext, UsageRecorder, load_prices, usage_summary
+
+PRICES = {
+    "gpt-4.1": {"input": 0.002, "cached": 0.0005, "output": 0.008},
+    "gpt-4.1-mini": {"input": 0.0004, "cached": 0.0001, "output": 0.0016},
+}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "greenmow.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA_SQL)
+    migrate(conn)
+    conn.close()
+    return path
+
+
+def _usage(prompt, completion, cached=0):
+    return SimpleNamespace(
+        prompt_tokens=prompt,
+        completion_tokens=completion,
+        total_tokens=prompt + completion,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached),
+    )
+
+
+def _record(db_path):
+    rec = UsageRecorder(lambda: sqlite3.connect(db_path))
+    rec.record(UsageContext("r1", feature="chat"), _usage(1000, 500, cached=400), "gpt-4.1", "chat")
+    rec.record(UsageContext("r2", feature="chat"), _usage(2000, 1000), "gpt-4.1-mini", "chat")
+    rec.record(UsageContext("r3", feature="testcases"), _usage(300, 200), "unknown-deployment", "chat")
+    rec.flush()
+
+
+def test_cost_per_group_uses_price_table(db_path):
+    _record(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = {r["model"]: r for r in usage_summary(conn, "0", ["model"], prices=PRICES)}
+    totals = usage_summary(conn, "0", [], prices=PRICES)[0]
+    conn.close()
+
+    # cached Tokens sind Teil von prompt_tokens und kosten den cached-Preis
+    assert rows["gpt-4.1"]["cost"] == pytest.approx((600 * 0.002 + 400 * 0.0005 + 500 * 0.008) / 1000)
+    assert rows["gpt-4.1-mini"]["cost"] == pytest.approx((2000 * 0.0004 + 1000 * 0.0016) / 1000)
+    assert rows["unknown-deployment"]["cost"] is None
+    assert rows["unknown-deployment"]["unpriced_tokens"] == 500
+    assert totals["cost"] == pytest.approx(rows["gpt-4.1"]["cost"] + rows["gpt-4.1-mini"]["cost"])
+    assert totals["unpriced_tokens"] == 500
+
+
+def test_without_prices_cost_is_null(db_path):
+    _record(db_path)
+    conn = sqlite3.connect(db_path)
+    totals = usage_summary(conn, "0", [])[0]
+    conn.close()
+    assert totals["cost"] is None
+    assert totals["unpriced_tokens"] == totals["total_tokens"] == 5000
+
+
+def test_load_prices(tmp_path):
+    assert load_prices("") == {}
+    assert load_prices(str(tmp_path / "missing.json")) == {}
+
+    path = tmp_path / "prices.json"
+    path.write_text(json.dumps({"o'model": {"input": 1, "cached": 0.5, "output": 2}}), encoding="utf-8")
+    assert load_prices(str(path)) == {"o'model": {"input": 1.0, "cached": 0.5, "output": 2.0}}
+
+    path.write_text(json.dumps({"gpt-4.1": {"input": 1}}), encoding="utf-8")
+    with pytest.raises(ValueError, match="cached"):
+        load_prices(str(path))
@@ -0,0 +1,197 @@
+"""
+Auswertung des lokalen Trace-Logs (tracing.py, TRACE_LOG=traces.jsonl).
+
+Aufruf (im Ordner test_aoai):
+    python trace_report.py list                  # letzte Traces (Root-Span, Dauer, Anzahl Spans)
+    python trace_report.py waterfall             # Wasserfall des letzten Traces
+    python trace_report.py waterfall <trace_id>  # bestimmter Trace (Präfix reicht)
+    python trace_report.py waterfall --slowest 3 # die drei langsamsten Traces
+    python trace_report.py stats                 # count/p50/p95/p99 pro Stage
+    python trace_report.py stats --since 15m --name "POST /chat"
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from tracing import TRACE_LOG
+
+BAR_WIDTH = 40
+ATTR_KEYS = ("status_code", "status", "deployment", "fallback", "prompt_tokens", "completion_tokens", "hits", "sql")
+
+
+def load(path: str, since: Optional[float] = None) -> List[dict]:
+    spans: List[dict] = []
+    if not os.path.exists(path):
+        return spans
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                s = json.loads(line)
+            except ValueError:
+                continue  # halb geschriebene Zeile (Prozess beendet)
+            if since is None or s.get("start", 0) >= since:
+                spans.append(s)
+    return spans
+
+
+def by_trace(spans: List[dict]) -> Dict[str, List[dict]]:
+    traces: Dict[str, List[dict]] = defaultdict(list)
+    for s in spans:
+        traces[s["trace_id"]].append(s)
+    return traces
+
+
+def trace_bounds(spans: List[dict]):
+    start = min(s["start"] for s in spans)
+    end = max(s["start"] + s["duration_ms"] / 1000 for s in spans)
+    return start, end
+
+
+def root_name(spans: List[dict]) -> str:
+    ids = {s["span_id"] for s in spans}
+    roots = sorted((s for s in spans if s.get("parent_id") not in ids), key=lambda s: s["start"])
+    return roots[0]["name"] if roots else "?"
+
+
+def parse_since(value: Optional[str]) -> Optional[float]:
+    # "15m", "2h", "1d" oder Sekunden
+    if not value:
+        return None
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    try:
+        if value[-1] in units:
+            return time.time() - float(value[:-1]) * units[value[-1]]
+        return time.time() - float(value)
+    except ValueError:
+        raise SystemExit(f"Invalid --since: {value!r} (z.B. 30s, 15m, 2h, 1d)")
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    return sorted_values[max(0, math.ceil(len(sorted_values) * p) - 1)]
+
+
+def stage(span: dict) -> str:
+    # HTTP-Spans der API ("POST /chat") und UI-Spans tragen ihren Namen; Stages innerhalb der API
+    # (retrieve, llm, tool.*, sqlite) werden über alle Endpoints zusammengefasst
+    if span["name"] == "llm":
+        return f"llm.{span.get('attrs', {}).get('operation', '?')}"
+    return span["name"]
+
+
+# ----------------- Ausgabe -----------------
+
+def _attrs(span: dict) -> str:
+    a = span.get("attrs") or {}
+    parts = [f"{k}={a[k]}" for k in ATTR_KEYS if a.get(k) not in (None, "")]
+    if span.get("status") == "error":
+        parts.append(f"ERROR {span.get('error')}")
+    text = " ".join(parts)
+    return text if len(text) <= 100 else text[:97] + "..."
+
+
+def render_waterfall(spans: List[dict], out=sys.stdout) -> None:
+    start, end = trace_bounds(spans)
+    total_ms = max((end - start) * 1000, 0.001)
+    ids = {s["span_id"] for s in spans}
+    children: Dict[Optional[str], List[dict]] = defaultdict(list)
+    for s in spans:
+        children[s["parent_id"] if s.get("parent_id") in ids else None].append(s)
+    for lst in children.values():
+        lst.sort(key=lambda s: s["start"])
+
+    out.write(f"trace {spans[0]['trace_id']}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start))}"
+              f"  {total_ms:.1f} ms  {len(spans)} spans\n")
+
+    def walk(span: dict, depth: int) -> None:
+        offset = (span["start"] - start) * 1000
+        a = int(offset / total_ms * BAR_WIDTH)
+        b = max(a + 1, int(round((offset + span["duration_ms"]) / total_ms * BAR_WIDTH)))
+        bar = " " * a + "█" * (min(b, BAR_WIDTH) - a)
+        label = ("  " * depth + span["name"])[:44]
+        out.write(f"  {label:<44} {span['service']:<4} {offset:9.1f} {span['duration_ms']:9.1f} ms "
+                  f"|{bar:<{BAR_WIDTH}}| {_attrs(span)}\n")
+        for c in children.get(span["span_id"], []):
+            walk(c, depth + 1)
+
+    for root in children[None]:
+        walk(root, 0)
+
+
+def cmd_list(args) -> None:
+    traces = by_trace(load(args.file, parse_since(args.since)))
+    rows = sorted(traces.values(), key=lambda sp: trace_bounds(sp)[0], reverse=True)[:args.limit]
+    for spans in rows:
+        start, end = trace_bounds(spans)
+        errors = sum(s.get("status") == "error" for s in spans)
+        print(f"{spans[0]['trace_id']}  {time.strftime('%H:%M:%S', time.localtime(start))}  "
+              f"{(end - start) * 1000:9.1f} ms  {len(spans):4d} spans  {'!' if errors else ' '} {root_name(spans)}")
+
+
+def cmd_waterfall(args) -> None:
+    traces = by_trace(load(args.file, parse_since(args.since)))
+    if not traces:
+        raise SystemExit(f"Keine Traces in {args.file}")
+    if args.trace_id:
+        ids = [t for t in traces if t.startswith(args.trace_id)]
+        if not ids:
+            raise SystemExit(f"Trace {args.trace_id!r} nicht gefunden")
+    elif args.slowest:
+        ids = sorted(traces, key=lambda t: -(trace_bounds(traces[t])[1] - trace_bounds(traces[t])[0]))[:args.slowest]
+    else:
+        ids = sorted(traces, key=lambda t: trace_bounds(traces[t])[0])[-args.last:]
+    for t in ids:
+        render_waterfall(traces[t])
+        print()
+
+
+def cmd_stats(args) -> None:
+    spans = load(args.file, parse_since(args.since))
+    if args.name:
+        # nur Traces, deren Root-Span so heißt (z.B. "POST /chat" oder "ui.chat")
+        traces = by_trace(spans)
+        spans = [s for sp in traces.values() if root_name(sp) == args.name for s in sp]
+    durations: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    for s in spans:
+        durations[stage(s)].append(s["duration_ms"])
+        errors[stage(s)] += s.get("status") == "error"
+    if not durations:
+        raise SystemExit(f"Keine Spans in {args.file}")
+    print(f"{'stage':<36} {'count':>7} {'errors':>6} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'total_ms':>11}")
+    for name, d in sorted(durations.items(), key=lambda kv: -sum(kv[1])):
+        d.sort()
+        print(f"{name[:36]:<36} {len(d):>7} {errors[name]:>6} {percentile(d, 0.5):>9.1f} "
+              f"{percentile(d, 0.95):>9.1f} {percentile(d, 0.99):>9.1f} {sum(d):>11.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Wasserfall/Perzentile aus dem lokalen Trace-Log")
+    ap.add_argument("--file", default=TRACE_LOG)
+    ap.add_argument("--since", help="nur Spans der letzten Zeitspanne, z.B. 15m, 2h, 1d")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("list")
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(fn=cmd_list)
+
+    p = sub.add_parser("waterfall")
+    p.add_argument("trace_id", nargs="?")
+    p.add_argument("--last", type=int, default=1)
+    p.add_argument("--slowest", type=int, default=0)
+    p.set_defaults(fn=cmd_waterfall)
+
+    p = sub.add_parser("stats")
+    p.add_argument("--name", help="nur Traces mit diesem Root-Span")
+    p.set_defaults(fn=cmd_stats)
+
+    args = ap.parse_args()
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import atexit
+import contextvars
+import json
+import os
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+
+# ----------------------------
+# Tracing ohne externen Collector: Spans als JSONL in eine lokale Datei
+# ----------------------------
+# - Trace-Kontext über W3C "traceparent" (00-<trace_id>-<span_id>-01): Streamlit-Seite -> api_client
+#   -> FastAPI-Middleware -> Endpoint-Thread (ContextVar, wird von Starlette in den Threadpool kopiert)
+# - span(name, **attrs) erzeugt einen Kind-Span des aktuellen Spans; ohne aktiven Trace ist es ein
+#   No-op (Hintergrund-Threads wie Usage-Flush/KB-Watcher erzeugen keinen Müll)
+# - Schreiben gepuffert in einem Hintergrund-Thread; mehrere Prozesse (API, Streamlit) dürfen in
+#   dieselbe Datei schreiben (O_APPEND, eine Zeile pro Span)
+# Auswertung: python trace_report.py (Wasserfall, Perzentile pro Stage)
+
+# Opt-in: die Datei wächst ohne Rotation, daher nur zum Messen einschalten (TRACING_ENABLED=1)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0") == "1"
+TRACE_LOG = os.getenv("TRACE_LOG", "traces.jsonl")
+TRACE_FLUSH_SECONDS = float(os.getenv("TRACE_FLUSH_SECONDS", "1"))
+TRACE_SQL_CHARS = 300  # SQL-Text im Span kürzen
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attrs", "start", "_t0", "status", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attrs: dict):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def fail(self, error: str) -> None:
+        self.status, self.error = "error", error
+
+    def record(self, service: str) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": service,
+            "start": round(self.start, 6),
+            "duration_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+            "status": self.status,
+            "error": self.error,
+            "thread": threading.current_thread().name,
+            "attrs": self.attrs,
+        }
+
+
+_CURRENT: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("trace_span", default=None)
+
+
+class TraceWriter:
+    """Sammelt fertige Spans und hängt sie periodisch an die JSONL-Datei an."""
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._q: "queue.Queue[dict]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def write(self, record: dict) -> None:
+        if self._thread is None:
+            self._start()
+        self._q.put(record)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)  # Rest beim Beenden noch schreiben
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self) -> None:
+        lines: List[str] = []
+        while True:
+            try:
+                lines.append(json.dumps(self._q.get_nowait(), ensure_ascii=False, default=str))
+            except queue.Empty:
+                break
+        if not lines:
+            return
+        try:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, ("\n".join(lines) + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"Tracing: konnte {self.path} nicht schreiben: {e}")
+
+
+class Tracer:
+    def __init__(self, service: str, writer: Optional[TraceWriter] = None, enabled: bool = TRACING_ENABLED):
+        self.service = service
+        self.enabled = enabled
+        self.writer = writer or TraceWriter(TRACE_LOG, TRACE_FLUSH_SECONDS)
+
+    @contextmanager
+    def span(self, name: str, root: bool = False, parent: Optional[str] = None, **attrs) -> Iterator[Optional[Span]]:
+        """
+        Kind-Span des aktuellen Spans. root=True startet einen neuen Trace (bzw. setzt einen
+        eingehenden traceparent fort); sonst ohne aktiven Trace ein No-op (yield None).
+        """
+        current = _CURRENT.get()
+        if not self.enabled or (current is None and not root):
+            yield None
+            return
+        ctx = parse_traceparent(parent) if parent else None
+        if current is not None and not root:
+            s = Span(current.trace_id, current.span_id, name, attrs)
+        elif ctx is not None:
+            s = Span(ctx[0], ctx[1], name, attrs)
+        else:
+            s = Span(secrets.token_hex(16), None, name, attrs)
+        token = _CURRENT.set(s)
+        try:
+            yield s
+        except BaseException as e:
+            s.fail(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _CURRENT.reset(token)
+            self.writer.write(s.record(self.service))
+
+    def flush(self) -> None:
+        self.writer.flush()
+
+
+# Prozessweiter Tracer; Service-Name pro Prozess (API: "api", Streamlit: "ui")
+TRACER = Tracer(os.getenv("TRACE_SERVICE", "app"))
+
+
+def configure(service: str) -> Tracer:
+    TRACER.service = service
+    return TRACER
+
+
+def span(name: str, **attrs):
+    return TRACER.span(name, **attrs)
+
+
+def current_span() -> Optional[Span]:
+    return _CURRENT.get()
+
+
+def current_trace_id() -> Optional[str]:
+    s = _CURRENT.get()
+    return s.trace_id if s else None
+
+
+def traceparent() -> Optional[str]:
+    s = _CURRENT.get()
+    return f"00-{s.trace_id}-{s.span_id}-01" if s else None
+
+
+def inject(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Header für ausgehende Requests um den aktuellen Trace-Kontext ergänzen."""
+    headers = dict(headers or {})
+    tp = traceparent()
+    if tp:
+        headers.setdefault("traceparent", tp)
+    return headers
+
+
+def parse_traceparent(value: Optional[str]):
+    """(trace_id, parent_span_id) oder None bei fehlendem/ungültigem Header."""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2]
+
+
+# ----------------- SQLite: jedes execute als Span -----------------
+
+class TracedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        with span("sqlite", sql=sql.strip()[:TRACE_SQL_CHARS]):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        with span("sqlite", sql=sql.strip()[:TRACE_SQL_CHARS], many=True):
+            return super().executemany(sql, seq_of_parameters)
+
+
+class TracedConnection(sqlite3.Connection):
+    """sqlite3.connect(..., factory=TracedConnection): Cursor und conn.execute erzeugen Spans."""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
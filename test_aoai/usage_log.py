@@ -0,0 +1,236 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from db_query import SelectQuery
+
+
+# ----------------------------
+# Token-Verbrauch (resp.usage) pro Request/Session/Feature/Loop-Schritt
+# ----------------------------
+# Tabelle llm_usage kommt per Migration (db_init.py). Geschrieben wird gepuffert:
+# record() hängt nur an eine Liste an, flush() schreibt alle Zeilen in einer Transaktion
+# (bei vollem Puffer, spätestens alle flush_interval Sekunden, beim Shutdown).
+
+USAGE_COLUMNS = [
+    "ts", "request_id", "session_id", "feature", "endpoint", "operation", "step", "model",
+    "prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens", "latency_ms",
+]
+
+# Gruppierung für /usage: Name -> SQL-Ausdruck
+USAGE_GROUPS = {
+    "feature": "feature",
+    "session": "session_id",
+    "endpoint": "endpoint",
+    "operation": "operation",
+    "step": "step",
+    "model": "model",
+    "hour": "substr(ts, 1, 13)",
+    "day": "substr(ts, 1, 10)",
+}
+
+# Zeitfenster für /usage, z.B. "15m", "24h", "7d"
+_WINDOW_UNITS = {"m": 60, "h": 3600, "d": 86400}
+
+# Preistabelle (load_prices): Modell/Deployment -> Preis pro 1k Tokens für diese Felder
+PRICE_FIELDS = ("input", "cached", "output")
+
+
+@dataclass
+class UsageContext:
+    request_id: str
+    session_id: Optional[str] = None
+    feature: Optional[str] = None
+    endpoint: Optional[str] = None
+
+
+def utc_ts(epoch: Optional[float] = None) -> str:
+    # gleiches Format wie datetime('now') in SQLite => Textvergleich = Zeitvergleich
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(epoch))
+
+
+def parse_window(window: str) -> float:
+    window = (window or "").strip().lower()
+    if len(window) < 2 or window[-1] not in _WINDOW_UNITS or not window[:-1].isdigit():
+        raise ValueError("window must look like 15m, 24h or 7d")
+    return int(window[:-1]) * _WINDOW_UNITS[window[-1]]
+
+
+def load_prices(path: str) -> Dict[str, Dict[str, float]]:
+    """
+    Preise pro 1k Tokens aus JSON, z.B. {"gpt-4.1-mini": {"input": 0.0004, "cached": 0.0001, "output": 0.0016}}.
+    Kein Pfad gesetzt oder Datei fehlt => leere Tabelle (/usage meldet dann nur Tokens, cost = null).
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    prices = {}
+    for model, p in cfg.items():
+        missing = [k for k in PRICE_FIELDS if k not in p]
+        if missing:
+            raise ValueError(f"{path}: price for {model!r} is missing {missing}")
+        prices[model] = {k: float(p[k]) for k in PRICE_FIELDS}
+    return prices
+
+
+def _cost_columns(prices: Dict[str, Dict[str, float]]) -> List[str]:
+    # Kosten pro Zeile nach Modell; prompt_tokens enthält die cached_tokens => nur der Rest zum vollen Preis.
+    # Preise sind float() aus load_prices, Modellnamen als SQL-Literal (' verdoppelt)
+    if not prices:
+        return ["NULL AS cost", "SUM(total_tokens) AS unpriced_tokens"]
+    names = ["'" + m.replace("'", "''") + "'" for m in prices]
+    whens = " ".join(
+        f"WHEN {name} THEN (prompt_tokens - cached_tokens) * {p['input']!r} "
+        f"+ cached_tokens * {p['cached']!r} + completion_tokens * {p['output']!r}"
+        for name, p in zip(names, prices.values())
+    )
+    return [
+        f"ROUND(SUM(CASE model {whens} END) / 1000.0, 6) AS cost",
+        f"SUM(CASE WHEN model IN ({', '.join(names)}) THEN 0 ELSE total_tokens END) AS unpriced_tokens",
+    ]
+
+
+class UsageRecorder:
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        batch_size: int = 50,
+        flush_interval: float = 5.0,
+        max_buffer: int = 10000,
+    ):
+        self.connect = connect
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buf: List[tuple] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._warned = False
+
+    def record(
+        self,
+        ctx: Optional[UsageContext],
+        usage,
+        model: str,
+        operation: str,
+        step: int = 0,
+        latency_ms: float = 0.0,
+    ) -> None:
+        """usage = resp.usage der OpenAI-Antwort (darf None sein, z.B. bei Fehlern)."""
+        ctx = ctx or UsageContext(request_id="")
+        details = getattr(usage, "prompt_tokens_details", None)
+        row = (
+            utc_ts(), ctx.request_id, ctx.session_id, ctx.feature, ctx.endpoint, operation, step, model,
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+            getattr(usage, "total_tokens", 0) or 0,
+            getattr(details, "cached_tokens", 0) or 0,
+            round(latency_ms, 1),
+        )
+        with self._lock:
+            if len(self._buf) >= self.max_buffer:
+                # DB dauerhaft nicht schreibbar => älteste verwerfen statt Speicher zu fressen
+                del self._buf[: self.batch_size]
+            self._buf.append(row)
+            full = len(self._buf) >= self.batch_size
+        if full:
+            if self._thread is not None:
+                # volle Batch dem Flush-Thread übergeben, der Request wartet nicht auf SQLite
+                self._wake.set()
+            else:
+                self.flush()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buf = self._buf, []
+            if not rows:
+                return 0
+            placeholders = ", ".join("?" for _ in USAGE_COLUMNS)
+            try:
+                conn = self.connect()
+                try:
+                    with conn:
+                        conn.executemany(
+                            f"INSERT INTO llm_usage ({', '.join(USAGE_COLUMNS)}) VALUES ({placeholders})",
+                            rows,
+                        )
+                finally:
+                    conn.close()
+            except (sqlite3.Error, RuntimeError) as e:
+                if not self._warned:
+                    print(f"Usage: konnte nicht schreiben ({e}). Bitte db_init.py ausführen (Migrationen).")
+                    self._warned = True
+                with self._lock:
+                    # zurück in den Puffer, nächster Versuch beim nächsten Flush
+                    self._buf[:0] = rows[-self.max_buffer:]
+                return 0
+            self._warned = False
+            return len(rows)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._wake.clear()
+        self._thread = threading.Thread(target=self._run, name="usage-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        # aufwachen nach flush_interval oder sobald record() eine volle Batch meldet
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            self.flush()
+
+
+def usage_summary(
+    conn: sqlite3.Connection,
+    since: str,
+    group_by: List[str],
+    session_id: Optional[str] = None,
+    feature: Optional[str] = None,
+    limit: int = 100,
+    prices: Optional[Dict[str, Dict[str, float]]] = None,
+) -> List[dict]:
+    """Summen pro Gruppe; cost = Summe nach Preistabelle, unpriced_tokens = Tokens von Modellen ohne Preis."""
+    exprs = [USAGE_GROUPS[g] for g in group_by]
+    cols = [f"{e} AS {g}" for g, e in zip(group_by, exprs)] + [
+        "COUNT(DISTINCT request_id) AS requests",
+        "COUNT(*) AS calls",
+        "SUM(prompt_tokens) AS prompt_tokens",
+        "SUM(completion_tokens) AS completion_tokens",
+        "SUM(total_tokens) AS total_tokens",
+        "SUM(cached_tokens) AS cached_tokens",
+        "ROUND(AVG(latency_ms), 1) AS avg_latency_ms",
+    ] + _cost_columns(prices or {})
+    q = (
+        SelectQuery("llm_usage", cols)
+        .where("ts >= ?", since)
+        .eq("session_id", session_id)
+        .eq("feature", feature)
+    )
+    if exprs:
+        q.group_by(", ".join(exprs))
+    sql, params = q.order_by("total_tokens DESC").limit(limit).build()
+    cur = conn.execute(sql, params)
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, r)) for r in cur.fetchall()]